@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import LoggedInDevice
+
+
+class Command(BaseCommand):
+    """
+    로그인 기기 정리 커맨드 : 중복 토큰 로그아웃, 보관기간 지난 로그아웃 기기 삭제
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, dest='days', default=None, help='로그아웃 기기 보관 일수')
+        parser.add_argument('--dry-run', action='store_true', dest='dry_run', help='변경하지 않고 건수만 출력')
+
+    def handle(self, *args, **options):
+        expired = LoggedInDevice.objects.get_expired(options['days'])
+        if options['dry_run']:
+            print('expired : %s' % expired.count())
+            return
+        print('duplicated logged out : %s' % LoggedInDevice.objects.logout_duplicated())
+        print('expired deleted : %s' % expired.delete()[0])
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0064_auto_20230417_1152'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loggedindevice',
+            index=models.Index(condition=models.Q(logged_out_datetime__isnull=True), fields=['push_token'], name='device_logged_in_token'),
+        ),
+    ]
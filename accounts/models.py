@@ -17,7 +17,7 @@ from common.utils import stars
 from common.models import DefaultEmailUserModel, BaseUserLoginAttemptModel
 from common.validators import MobileNumberOnlyValidators
 from common.admin import log_with_reason
-from base.models import Area, BannedWord
+from base.models import Area, AreaReach, BannedWord
 from base.constants import *
 
 
@@ -40,20 +40,38 @@ class LoggedInDeviceQuerySet(models.QuerySet):
         return self.filter(user__helper__accepted_datetime__isnull=False, user__helper__is_active=True)
 
     def get_by_areas(self, *area_ids):
-        parent_ids = list(Area.objects.filter(
-            id__in=area_ids,
-            parent__isnull=False
-        ).distinct('parent').values_list('parent', flat=True))
+        # 지역 도달범위 테이블 : 수락지역이 요청지역 자신이거나 상위지역, 또는 인근지역(인근지역 푸쉬 허용시)
         qs = self.get_logged_in().get_helpers()
         qs = qs.filter(
-            models.Q(user__helper__accept_area__in=set(list(area_ids) + parent_ids))
-            | models.Q(user__helper__accept_area__nearby__in=area_ids, user__helper__is_nearby_push_allowed=True)
+            models.Q(user__helper__accept_area__reaches__reachable__in=area_ids),
+            models.Q(user__helper__accept_area__reaches__reach_type__in=('self', 'child'))
+            | models.Q(user__helper__accept_area__reaches__reach_type='nearby', user__helper__is_nearby_push_allowed=True)
         )
         return qs
 
     def get_by_tokens(self, tokens):
         return self.filter(push_token__in=tokens)
 
+    def logout_by_tokens(self, tokens, batch_size=1000):
+        """토큰 목록에 해당하는 로그인 기기를 배치당 한번의 update로 로그아웃 처리, 처리 건수 반환"""
+        tokens = list({token for token in tokens if token})
+        now = timezone.now()
+        count = 0
+        for i in range(0, len(tokens), batch_size):
+            count += self.get_logged_in().get_by_tokens(tokens[i:i + batch_size]).update(logged_out_datetime=now)
+        return count
+
+    def logout_duplicated(self):
+        """같은 토큰으로 로그인된 기기가 여럿인 경우 마지막 기기만 남기고 로그아웃 처리, 처리 건수 반환"""
+        logged_in = self.get_logged_in().exclude(push_token='')
+        latest = logged_in.order_by('push_token', '-id').distinct('push_token').values('id')
+        return logged_in.exclude(id__in=latest).update(logged_out_datetime=timezone.now())
+
+    def get_expired(self, days=None):
+        """보관기간이 지난 로그아웃 기기"""
+        days = days or getattr(settings, 'LOGGED_OUT_DEVICE_RETENTION_DAYS', 180)
+        return self.filter(logged_out_datetime__lt=timezone.now() - timezone.timedelta(days=days))
+
     def get_mission_push_allowed_helpers(self):
         now_time = timezone.now().time()
         qs = self.exclude(user__is_push_allowed=False)
@@ -123,7 +141,8 @@ class UserQuerySet(models.QuerySet):
         devices = Device.objects.get_logged_in().filter(user_id__in=users.values_list('id', flat=True)).exclude(push_token='')
         return [device.push_token for device in devices]
 
-    def get_code_and_push_tokens(self, only_if_allowed=True, is_mission_request=False, return_count=False):
+    def get_code_and_push_tokens(self, only_if_allowed=True, is_mission_request=False, return_count=False,
+                                 iterator=False):
         users = self
         if only_if_allowed:
             users = users.filter(is_push_allowed=True)
@@ -133,16 +152,18 @@ class UserQuerySet(models.QuerySet):
             devices = devices.get_mission_push_allowed_helpers()
         if return_count:
             return devices.count()
-        return [(device.user.code, device.push_token) for device in devices.distinct('push_token')]
+        # 토큰 중복제거는 db에서 처리하고 회원코드와 토큰만 가져옴
+        code_and_tokens = devices.order_by('push_token').distinct('push_token').values_list('user__code', 'push_token')
+        if iterator:
+            return code_and_tokens.iterator(chunk_size=2000)
+        return list(code_and_tokens)
 
     def get_by_helper_areas(self, *area_ids):
-        parent_ids = list(Area.objects.filter(
-            id__in=area_ids,
-            parent__isnull=False
-        ).distinct('parent').values_list('parent', flat=True))
+        # 지역 도달범위 테이블 : 수락지역이 요청지역 자신이거나 상위지역, 또는 인근지역(인근지역 푸쉬 허용시)
         return self.get_active_helpers().filter(
-            models.Q(helper__accept_area__in=set(list(area_ids) + parent_ids))
-            | models.Q(helper__accept_area__nearby__in=area_ids, helper__is_nearby_push_allowed=True)
+            models.Q(helper__accept_area__reaches__reachable__in=area_ids),
+            models.Q(helper__accept_area__reaches__reach_type__in=('self', 'child'))
+            | models.Q(helper__accept_area__reaches__reach_type='nearby', helper__is_nearby_push_allowed=True)
         ).distinct('id')
 
     def get_push_allowed(self):
@@ -618,6 +639,11 @@ class LoggedInDevice(models.Model):
     class Meta:
         verbose_name = '로그인 기기'
         verbose_name_plural = '로그인 기기'
+        indexes = [
+            # 로그인 중인 기기의 토큰 조회용 (로그아웃 기기는 계속 쌓이므로 제외)
+            models.Index(fields=['push_token'], name='device_logged_in_token',
+                         condition=models.Q(logged_out_datetime__isnull=True)),
+        ]
 
     def __str__(self):
         return self.get_device_info_display()
@@ -823,12 +849,10 @@ class Helper(models.Model):
 
     @cached_property
     def accept_area_ids(self):
-        ids = []
-        for area in self.accept_area.all():
-            ids.append(area.id)
-            if self.is_nearby_push_allowed:
-                ids += list(area.nearby.all().values_list('id', flat=True))
-        return set(ids)
+        reach_types = ('self', 'nearby') if self.is_nearby_push_allowed else ('self',)
+        return set(AreaReach.objects.filter(
+            area__helpers=self, reach_type__in=reach_types
+        ).values_list('reachable_id', flat=True))
 
     @property
     def bank_account(self):
@@ -902,29 +926,37 @@ class Helper(models.Model):
         Report = apps.get_model('missions', 'Report')
         return Report.objects.filter(bid__helper_id=self.id)
 
+    @cached_property
+    def earnings(self):
+        """수익 스냅샷 (캐쉬 내역/인출요청 저장시 갱신)"""
+        HelperEarnings = apps.get_model('payment', 'HelperEarnings')
+        return HelperEarnings.objects.get_for_helper(self.id)
+
     @property
     def profit_mission_fee(self):
-        return sum(self.cashes.filter(bid__isnull=False).values_list('amount', flat=True))
+        return self.earnings.mission_fee_total
 
     @property
     def profit_etc(self):
-        return sum(self.cashes.filter(bid__isnull=True, withdraw__isnull=True, amount__gte=0).values_list('amount', flat=True))
+        return self.earnings.etc_total
 
     @property
     def profit_total(self):
-        return self.profit_mission_fee + self.profit_etc
+        return self.earnings.profit_total
 
     @property
+    def profit_this_month(self):
+        return self.earnings.profit_this_month
+
+    @cached_property
     def cash_balance(self):
-        return self.cashes.get_balance()
+        Cash = apps.get_model('payment', 'Cash')
+        BalanceSnapshot = apps.get_model('payment', 'BalanceSnapshot')
+        return BalanceSnapshot.objects.get_balance(Cash, self.id)
 
     @property
     def withdrawable_cash_balance(self):
-        balance = self.cashes.get_balance()
-        requested_before = sum(self.withdraws.filter(failed_datetime__isnull=True, done_datetime__isnull=True)
-                               .values_list('amount', flat=True))
-        withdrawable = balance - requested_before
-        return withdrawable if withdrawable > 0 else 0
+        return self.earnings.get_withdrawable(self.cash_balance)
 
     @property
     def is_mission_request_push_allowed_now(self):
@@ -36,6 +36,7 @@ from . import authentication
 from .models import User, Helper, Agreement, MobileVerification, BankAccount, TIN, BannedWord, Quiz
 from missions.models import Mission
 from notification.models import Notification, Tasker
+from notification.utils import UnreadNotificationCounter
 from .serializers import (
     LogoutSerializer, HelperReadOnlySerializer, AuthTokenRefreshSerializer,
     AuthTokenObtainPairSerializer, SocailAuthTokenObtainPairSerializer, ProfileSerializer, PasswordSerializer,
@@ -647,12 +648,12 @@ class NotificationViewSet(mixins.ListModelMixin,
 
     @action(methods=['GET'], detail=False)
     def count(self, request, *args, **kwargs):
-        new_count = self.model.objects.get_by_usercode(request.user.code, exclude_read=True).count()
+        new_count = UnreadNotificationCounter().get(request.user)
         return response.Response(data={'new_count': new_count})
 
     def update(self, request, *args, **kwargs):
         obj = self.get_object()
-        obj.did_action(request.user.code)
+        obj.did_action(request.user)
         return response.Response(data={})
 
 
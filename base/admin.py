@@ -1,11 +1,12 @@
 import dateutil.parser
 
+from django.apps import apps
 from django.contrib import admin
 from django.contrib import messages
 from django.utils import timezone
 
 from common.admin import RelatedAdminMixin, ImageWidgetMixin, AdminPageBaseView
-from .models import Area, Popup
+from .models import Area, Popup, HttpJob
 
 
 """
@@ -93,6 +94,21 @@ class PopupAdmin(ImageWidgetMixin, BaseAdmin):
     get_end_state.short_description = '라이브'
 
 
+@admin.register(HttpJob)
+class HttpJobAdmin(BaseAdmin):
+    """
+    외부 호출 작업 어드민
+    """
+    list_display = ('id', 'name', 'status', 'attempts', 'next_attempt_datetime', 'created_datetime', 'done_datetime')
+    list_filter = ('name', 'status')
+    search_fields = ('ordering_key',)
+    readonly_fields = ('name', 'ordering_key', 'kwargs', 'status', 'attempts', 'max_attempts', 'next_attempt_datetime', 'last_error',
+                       'result', 'created_datetime', 'updated_datetime', 'done_datetime')
+
+    def has_add_permission(self, request):
+        return False
+
+
 """
 추가 어드민 페이지
 """
@@ -144,6 +160,7 @@ class StatisticsView(AdminPageBaseView):
         'payment': '결제',
         'recommend': '추천 시스템',
         'finance': '비용과 수익',
+        'push': '푸쉬 발송',
     }
     slug = ''
     current_date = None
@@ -181,6 +198,10 @@ class StatisticsView(AdminPageBaseView):
         context['current_date'] = self.current_date
         context['start_date'] = self.start_date
         context['end_date'] = self.end_date
+        if self.slug == 'push':
+            PushDeliveryMetric = apps.get_model('notification', 'PushDeliveryMetric')
+            context['push_metrics'] = PushDeliveryMetric.objects\
+                .filter(created_datetime__date__range=(self.start_date, self.end_date)).summarize()
         return context
 
 
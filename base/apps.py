@@ -7,11 +7,10 @@ class BaseConfig(AppConfig):
     verbose_name = '기본사항'
 
     def ready(self):
+        import base.signals
         from common.utils import CachedProperties, SlackWebhook
-        from .views import CustomerHomeView
-        from notification.models import Tasker
 
         anyman = CachedProperties()
         anyman.slack = SlackWebhook()
         anyman.server = 'Development' if settings.MAIN_HOST.startswith('test.') or settings.MAIN_HOST.startswith('dev.') else 'Production'
-        CustomerHomeView.cache_all()
+        # 고객 홈 캐쉬는 manage.py 실행마다 만들지 않도록 web.wsgi 에서 미리 만들거나 첫 조회시 만듦
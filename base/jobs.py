@@ -0,0 +1,139 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+
+from common.utils import SingletonOptimizedMeta
+
+
+logger = logging.getLogger('django')
+
+
+"""
+외부 http 호출 백그라운드 작업
+
+사용법 :
+    @http_job('job_name')
+    def handler(client, **kwargs):
+        res = client.get(url)
+        res.raise_for_status()  # 예외가 발생하면 backoff 후 재시도
+
+    HttpJob.objects.enqueue('job_name', **kwargs)  # 커밋 후 백그라운드에서 실행
+    HttpJob.objects.enqueue('job_name', ordering_key='key', **kwargs)  # 같은 키의 작업은 등록 순서대로 실행
+"""
+
+
+# 작업명 : 처리 함수
+http_jobs = {}
+
+
+def http_job(name):
+    """http 작업 처리 함수 등록"""
+    def decorator(func):
+        http_jobs[name] = func
+        return func
+    return decorator
+
+
+class StubResponse:
+    """
+    stub transport 응답
+    """
+    def __init__(self, status_code=200, json_data=None, content=b''):
+        self.status_code = status_code
+        self._json = json_data if json_data is not None else {}
+        self.content = content
+
+    def json(self):
+        return self._json
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError('%s Stub Error' % self.status_code, response=self)
+
+
+class StubTransport:
+    """
+    외부 호출 없이 요청을 기록하고 지정된 응답을 돌려주는 로컬/테스트용 transport (settings.HTTP_JOB_TRANSPORT = 'stub')
+    """
+    def __init__(self):
+        self.requests = []
+        self.responses = {}
+
+    def set_response(self, url, status_code=200, json_data=None):
+        self.responses[url] = StubResponse(status_code, json_data)
+
+    def request(self, method, url, **kwargs):
+        self.requests.append((method.upper(), url, kwargs))
+        return self.responses.get(url, StubResponse())
+
+
+class HttpClient(metaclass=SingletonOptimizedMeta):
+    """
+    커넥션 풀을 사용하는 외부 http 호출 클라이언트
+    """
+    timeout = 5
+
+    def __init__(self):
+        if getattr(settings, 'HTTP_JOB_TRANSPORT', 'requests') == 'stub':
+            self.session = StubTransport()
+        else:
+            pool_size = getattr(settings, 'HTTP_JOB_POOL_SIZE', 10)
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            self.session = requests.Session()
+            self.session.mount('http://', adapter)
+            self.session.mount('https://', adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('get', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('post', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('delete', url, **kwargs)
+
+
+class HttpJobRunner(metaclass=SingletonOptimizedMeta):
+    """
+    http 작업 실행기 : 프로세스 내 스레드풀에서 실행하고 결과를 HttpJob에 저장
+    """
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=getattr(settings, 'HTTP_JOB_WORKERS', 4))
+
+    def submit(self, job_id):
+        transaction.on_commit(lambda: self.executor.submit(self.run_in_thread, job_id))
+
+    def run_in_thread(self, job_id):
+        try:
+            self.run(job_id)
+        finally:
+            connection.close()
+
+    def run(self, job_id):
+        HttpJob = apps.get_model('base', 'HttpJob')
+        job = HttpJob.objects.claim(job_id)
+        if not job:
+            return None
+        try:
+            result = http_jobs[job.name](HttpClient(), **job.kwargs)
+        except Exception as e:
+            logger.warning('[http job %s] %s failed (%s) : %s' % (job.id, job.name, job.attempts, e))
+            job.fail(e)
+        else:
+            job.succeed(result)
+        if job.status != 'retry':
+            # 같은 순서 키로 기다리던 다음 작업 실행
+            next_id = HttpJob.objects.get_next_id(job)
+            if next_id:
+                self.submit(next_id)
+        return job
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from base.models import AreaReach
+
+
+class Command(BaseCommand):
+    """
+    지역 도달범위 테이블 재생성 커맨드
+    """
+
+    def handle(self, *args, **options):
+        count = AreaReach.objects.refresh()
+        print('%s area reaches refreshed.' % count)
@@ -18,8 +18,13 @@ class Command(BaseCommand):
             '',
             '*/10 * * * * venv/bin/python ./manage.py mission_auto_finish',
             '* * * * * venv/bin/python ./manage.py mission_auto_unassign',
+            '* * * * * venv/bin/python ./manage.py run_http_jobs',
+            '* * * * * venv/bin/python ./manage.py check_sms_results',
             '3 * * * * venv/bin/python ./manage.py cache_stats',
+            '*/30 * * * * venv/bin/python ./manage.py reconcile_unread_counts',
             '51 3 * * * venv/bin/python ./manage.py jobs daily',
+            '21 4 * * * venv/bin/python ./manage.py clean_devices',
+            '41 4 * * * venv/bin/python ./manage.py reconcile_helper_earnings',
             ''
         ]
         process = subprocess.run('crontab', shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, close_fds=True,
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from base.jobs import HttpJobRunner
+from base.models import HttpJob
+
+
+class Command(BaseCommand):
+    """
+    재시도 시간이 된 외부 호출 작업 실행 커맨드
+    """
+
+    def handle(self, *args, **options):
+        runner = HttpJobRunner()
+        for job_id in HttpJob.objects.due().order_by('id').values_list('id', flat=True):
+            runner.run(job_id)
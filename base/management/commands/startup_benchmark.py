@@ -0,0 +1,64 @@
+import os
+import re
+import subprocess
+import sys
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+SETUP_SCRIPT = '''
+import os
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', '%s')
+import django
+django.setup()
+'''
+
+IMPORT_TIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s*(\S+)$')
+
+
+class Command(BaseCommand):
+    """
+    프로세스 시작시간 측정 커맨드 : 새 프로세스에서 django.setup() 까지의 시간과 모듈별 import 시간 출력
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, dest='repeat', default=3, help='측정 횟수')
+        parser.add_argument('--top', type=int, dest='top', default=20, help='출력할 모듈 수')
+        parser.add_argument('--all', action='store_true', dest='all_modules', help='외부 패키지 모듈도 출력')
+
+    def handle(self, *args, **options):
+        script = SETUP_SCRIPT % os.environ.get('DJANGO_SETTINGS_MODULE', 'web.settings')
+        durations = []
+        for _ in range(options['repeat']):
+            started = time.monotonic()
+            process = subprocess.run([sys.executable, '-c', script], cwd=settings.BASE_DIR,
+                                     stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf-8')
+            durations.append(time.monotonic() - started)
+            if process.returncode:
+                self.stdout.write(self.style.ERROR(process.stderr))
+                return
+        self.stdout.write('cold start (django.setup) : min %.3fs / avg %.3fs (%s회)' % (
+            min(durations), sum(durations) / len(durations), len(durations)))
+
+        # 모듈별 import 시간 (python -X importtime)
+        process = subprocess.run([sys.executable, '-X', 'importtime', '-c', script], cwd=settings.BASE_DIR,
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf-8')
+        local_apps = {config.name.split('.')[0] for config in apps.get_app_configs()
+                      if config.path.startswith(str(settings.BASE_DIR))}
+        local_apps.add('web')
+        rows = []
+        for line in process.stderr.splitlines():
+            matched = IMPORT_TIME_LINE.match(line)
+            if not matched:
+                continue
+            self_us, cumulative_us, module = matched.groups()
+            if options['all_modules'] or module.split('.')[0] in local_apps:
+                rows.append((int(cumulative_us), int(self_us), module))
+        rows.sort(reverse=True)
+
+        self.stdout.write('%10s %10s  %s' % ('누적(ms)', '자체(ms)', '모듈'))
+        for cumulative_us, self_us, module in rows[:options['top']]:
+            self.stdout.write('%10.1f %10.1f  %s' % (cumulative_us / 1000, self_us / 1000, module))
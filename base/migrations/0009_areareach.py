@@ -0,0 +1,40 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+POPULATE_SQL = """
+INSERT INTO base_areareach (area_id, reachable_id, reach_type)
+SELECT id, id, 'self' FROM base_area
+UNION
+SELECT parent_id, id, 'child' FROM base_area WHERE parent_id IS NOT NULL
+UNION
+SELECT from_area_id, to_area_id, 'nearby' FROM base_area_nearby
+UNION
+SELECT n.from_area_id, c.id, 'nearby_child' FROM base_area_nearby n JOIN base_area c ON c.parent_id = n.to_area_id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0008_auto_20230417_1152'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AreaReach',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reach_type', models.CharField(choices=[('self', '자신'), ('child', '하위 지역'), ('nearby', '인근 지역'), ('nearby_child', '인근 지역의 하위 지역')], max_length=12, verbose_name='도달 유형')),
+                ('area', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reaches', to='base.Area', verbose_name='지역')),
+                ('reachable', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reached_by', to='base.Area', verbose_name='도달 지역')),
+            ],
+            options={
+                'verbose_name': '지역 도달범위',
+                'verbose_name_plural': '지역 도달범위',
+                'unique_together': {('area', 'reachable', 'reach_type')},
+                'index_together': {('reachable', 'reach_type')},
+            },
+        ),
+        migrations.RunSQL(POPULATE_SQL, 'DELETE FROM base_areareach;'),
+    ]
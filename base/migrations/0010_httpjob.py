@@ -0,0 +1,34 @@
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0009_areareach'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HttpJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(db_index=True, max_length=50, verbose_name='작업명')),
+                ('kwargs', django.contrib.postgres.fields.jsonb.JSONField(blank=True, default=dict, verbose_name='작업 인자')),
+                ('status', models.CharField(choices=[('pending', '대기'), ('running', '실행중'), ('retry', '재시도 대기'), ('succeeded', '성공'), ('failed', '실패')], default='pending', max_length=10, verbose_name='상태')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='시도 횟수')),
+                ('max_attempts', models.PositiveSmallIntegerField(default=5, verbose_name='최대 시도 횟수')),
+                ('next_attempt_datetime', models.DateTimeField(blank=True, null=True, verbose_name='다음 시도 일시')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='마지막 오류')),
+                ('result', django.contrib.postgres.fields.jsonb.JSONField(blank=True, null=True, verbose_name='결과')),
+                ('created_datetime', models.DateTimeField(auto_now_add=True, verbose_name='등록 일시')),
+                ('updated_datetime', models.DateTimeField(auto_now=True, verbose_name='변경 일시')),
+                ('done_datetime', models.DateTimeField(blank=True, null=True, verbose_name='완료 일시')),
+            ],
+            options={
+                'verbose_name': '외부 호출 작업',
+                'verbose_name_plural': '외부 호출 작업',
+                'index_together': {('status', 'next_attempt_datetime')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0010_httpjob'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "DELETE FROM base_areareach WHERE reach_type = 'nearby_child';",
+            """
+            INSERT INTO base_areareach (area_id, reachable_id, reach_type)
+            SELECT n.from_area_id, c.id, 'nearby_child' FROM base_area_nearby n JOIN base_area c ON c.parent_id = n.to_area_id;
+            """
+        ),
+        migrations.AlterField(
+            model_name='areareach',
+            name='reach_type',
+            field=models.CharField(choices=[('self', '자신'), ('child', '하위 지역'), ('nearby', '인근 지역')], max_length=12, verbose_name='도달 유형'),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0011_remove_areareach_nearby_child'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='httpjob',
+            name='ordering_key',
+            field=models.CharField(blank=True, db_index=True, default='', help_text='같은 키의 작업은 등록 순서대로 하나씩 실행', max_length=50, verbose_name='순서 키'),
+        ),
+    ]
@@ -2,7 +2,8 @@ from collections import OrderedDict
 
 from harupy.text import String
 
-from django.db import models
+from django.db import models, transaction
+from django.contrib.postgres.fields import JSONField
 from django.utils import timezone
 
 from common.utils import SlackWebhook, CachedProperties
@@ -151,6 +152,84 @@ class Area(models.Model):
     #     return super(Area, self).save(*args, **kwargs)
 
 
+class AreaReachQuerySet(models.QuerySet):
+    """
+    지역 도달범위 쿼리셋
+    """
+    def refresh(self, area_ids=None):
+        """
+        지역의 상위 지역, 인근 지역 정보로 도달범위 테이블 재생성
+        area_ids 가 있으면 해당 지역에서 출발하는 행만, 없으면 전체 재생성
+        """
+        areas = Area.objects.all() if area_ids is None else Area.objects.filter(id__in=area_ids)
+        children = Area.objects.filter(parent__isnull=False)
+        nearby_links = Area.nearby.through.objects.all()
+        if area_ids is not None:
+            children = children.filter(parent_id__in=area_ids)
+            nearby_links = nearby_links.filter(from_area_id__in=area_ids)
+
+        rows = set((area_id, area_id, 'self') for area_id in areas.values_list('id', flat=True))
+        rows.update((parent_id, child_id, 'child') for child_id, parent_id in children.values_list('id', 'parent_id'))
+        rows.update((from_id, to_id, 'nearby') for from_id, to_id in nearby_links.values_list('from_area_id', 'to_area_id'))
+
+        with transaction.atomic():
+            if area_ids is None:
+                self.model.objects.all().delete()
+            else:
+                self.model.objects.filter(area_id__in=area_ids).delete()
+            self.model.objects.bulk_create([
+                self.model(area_id=area_id, reachable_id=reachable_id, reach_type=reach_type)
+                for area_id, reachable_id, reach_type in rows
+            ], batch_size=5000)
+        return len(rows)
+
+    def get_affected_ids(self, area_ids):
+        """
+        지역 변경으로 도달범위가 바뀌는 지역 : 자신, 상위 지역, 인근 지역
+        (아직 갱신 전인 도달범위에서 변경 전의 상위 지역, 인근 지역도 함께 찾음)
+        """
+        affected = set(area_ids)
+        affected.update(
+            Area.objects.filter(id__in=area_ids, parent__isnull=False).values_list('parent_id', flat=True)
+        )
+        affected.update(
+            Area.nearby.through.objects.filter(from_area_id__in=area_ids).values_list('to_area_id', flat=True)
+        )
+        affected.update(
+            self.filter(reachable_id__in=area_ids, reach_type__in=('child', 'nearby')).values_list('area_id', flat=True)
+        )
+        return affected
+
+    def get_reachable_ids(self, area_ids, reach_types=('self', 'child')):
+        """지역들에서 도달 가능한 지역 id 서브쿼리"""
+        return self.filter(area_id__in=area_ids, reach_type__in=reach_types).values('reachable_id')
+
+
+class AreaReach(models.Model):
+    """
+    지역 도달범위 : 수락 지역(area)에서 도달 가능한 지역(reachable)
+    """
+    REACH_TYPES = (
+        ('self', '자신'),
+        ('child', '하위 지역'),
+        ('nearby', '인근 지역'),
+    )
+    area = models.ForeignKey(Area, verbose_name='지역', related_name='reaches', on_delete=models.CASCADE)
+    reachable = models.ForeignKey(Area, verbose_name='도달 지역', related_name='reached_by', on_delete=models.CASCADE)
+    reach_type = models.CharField('도달 유형', max_length=12, choices=REACH_TYPES)
+
+    objects = AreaReachQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = '지역 도달범위'
+        verbose_name_plural = '지역 도달범위'
+        unique_together = ('area', 'reachable', 'reach_type')
+        index_together = (('reachable', 'reach_type'),)
+
+    def __str__(self):
+        return '%s -> %s (%s)' % (self.area_id, self.reachable_id, self.reach_type)
+
+
 class PopupManager(models.Manager):
     """
     팝업 매니져
@@ -224,3 +303,107 @@ class Popup(models.Model):
         return OrderedDict(self.TARGET_TYPES).get(self.target_type)
 
     get_target_type_display.short_description = '타겟 타입'
+
+
+class HttpJobQuerySet(models.QuerySet):
+    """
+    외부 http 호출 작업 쿼리셋
+    """
+    def enqueue(self, name, ordering_key='', **kwargs):
+        """
+        작업 등록 후 커밋되면 백그라운드에서 실행
+        ordering_key 가 같은 작업은 등록 순서대로 하나씩 실행
+        """
+        from .jobs import HttpJobRunner
+        obj = self.create(name=name, ordering_key=ordering_key, kwargs=kwargs)
+        HttpJobRunner().submit(obj.id)
+        return obj
+
+    def due(self, stale_minutes=5):
+        """재시도 시간이 된 작업과 실행되지 않았거나 실행중 멈춘 작업"""
+        now = timezone.now()
+        stale = now - timezone.timedelta(minutes=stale_minutes)
+        return self.filter(
+            models.Q(status='retry', next_attempt_datetime__lte=now)
+            | models.Q(status__in=('pending', 'running'), updated_datetime__lte=stale)
+        )
+
+    def unfinished(self):
+        return self.filter(status__in=('pending', 'running', 'retry'))
+
+    def claim(self, job_id):
+        """
+        중복 실행 방지 : 실행중 상태로 먼저 변경하는데 성공한 경우만 작업 리턴
+        같은 ordering_key 로 먼저 등록된 작업이 끝나지 않았으면 실행하지 않음 (먼저 등록된 작업이 끝난 뒤 실행)
+        """
+        now = timezone.now()
+        stale = now - timezone.timedelta(minutes=5)
+        earlier_keys = self.unfinished().filter(id__lt=job_id).exclude(ordering_key='').values('ordering_key')
+        claimed = self.filter(id=job_id).filter(
+            models.Q(status__in=('pending', 'retry')) | models.Q(status='running', updated_datetime__lte=stale)
+        ).exclude(ordering_key__in=earlier_keys)\
+            .update(status='running', updated_datetime=now, attempts=models.F('attempts') + 1)
+        return self.get(id=job_id) if claimed else None
+
+    def get_next_id(self, job):
+        """같은 ordering_key 로 다음에 실행할 작업 id"""
+        if not job.ordering_key:
+            return None
+        return self.unfinished().filter(ordering_key=job.ordering_key, id__gt=job.id)\
+            .order_by('id').values_list('id', flat=True).first()
+
+
+class HttpJob(models.Model):
+    """
+    외부 http 호출 작업
+    """
+    STATUS = (
+        ('pending', '대기'),
+        ('running', '실행중'),
+        ('retry', '재시도 대기'),
+        ('succeeded', '성공'),
+        ('failed', '실패'),
+    )
+    BACKOFF_SECONDS = 30
+
+    name = models.CharField('작업명', max_length=50, db_index=True)
+    ordering_key = models.CharField('순서 키', max_length=50, blank=True, default='', db_index=True,
+                                    help_text='같은 키의 작업은 등록 순서대로 하나씩 실행')
+    kwargs = JSONField('작업 인자', blank=True, default=dict)
+    status = models.CharField('상태', max_length=10, choices=STATUS, default='pending')
+    attempts = models.PositiveSmallIntegerField('시도 횟수', default=0)
+    max_attempts = models.PositiveSmallIntegerField('최대 시도 횟수', default=5)
+    next_attempt_datetime = models.DateTimeField('다음 시도 일시', null=True, blank=True)
+    last_error = models.TextField('마지막 오류', blank=True, default='')
+    result = JSONField('결과', null=True, blank=True)
+    created_datetime = models.DateTimeField('등록 일시', auto_now_add=True)
+    updated_datetime = models.DateTimeField('변경 일시', auto_now=True)
+    done_datetime = models.DateTimeField('완료 일시', null=True, blank=True)
+
+    objects = HttpJobQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = '외부 호출 작업'
+        verbose_name_plural = '외부 호출 작업'
+        index_together = (('status', 'next_attempt_datetime'),)
+
+    def __str__(self):
+        return '[%s] %s' % (self.name, self.get_status_display())
+
+    def succeed(self, result=None):
+        self.status = 'succeeded'
+        self.result = result
+        self.done_datetime = timezone.now()
+        self.save()
+
+    def fail(self, error):
+        """최대 시도 횟수 전까지는 지수 backoff 후 재시도"""
+        self.last_error = str(error)
+        if self.attempts >= self.max_attempts:
+            self.status = 'failed'
+            self.done_datetime = timezone.now()
+        else:
+            self.status = 'retry'
+            self.next_attempt_datetime = timezone.now() \
+                + timezone.timedelta(seconds=self.BACKOFF_SECONDS * 2 ** (self.attempts - 1))
+        self.save()
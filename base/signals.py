@@ -0,0 +1,31 @@
+import threading
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import Area, AreaReach
+
+
+# 커밋 후 도달범위를 갱신할 지역 id : 한 트랜잭션에서 여러 지역이 바뀌어도 첫 커밋 콜백에서 한 번에 갱신
+_pending = threading.local()
+
+
+def refresh_pending_area_reach():
+    area_ids = getattr(_pending, 'area_ids', set())
+    _pending.area_ids = set()
+    if area_ids:
+        AreaReach.objects.refresh(AreaReach.objects.get_affected_ids(area_ids))
+
+
+@receiver(post_save, sender=Area)
+@receiver(post_delete, sender=Area)
+@receiver(m2m_changed, sender=Area.nearby.through)
+def refresh_area_reach(sender, instance, **kwargs):
+    if not kwargs.get('action', 'post_').startswith('post_'):
+        return
+    if not hasattr(_pending, 'area_ids'):
+        _pending.area_ids = set()
+    _pending.area_ids.add(instance.pk)
+    _pending.area_ids.update(kwargs.get('pk_set') or [])
+    transaction.on_commit(refresh_pending_area_reach)
@@ -15,7 +15,7 @@ from base.constants import MISSION_STATUS
 from accounts.models import User, Helper, LoggedInDevice, ServiceBlock
 from missions.models import Mission, Bid, Interaction, Review, Report
 from payment.models import PointVoucher, Cash, Point, Payment, Withdraw
-from notification.models import Notification
+from notification.models import Notification, NotificationReceipt
 
 
 register = Library()
@@ -1444,15 +1444,12 @@ class UserActionDashboard(ChartDashboard):
             created_datetime__lt=self.end + timezone.timedelta(days=1)
         ).exclude(result__requested__isnull=True).exclude(result__requested=[])\
             .values_list('result__requested', flat=True)
-        push_read = Notification.objects.filter(
-            created_datetime__gte=self.start,
-            created_datetime__lt=self.end + timezone.timedelta(days=1)
-        ).exclude(result__read__isnull=True).exclude(result__read=[]).values_list('result__read', flat=True)
-        push_action = Notification.objects.filter(
-            created_datetime__gte=self.start,
-            created_datetime__lt=self.end + timezone.timedelta(days=1)
-        ).exclude(result__did_action__isnull=True).exclude(result__did_action=[]) \
-            .values_list('result__did_action', flat=True)
+        push_receipts = NotificationReceipt.objects.filter(
+            notification__created_datetime__gte=self.start,
+            notification__created_datetime__lt=self.end + timezone.timedelta(days=1)
+        )
+        push_read = push_receipts.filter(read_datetime__isnull=False)
+        push_action = push_receipts.filter(acted_datetime__isnull=False)
         logged_in_devices = LoggedInDevice.objects.get_logged_in()
         logged_in_users = logged_in_devices.values('user').distinct('user')
         return [
@@ -1478,11 +1475,11 @@ class UserActionDashboard(ChartDashboard):
             },
             {
                 'title': '푸시 읽음',
-                'value': add_comma(sum([len(p) for p in push_read]))
+                'value': add_comma(push_read.count())
             },
             {
                 'title': '푸시 누름',
-                'value': add_comma(sum([len(p) for p in push_action]))
+                'value': add_comma(push_action.count())
             },
             {
                 'title': '로그인 중인 디바이스',
@@ -20,6 +20,7 @@ from accounts.models import User
 from accounts.serializers import CustomerHomeHelperSerializer
 from missions.serializers import CustomerHomeMissionSerializer, CustomerHomeTemplateSerializer
 from notification.models import Notification, Tasker
+from notification.utils import UnreadNotificationCounter
 from missions.models import Review, MissionTemplate, TemplateKeyword, TemplateTag
 from missions.serializers import CustomerHomeReviewSerializer, TemplateSerializer, TemplateTagSerializer
 from biz.models import CampaignBanner
@@ -237,7 +238,7 @@ class CustomerHomeView(views.APIView):
 
     def get(self, request, *args, **kwargs):
         if self._is_valid_user(request.user):
-            new_count = Notification.objects.get_by_usercode(request.user.code, exclude_read=True).count()
+            new_count = UnreadNotificationCounter().get(request.user)
         else:
             new_count = 0
 
@@ -245,6 +246,7 @@ class CustomerHomeView(views.APIView):
         templates = MissionTemplate.objects.get_recommended(request.user)
         campaign_banners = CampaignBanner.objects.current('user')
         user_popup = Popup.objects.current('user')
+        customer_home = self.get_cached()
 
         data = {
             'display': [
@@ -258,13 +260,21 @@ class CustomerHomeView(views.APIView):
             'templates': TemplateSerializer(templates, many=True).data,
             'popup': PopupSerializer(user_popup, many=True, context={'request': request}).data \
                      + CampaignBannerSerializer(campaign_banners, many=True, context={'request': request}).data,
-            'helpers': anyman.customer_home['helpers'],
-            'new_templates': anyman.customer_home['new_templates'],
-            'reviews': anyman.customer_home['reviews'],
-            'missions': anyman.customer_home['missions']  # todo: 업데이트 이후로는 불필요한 항목
+            'helpers': customer_home['helpers'],
+            'new_templates': customer_home['new_templates'],
+            'reviews': customer_home['reviews'],
+            'missions': customer_home['missions']  # todo: 업데이트 이후로는 불필요한 항목
         }
         return response.Response(data)
 
+    @classmethod
+    def get_cached(cls):
+        """프로세스 내 고객 홈 캐쉬, 아직 만들지 않았으면 만듦"""
+        if type(anyman.customer_home) is not dict \
+                or not all(key in anyman.customer_home for key in ('helpers', 'new_templates', 'reviews', 'missions')):
+            cls.cache_all()
+        return anyman.customer_home
+
     @classmethod
     def cache_all(cls):
         CustomerHomeHelperSerializer.cache()
@@ -1,9 +1,35 @@
 from django.conf import settings
 
-from rest_framework.fields import URLField
+from rest_framework.fields import URLField, IntegerField, DateTimeField, ListField
 
 
 class FullURLField(URLField):
     def to_representation(self, value):
         return 'https://%s%s' % (settings.MAIN_HOST, value.url) if value else ''
 
+
+
+class AnnotatedFieldMixin:
+    """
+    queryset annotation 값이 있으면 annotation 값을, 없으면 source 속성값을 사용하는 필드
+    """
+    def __init__(self, *args, **kwargs):
+        self.annotation = kwargs.pop('annotation', None)
+        super(AnnotatedFieldMixin, self).__init__(*args, **kwargs)
+
+    def get_attribute(self, instance):
+        if self.annotation and hasattr(instance, self.annotation):
+            return getattr(instance, self.annotation)
+        return super(AnnotatedFieldMixin, self).get_attribute(instance)
+
+
+class AnnotatedIntegerField(AnnotatedFieldMixin, IntegerField):
+    pass
+
+
+class AnnotatedDateTimeField(AnnotatedFieldMixin, DateTimeField):
+    pass
+
+
+class AnnotatedListField(AnnotatedFieldMixin, ListField):
+    pass
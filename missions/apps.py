@@ -7,3 +7,4 @@ class MissionsConfig(AppConfig):
 
     def ready(self):
         import missions.signals
+        import missions.jobs
@@ -0,0 +1,101 @@
+import socketserver
+import threading
+import time
+
+from .utils import KCTPacket
+
+
+"""
+로컬/테스트용 가짜 KCT 안심번호 서버
+
+사용법 :
+    server = FakeKCTServer(tps=5).start()  # 빈 포트에서 백그라운드 실행
+    settings.KCT_CONNECT_HOST, settings.KCT_CONNECT_PORT = server.address
+    ...
+    server.assigned  # {안심번호: 전화번호}
+    server.stop()
+"""
+
+
+class FakeKCTHandler(socketserver.BaseRequestHandler):
+    """
+    패킷 하나당 응답 하나를 같은 순번으로 돌려줌
+    """
+    def handle(self):
+        server = self.server.kct
+        buffer = b''
+        while True:
+            data = self.request.recv(4096)
+            if not data:
+                break
+            buffer += data
+            while len(buffer) >= KCTPacket.SIZE:
+                packet, buffer = KCTPacket(buffer[:KCTPacket.SIZE]), buffer[KCTPacket.SIZE:]
+                self.request.sendall(bytes(server.respond(packet)))
+
+
+class FakeKCTServer:
+    """
+    가짜 KCT 서버 : 할당 상태를 메모리에 저장하고 허용 TPS를 넘으면 '13' 응답
+    """
+    def __init__(self, host='127.0.0.1', port=0, tps=0):
+        self.tps = tps
+        self.assigned = {}
+        self.received = []
+        self.results = {}
+        self.lock = threading.Lock()
+        self.window = []
+        self.tcp = socketserver.ThreadingTCPServer((host, port), FakeKCTHandler)
+        self.tcp.daemon_threads = True
+        self.tcp.kct = self
+
+    @property
+    def address(self):
+        return self.tcp.server_address
+
+    def set_result(self, packet_id, result):
+        """지정한 패킷 번호에 대해 강제로 돌려줄 결과 코드"""
+        self.results[int(packet_id)] = result
+
+    def is_over_tps(self):
+        if not self.tps:
+            return False
+        now = time.monotonic()
+        self.window = [t for t in self.window if now - t < 1]
+        if len(self.window) >= self.tps:
+            return True
+        self.window.append(now)
+        return False
+
+    def respond(self, packet):
+        with self.lock:
+            self.received.append(packet)
+            packet_id = int(packet['packet_id'])
+            result = self.results.get(packet_id)
+            if not result and packet_id not in (2500, 2600) and self.is_over_tps():
+                result = '13'
+            if not result:
+                result = self.process(packet_id, packet)
+        response = KCTPacket(**packet)
+        response['result'] = result
+        return response
+
+    def process(self, packet_id, packet):
+        safety_number = packet.get('safety_number', '')
+        if packet_id == 2501:
+            self.assigned[safety_number] = packet.get('phone_number_1', '')
+        elif packet_id == 2502:
+            if safety_number not in self.assigned:
+                return '12'
+            del self.assigned[safety_number]
+        elif packet_id not in (2500, 2503, 2504, 2600):
+            return '02'
+        return '00'
+
+    def start(self):
+        threading.Thread(target=self.tcp.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.tcp.shutdown()
+        self.tcp.server_close()
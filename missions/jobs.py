@@ -0,0 +1,49 @@
+from django.conf import settings
+
+from base.jobs import http_job
+from .models import Bid
+
+
+"""
+미션 관련 외부 http 호출 작업
+"""
+
+
+@http_job('bid_location')
+def update_bid_location(client, bid_id):
+    """입찰 좌표로 행정동 검색 (카카오 좌표->주소 변환)"""
+    bid = Bid.objects.filter(id=bid_id).values('longitude', 'latitude').first()
+    if not bid or not bid['longitude'] or not bid['latitude']:
+        return None
+    headers = {
+        'Authorization': 'KakaoAK %s' % settings.KAKAO_REST_API_KEY,
+        'content-type': 'application/json',
+    }
+    params = {
+        'x': str(bid['longitude']),
+        'y': str(bid['latitude'])
+    }
+    res = client.get(settings.KAKAO_LOCATION_URL, headers=headers, params=params)
+    res.raise_for_status()
+    documents = res.json().get('documents')
+    if not documents:
+        return None
+    location = documents[0]['address_name']
+    Bid.objects.filter(id=bid_id).update(location=location)
+    return {'location': location}
+
+
+@http_job('matching_success')
+def call_matching_success_url(client, url, code):
+    """제휴사 템플릿 미션 매칭성공 url 호출"""
+    res = client.get(url, params={'code': code})
+    res.raise_for_status()
+    return {'status_code': res.status_code}
+
+
+@http_job('kct_relay')
+def call_kct_relay(client, method, bid_id):
+    """안심번호 중계서버에 입찰 안심번호 할당/해제 요청"""
+    res = client.request(method, settings.KCT_RELAY_URL + str(bid_id) + '/')
+    res.raise_for_status()
+    return {'status_code': res.status_code}
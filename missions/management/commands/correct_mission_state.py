@@ -1,8 +1,7 @@
-from copy import deepcopy
-
 from django.core.management.base import BaseCommand
 
-from missions.models import MultiMission, MultiAreaMission, Mission, Bid
+from missions.models import Mission, Bid
+from missions.states import BulkStateRecompute
 
 
 class Command(BaseCommand):
@@ -10,12 +9,18 @@ class Command(BaseCommand):
     미션 관련 데이터 초기화 커맨드
     """
 
-    def handle(self, *args, **options):
-        # 입찰
-        for bid in Bid.objects.filter(saved_state_id='user_canceled', won_datetime__isnull=False):
-            state = deepcopy(bid.state)
-            bid.set_state()
-            if state != bid.state:
-                print(bid.id, 'has changed state.')
-
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument(
+            '--dry-run', action='store_true', dest='dry_run',
+            help='저장하지 않고 바뀔 상태 건수만 출력',
+        )
 
+    def handle(self, *args, **options):
+        # 낙찰 후 취소된 입찰과 그 미션
+        bids = Bid.objects.filter(saved_state_id='user_canceled', won_datetime__isnull=False)
+        missions = Mission.objects.filter(id__in=list(bids.values_list('mission_id', flat=True)))
+        recompute = BulkStateRecompute(dry_run=options['dry_run'])
+        recompute.run(bids=bids, missions=missions)
+        for line in recompute.get_report_lines():
+            print(line)
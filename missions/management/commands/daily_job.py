@@ -19,22 +19,27 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         # 가입 72시간 이내에 미션요청 없음
         recent_users = User.objects.get_joined_before(days=3).get_active_users()
-        for u in recent_users.filter(missions__requested_datetime__isnull=True).distinct('id'):
-            Tasker.objects.task('joined_remind_72', user=u)
+        Tasker.objects.task_many('joined_remind_72', [
+            (u, {}) for u in recent_users.filter(missions__requested_datetime__isnull=True).distinct('id')
+        ])
 
         today = timezone.now().date()
 
         # 쿠폰 만료 5일 전
         not_used_coupons = Coupon.objects.filter(used_datetime__isnull=True)
-        for c in not_used_coupons.filter(expire_date=today + timezone.timedelta(days=5)):
-            kwargs = {'coupon_name': c.name, 'coupon_expire': c.expire_date}
-            Tasker.objects.task('coupon_expire_remind_5d', user=c.user, kwargs=kwargs)
+        coupons = not_used_coupons.filter(expire_date=today + timezone.timedelta(days=5))\
+            .select_related('user', 'template')
+        Tasker.objects.task_many('coupon_expire_remind_5d', [
+            (c.user, {'coupon_name': c.name, 'coupon_expire': c.expire_date}) for c in coupons
+        ])
 
         # 쿠폰 만료 10일 전
         not_used_coupons = Coupon.objects.filter(used_datetime__isnull=True)
-        for c in not_used_coupons.filter(expire_date=today + timezone.timedelta(days=10)):
-            kwargs = {'coupon_name': c.name, 'coupon_expire': c.expire_date}
-            Tasker.objects.task('coupon_expire_remind_10d', user=c.user, kwargs=kwargs)
+        coupons = not_used_coupons.filter(expire_date=today + timezone.timedelta(days=10))\
+            .select_related('user', 'template')
+        Tasker.objects.task_many('coupon_expire_remind_10d', [
+            (c.user, {'coupon_name': c.name, 'coupon_expire': c.expire_date}) for c in coupons
+        ])
 
         # 한달 이상 만료되지 않은 안심번호 만료처리
         before_30_days = timezone.now() - timezone.timedelta(days=30)
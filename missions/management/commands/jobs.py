@@ -70,30 +70,35 @@ class Command(BaseCommand):
         latest_points = Point.objects.filter(
             user__is_active=True, user___is_service_blocked=False, user__withdrew_datetime__isnull=True,
             user__helper__isnull=True, user__last_login__lt=one_month_ago
-        ).order_by('user_id', '-id').distinct('user_id')
-        for p in latest_points:
-            if p.balance >= 1000:
-                Tasker.objects.task('regular_point_balance', user=p.user, kwargs={'balance': add_comma(p.balance)})
+        ).order_by('user_id', '-id').distinct('user_id').select_related('user')
+        Tasker.objects.task_many('regular_point_balance', [
+            (p.user, {'balance': add_comma(p.balance)}) for p in latest_points if p.balance >= 1000
+        ])
 
     def joined_remind_72(self):
         """가입 72시간 이내에 미션요청 없음 알림"""
         recent_users = User.objects.get_joined_before(days=3).get_active_users()
-        for u in recent_users.filter(missions__requested_datetime__isnull=True).distinct('id'):
-            Tasker.objects.task('joined_remind_72', user=u)
+        Tasker.objects.task_many('joined_remind_72', [
+            (u, {}) for u in recent_users.filter(missions__requested_datetime__isnull=True).distinct('id')
+        ])
 
     def coupon_expire_in_5_days(self):
         """쿠폰 만료 5일 전 알림"""
         not_used_coupons = Coupon.objects.filter(used_datetime__isnull=True)
-        for c in not_used_coupons.filter(expire_date=self.today + timezone.timedelta(days=5)):
-            kwargs = {'coupon_name': c.name, 'coupon_expire': c.expire_date}
-            Tasker.objects.task('coupon_expire_remind_5d', user=c.user, kwargs=kwargs)
+        coupons = not_used_coupons.filter(expire_date=self.today + timezone.timedelta(days=5))\
+            .select_related('user', 'template')
+        Tasker.objects.task_many('coupon_expire_remind_5d', [
+            (c.user, {'coupon_name': c.name, 'coupon_expire': c.expire_date}) for c in coupons
+        ])
 
     def coupon_expire_in_10_days(self):
         """쿠폰 만료 10일 전 알림"""
         not_used_coupons = Coupon.objects.filter(used_datetime__isnull=True)
-        for c in not_used_coupons.filter(expire_date=self.today + timezone.timedelta(days=10)):
-            kwargs = {'coupon_name': c.name, 'coupon_expire': c.expire_date}
-            Tasker.objects.task('coupon_expire_remind_10d', user=c.user, kwargs=kwargs)
+        coupons = not_used_coupons.filter(expire_date=self.today + timezone.timedelta(days=10))\
+            .select_related('user', 'template')
+        Tasker.objects.task_many('coupon_expire_remind_10d', [
+            (c.user, {'coupon_name': c.name, 'coupon_expire': c.expire_date}) for c in coupons
+        ])
 
     def unassign_safety_number_passed_a_month(self):
         """한달 이상 만료되지 않은 안심번호 만료처리"""
@@ -5,6 +5,7 @@ from common.admin import log_with_reason
 from notification.models import Notification, Tasker
 from missions.models import Mission, Bid, Interaction
 from missions.models import SafetyNumber
+from missions.states import BulkStateRecompute
 
 
 class Command(BaseCommand):
@@ -22,8 +23,11 @@ class Command(BaseCommand):
             obj.accept()
             log_with_reason(obj.receiver, obj, 'changed', '미션 완료요청 응답시간 초과로 자동완료 처리')
 
-        for mission in Mission.objects.filter(saved_state__code='in_action'):
-            mission.set_state()
+        # 수행중 미션과 그 입찰 상태 일괄 재계산
+        BulkStateRecompute().run(
+            bids=Bid.objects.filter(mission__saved_state='in_action'),
+            missions=Mission.objects.filter(saved_state='in_action'),
+        )
 
         # 시간초과 취소 미션 푸쉬 발송
         # memo: 1분 스크립트로 이동
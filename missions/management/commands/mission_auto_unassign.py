@@ -3,7 +3,7 @@ from django.utils import timezone
 
 from common.admin import log_with_reason
 from notification.models import Notification, Tasker
-from missions.models import Mission, Bid, SafetyNumber
+from missions.models import Mission, Bid, SafetyNumber, MissionDeadline
 
 
 class Command(BaseCommand):
@@ -12,74 +12,65 @@ class Command(BaseCommand):
     """
 
     def handle(self, *args, **options):
-        # 10분 지난 헬퍼지정미션 자동 일반미션 전환 처리
-        ten_minutes_before = timezone.now() - timezone.timedelta(minutes=10)
-        no_responses = Bid.objects.filter(
-            is_assigned=True,
-            amount=0,
-            mission__requested_datetime__lte=ten_minutes_before
-        )
-        for obj in no_responses:
-            obj.unassign()
-            log_with_reason(obj.helper.user, obj, 'changed', '헬퍼지정미션 응답시간 초과로 일반미션 전환 처리')
-
-        # lock 후 10분 지나면 unlock
-        for obj in Bid.objects.filter(_locked_datetime__lte=ten_minutes_before):
-            obj.unlock()
-
-        # 타임아웃된 미션 처리
-        for mission in Mission.objects.filter(saved_state__code='bidding'):
-            mission.set_state()
-            if mission.is_timeout:
-                self.handle_timeout_missions(mission)
-
-        # 입찰중 상태에 있는 미션들 상태 다시 계산
-        bidded_mission_ids = set()
-        for obj in Bid.objects.filter(saved_state__code__in=['applied', 'waiting_assignee']):
-            obj.set_state()
-
-            # 입찰중인(낙찰되지 않은) 미션 중 입찰이 있는 미션 목록에 추가
-            if obj.saved_state.code == 'applied':
-                bidded_mission_ids.add(obj.mission_id)
-            else:
-                obj._mission.set_state()
+        # 기한이 된 것만 처리 : 입찰제한 시간초과, 낙찰자 선택 독려 푸쉬, 지정헬퍼 응답시간 초과, 입찰 잠금 해제
+        for deadline in MissionDeadline.objects.due().select_related('mission', 'bid').order_by('due_datetime'):
+            if not MissionDeadline.objects.claim(deadline):
+                continue
+            try:
+                getattr(self, 'handle_%s' % deadline.deadline_type)(deadline)
+            except Exception as e:
+                print('MissionDeadline', deadline.id, deadline, ':', e)
 
         # 안심번호 미할당인 수행중 미션에 번호 할당
         for bid in Bid.objects.filter(saved_state='in_action', customer_safety_number__isnull=True,
                                       won_datetime__gte=timezone.now() - timezone.timedelta(hours=1)):
             SafetyNumber.objects.assign_pair_from_bid(bid)
 
-        # 낙찰자 선택 독려 푸쉬
-        missions = Mission.objects.filter(id__in=bidded_mission_ids).exclude(mission_type__push_before_finish=0)
-        for mission in missions:
-            left = mission.bid_limit_datetime - timezone.now()
-            if (left - timezone.timedelta(minutes=mission.mission_type.push_before_finish)).seconds <= 60 \
-                    and mission.bidded_count > 0:
-                if mission.is_web:
-                    # Notification.objects.sms_preset(mission.user, 'select_helper_before_timeout',
-                    #                                 args=[mission.bidded_count, mission.shortened_url])
-                    Tasker.objects.task('web_select_helper_before_timeout', user=mission.user, kwargs={
-                        'count': mission.bidded_count,
-                        'url': mission.shortened_url
-                    })
-                else:
-                    # Notification.objects.push_preset(mission.user, 'select_helper_before_timeout',
-                    #                                  kwargs={'obj_id': mission.id})
-                    Tasker.objects.task('select_helper_before_timeout', user=mission.user,
-                                        kwargs={'count': mission.bidded_count}, data={'obj_id': mission.id})
+        # 발송 워커가 처리하지 못한 발송 대기 알림
+        for notification in Notification.objects.filter(id__in=Notification.objects.claim(limit=100)):
+            notification.send_from_outbox()
 
-        # lazy 푸시 알림
-        notifications = Notification.objects.filter(
-            send_method__in=['push', 'kakao'],
-            requested_datetime__isnull=True,
-            created_datetime__gt=timezone.now() - timezone.timedelta(minutes=5),
-            created_datetime__lte=timezone.now() - timezone.timedelta(minutes=1)
-        )
-        for n in notifications:
-            try:
-                n.send()
-            except ValueError:
-                print('Notification', n.id, n, ': no target user')
+    def handle_bid_limit(self, deadline):
+        """타임아웃된 미션 처리"""
+        mission = deadline.mission
+        state = mission.saved_state_id
+        if state not in ('bidding', 'waiting_assignee'):
+            return
+        mission.set_state()  # 미션과 입찰 상태 재계산
+        if state == 'bidding' and mission.saved_state_id == 'timeout_canceled':
+            self.handle_timeout_missions(mission)
+
+    def handle_select_helper(self, deadline):
+        """낙찰자 선택 독려 푸쉬"""
+        mission = deadline.mission
+        if mission.saved_state_id != 'bidding' or mission.is_timeout or not mission.bidded_count:
+            return
+        if mission.is_web:
+            # Notification.objects.sms_preset(mission.user, 'select_helper_before_timeout',
+            #                                 args=[mission.bidded_count, mission.shortened_url])
+            Tasker.objects.task('web_select_helper_before_timeout', user=mission.user, kwargs={
+                'count': mission.bidded_count,
+                'url': mission.shortened_url
+            })
+        else:
+            # Notification.objects.push_preset(mission.user, 'select_helper_before_timeout',
+            #                                  kwargs={'obj_id': mission.id})
+            Tasker.objects.task('select_helper_before_timeout', user=mission.user,
+                                kwargs={'count': mission.bidded_count}, data={'obj_id': mission.id})
+
+    def handle_assign_timeout(self, deadline):
+        """10분 지난 헬퍼지정미션 자동 일반미션 전환 처리"""
+        obj = deadline.bid
+        if not obj.is_assigned or obj.amount:
+            return
+        obj.unassign()
+        log_with_reason(obj.helper.user, obj, 'changed', '헬퍼지정미션 응답시간 초과로 일반미션 전환 처리')
+
+    def handle_unlock(self, deadline):
+        """lock 후 10분 지나면 unlock (다시 잠긴 경우에는 새로 등록된 기한에서 처리)"""
+        obj = deadline.bid
+        if obj._locked_datetime and obj._locked_datetime <= timezone.now() - MissionDeadline.LOCK_TIMEOUT:
+            obj.unlock()
 
     def handle_timeout_missions(self, mission):
         if mission.is_web:
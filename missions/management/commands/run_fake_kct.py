@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from missions.fake_kct import FakeKCTServer
+
+
+class Command(BaseCommand):
+    """
+    로컬 개발용 가짜 KCT 안심번호 서버 실행 커맨드 (KCT_CONNECT_HOST/PORT 를 이 서버로 지정)
+    """
+
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument('--port', type=int, dest='port', default=60001, help='포트')
+        parser.add_argument('--tps', type=int, dest='tps', default=0, help='허용 TPS (0이면 제한 없음)')
+
+    def handle(self, *args, **options):
+        server = FakeKCTServer(port=options['port'], tps=options['tps']).start()
+        print('Fake KCT server on %s:%s' % server.address)
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            server.stop()
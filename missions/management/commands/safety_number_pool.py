@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from missions.models import SafetyNumber, SafetyNumberSlot
+
+
+class Command(BaseCommand):
+    """
+    안심번호 풀 사용량 확인 커맨드
+    """
+
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument(
+            '--sync', action='store_true', dest='sync',
+            help='현재 할당된 안심번호 기준으로 풀의 사용 여부를 다시 맞춤',
+        )
+
+    def handle(self, *args, **options):
+        if options['sync']:
+            self.sync()
+        for range_name, (used, total, percent) in SafetyNumberSlot.objects.get_usage().items():
+            print('%s : %s / %s (%s%%)' % (range_name, used, total, percent))
+
+    def sync(self):
+        using = {}
+        for number in SafetyNumber.objects.current_using().values_list('assigned_number', flat=True):
+            range_name = SafetyNumber.objects.get_range_name(number)
+            if range_name:
+                using.setdefault(range_name, []).append(number[-4:])
+        for range_name in SafetyNumber.objects.range_prefix:
+            used = '%s_used' % range_name
+            suffixes = using.get(range_name, [])
+            SafetyNumberSlot.objects.filter(**{used: True}).exclude(suffix__in=suffixes).update(**{used: False})
+            SafetyNumberSlot.objects.filter(**{used: False}, suffix__in=suffixes).update(**{used: True})
@@ -1,6 +1,10 @@
+import dateutil.parser
+
 from django.core.management.base import BaseCommand
+from django.utils import timezone
 
-from missions.models import MultiMission, MultiAreaMission, Mission, Bid
+from missions.models import MultiMission, MultiAreaMission
+from missions.states import BulkStateRecompute
 
 
 class Command(BaseCommand):
@@ -8,19 +12,37 @@ class Command(BaseCommand):
     미션 관련 데이터 초기화 커맨드
     """
 
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument(
+            '--dry-run', action='store_true', dest='dry_run',
+            help='저장하지 않고 바뀔 상태 건수만 출력',
+        )
+        parser.add_argument(
+            '--since', type=str, dest='since',
+            help='이 일시 이후에 변경된 미션만 재계산 (예: 2023-04-17 또는 2023-04-17T11:52)',
+        )
+
     def handle(self, *args, **options):
-        # 입찰
-        for bid in Bid.objects.filter(saved_state_id='not_applied'):
-            bid.set_state()
+        since = None
+        if options['since']:
+            since = dateutil.parser.parse(options['since'])
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+
+        # 입찰, 미션
+        recompute = BulkStateRecompute(dry_run=options['dry_run'], since=since)
+        recompute.run()
+        for line in recompute.get_report_lines():
+            print(line)
 
-        # 미션
-        for mission in Mission.objects.filter(saved_state_id='draft'):
-            mission.set_state()
+        if options['dry_run']:
+            return
 
-        # 미션
+        # 다중지역 미션
         for area_mission in MultiAreaMission.objects.filter(saved_state_id='draft'):
             area_mission.set_state()
 
-        # 미션
+        # 다중 미션
         for multi_mission in MultiMission.objects.filter(saved_state_id='draft'):
             multi_mission.set_state()
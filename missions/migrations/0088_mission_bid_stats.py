@@ -0,0 +1,55 @@
+from django.db import migrations, models
+
+
+BACKFILL_SQL = """
+UPDATE missions_mission m SET
+    _bidded_count = (
+        SELECT COUNT(*) FROM missions_bid b
+        WHERE b.mission_id = m.id AND b._canceled_datetime IS NULL AND b.applied_datetime IS NOT NULL
+    ),
+    _bidded_lowest = COALESCE((
+        SELECT MIN(b.amount) FROM missions_bid b
+        WHERE b.mission_id = m.id AND b._canceled_datetime IS NULL AND b.applied_datetime IS NOT NULL
+    ), 0),
+    _active_bid_id = (
+        SELECT MAX(b.id) FROM missions_bid b
+        WHERE b.mission_id = m.id AND b.won_datetime IS NOT NULL AND b._canceled_datetime IS NULL
+    ),
+    _won_amount = (
+        SELECT b.amount FROM missions_bid b
+        WHERE b.mission_id = m.id AND b.won_datetime IS NOT NULL
+        ORDER BY b.id DESC LIMIT 1
+    )
+WHERE EXISTS (SELECT 1 FROM missions_bid b WHERE b.mission_id = m.id);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('missions', '0087_auto_20230417_1152'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mission',
+            name='_bidded_count',
+            field=models.PositiveIntegerField(blank=True, default=0, verbose_name='입찰 수'),
+        ),
+        migrations.AddField(
+            model_name='mission',
+            name='_bidded_lowest',
+            field=models.IntegerField(blank=True, default=0, verbose_name='최저 입찰가'),
+        ),
+        migrations.AddField(
+            model_name='mission',
+            name='_active_bid_id',
+            field=models.IntegerField(blank=True, null=True, verbose_name='진행중인 낙찰 입찰 id'),
+        ),
+        migrations.AddField(
+            model_name='mission',
+            name='_won_amount',
+            field=models.IntegerField(blank=True, null=True, verbose_name='낙찰가'),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, migrations.RunSQL.noop),
+    ]
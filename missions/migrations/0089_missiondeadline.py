@@ -0,0 +1,62 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+SCHEDULE_SQL = """
+INSERT INTO missions_missiondeadline (deadline_type, mission_id, bid_id, due_datetime, created_datetime)
+SELECT 'bid_limit', m.id, NULL, m.bid_limit_datetime, now()
+FROM missions_mission m
+WHERE m.saved_state_id IN ('bidding', 'waiting_assignee') AND m.bid_limit_datetime IS NOT NULL;
+
+INSERT INTO missions_missiondeadline (deadline_type, mission_id, bid_id, due_datetime, created_datetime)
+SELECT 'select_helper', m.id, NULL, m.bid_limit_datetime - t.push_before_finish * interval '1 minute', now()
+FROM missions_mission m JOIN missions_missiontype t ON t.id = m.mission_type_id
+WHERE m.saved_state_id = 'bidding' AND m.bid_limit_datetime IS NOT NULL AND t.push_before_finish > 0
+    AND m.bid_limit_datetime - t.push_before_finish * interval '1 minute' > now();
+
+INSERT INTO missions_missiondeadline (deadline_type, mission_id, bid_id, due_datetime, created_datetime)
+SELECT 'assign_timeout', b.mission_id, b.id, m.requested_datetime + interval '10 minutes', now()
+FROM missions_bid b JOIN missions_mission m ON m.id = b.mission_id
+WHERE b.is_assigned AND b.amount = 0 AND m.requested_datetime IS NOT NULL;
+
+INSERT INTO missions_missiondeadline (deadline_type, mission_id, bid_id, due_datetime, created_datetime)
+SELECT 'unlock', b.mission_id, b.id, b._locked_datetime + interval '10 minutes', now()
+FROM missions_bid b
+WHERE b._locked_datetime IS NOT NULL AND b.mission_id IS NOT NULL;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('missions', '0088_mission_bid_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MissionDeadline',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('deadline_type', models.CharField(choices=[('bid_limit', '입찰제한 시간초과'), ('select_helper', '낙찰자 선택 독려 푸쉬'), ('assign_timeout', '지정헬퍼 응답시간 초과'), ('unlock', '입찰 잠금 해제')], max_length=20, verbose_name='기한 유형')),
+                ('due_datetime', models.DateTimeField(verbose_name='기한')),
+                ('created_datetime', models.DateTimeField(auto_now_add=True, verbose_name='등록 일시')),
+                ('processed_datetime', models.DateTimeField(blank=True, null=True, verbose_name='처리 일시')),
+                ('bid', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='deadlines', to='missions.Bid', verbose_name='입찰')),
+                ('mission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deadlines', to='missions.Mission', verbose_name='미션')),
+            ],
+            options={
+                'verbose_name': '미션 기한',
+                'verbose_name_plural': '미션 기한',
+                'index_together': {('processed_datetime', 'due_datetime')},
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='missiondeadline',
+            constraint=models.UniqueConstraint(condition=models.Q(bid__isnull=False, processed_datetime__isnull=True), fields=('deadline_type', 'mission', 'bid'), name='unique_pending_bid_deadline'),
+        ),
+        migrations.AddConstraint(
+            model_name='missiondeadline',
+            constraint=models.UniqueConstraint(condition=models.Q(bid__isnull=True, processed_datetime__isnull=True), fields=('deadline_type', 'mission'), name='unique_pending_mission_deadline'),
+        ),
+        migrations.RunSQL(SCHEDULE_SQL, migrations.RunSQL.noop),
+    ]
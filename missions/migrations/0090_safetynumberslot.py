@@ -0,0 +1,60 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+POPULATE_SQL = """
+INSERT INTO missions_safetynumberslot (suffix, customer_used, helper_used, normal_used, released_datetime)
+SELECT lpad(n::text, 4, '0'), false, false, false, now()
+FROM generate_series(0, 9999) n;
+
+UPDATE missions_safetynumberslot s SET
+    customer_used = EXISTS (
+        SELECT 1 FROM missions_safetynumber n
+        WHERE n.assigned_number = '05084896' || s.suffix
+            AND n.assigned_datetime IS NOT NULL AND n.unassigned_datetime IS NULL
+    ),
+    helper_used = EXISTS (
+        SELECT 1 FROM missions_safetynumber n
+        WHERE n.assigned_number = '05084897' || s.suffix
+            AND n.assigned_datetime IS NOT NULL AND n.unassigned_datetime IS NULL
+    ),
+    normal_used = EXISTS (
+        SELECT 1 FROM missions_safetynumber n
+        WHERE n.assigned_number = '05084898' || s.suffix
+            AND n.assigned_datetime IS NOT NULL AND n.unassigned_datetime IS NULL
+    );
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('missions', '0089_missiondeadline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SafetyNumberSlot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('suffix', models.CharField(max_length=4, unique=True, verbose_name='뒷자리')),
+                ('customer_used', models.BooleanField(default=False, verbose_name='고객 대역 사용')),
+                ('helper_used', models.BooleanField(default=False, verbose_name='헬퍼 대역 사용')),
+                ('normal_used', models.BooleanField(default=False, verbose_name='일반 대역 사용')),
+                ('released_datetime', models.DateTimeField(default=django.utils.timezone.now, verbose_name='반환 일시')),
+            ],
+            options={
+                'verbose_name': '안심번호 풀',
+                'verbose_name_plural': '안심번호 풀',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='safetynumberslot',
+            index=models.Index(condition=models.Q(customer_used=False, helper_used=False), fields=['released_datetime'], name='safety_slot_free_pair'),
+        ),
+        migrations.AddIndex(
+            model_name='safetynumberslot',
+            index=models.Index(condition=models.Q(normal_used=False), fields=['released_datetime'], name='safety_slot_free_normal'),
+        ),
+        migrations.RunSQL(POPULATE_SQL, migrations.RunSQL.noop),
+    ]
@@ -1,13 +1,12 @@
 import dateutil.parser
 import statistics
 import re
-from random import randrange
 
-import requests
 import short_url
 
-from django.db import models
-from django.db.models.functions import Concat, Substr
+from django.db import models, transaction
+from django.db.models.functions import Concat, Substr, Coalesce
+from django.contrib.postgres.aggregates import ArrayAgg
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.contrib.postgres.fields import ArrayField, JSONField
 from django.utils import timezone
@@ -21,12 +20,13 @@ from common.admin import log_with_reason
 from common.utils import UploadFileHandler, stars, add_comma, list_to_concat_string
 from common.validators import MobileNumberOnlyValidators
 from common.exceptions import Errors, ValidationError
-from base.models import anyman
+from base.models import anyman, AreaReach, HttpJob
 from base.constants import MISSION_STATUS, MISSION_STATE_CLASSES
 from accounts.models import Partnership, State, User, Helper, Area, MobileVerification
 from notification.models import Notification, Tasker
 from notification.utils import FirebaseFirestoreChatHandler
-from .utils import KeywordWarning, KCTSafetyNumber
+from .utils import KeywordWarning, KCTSafetyNumber, AvailableMissionCache
+from .states import StateEngine
 
 
 anytalk = FirebaseFirestoreChatHandler()
@@ -51,22 +51,19 @@ class SafetyNumberQuerySet(models.QuerySet):
         'normal': '8'
     }
 
-    @classmethod
-    def get_random_4_number(cls):
-        return str(randrange(0, 9999)).zfill(4)
-
-    def get_available_random_4_number(self, range_name):
-        prefix = self.number_prefix + self.range_prefix[range_name]
-        current_using_list = self.current_using().filter(assigned_number__startswith=prefix)\
-            .values_list('assigned_number', flat=True)
-        while True:
-            suffix = self.get_random_4_number()
-            if prefix + suffix not in current_using_list:
-                break
-        return suffix
+    def get_range_name(self, assigned_number):
+        """안심번호의 대역명, 안심번호 대역이 아니면 None"""
+        if not assigned_number.startswith(self.number_prefix) or len(assigned_number) != len(self.number_prefix) + 5:
+            return None
+        range_code = assigned_number[len(self.number_prefix)]
+        for range_name, prefix in self.range_prefix.items():
+            if prefix == range_code:
+                return range_name
+        return None
 
-    def get_available_random_number(self, range_name):
-        return self.number_prefix + self.range_prefix[range_name] + self.get_available_random_4_number(range_name)
+    def get_available_4_number(self, *range_names):
+        """빈 번호 풀에서 뒷자리 4자리 할당 (여러 대역 지정시 모든 대역에서 비어있는 번호)"""
+        return SafetyNumberSlot.objects.allocate(*range_names)
 
     def current_using(self, **kwargs):
         qs = self.filter(assigned_datetime__isnull=False, unassigned_datetime__isnull=True)
@@ -75,50 +72,132 @@ class SafetyNumberQuerySet(models.QuerySet):
         return qs
 
     def assign(self, user, safety_number='', range_name='normal'):
-        # 휴대폰 번호 정상여부 체크
-        if not user.mobile or not user.mobile.isnumeric():
-            return None
+        """
+        안심번호 할당 : 번호를 지정하지 않거나 뒷자리 4자리만 지정한 경우는 빈 번호 풀의 번호이므로 실패하면 풀로 반환
+        """
+        from_pool = len(safety_number) <= 4
+        is_valid_mobile = bool(user.mobile and user.mobile.isnumeric())
 
-        # 번호 지정이 없으면 랜덤 생성
+        # 번호 지정이 없으면 빈 번호 풀에서 할당
         if not safety_number:
-            safety_number = self.get_available_random_number(range_name)
+            if not is_valid_mobile:
+                return None
+            safety_number = self.get_available_4_number(range_name)
+            if not safety_number:
+                return None
 
-        if len(safety_number) is 4:
+        if len(safety_number) == 4:
             safety_number = self.number_prefix + self.range_prefix[range_name] + safety_number
 
-        obj = self.create(assigned_number=safety_number, number=user.mobile, user=user)  # 중복 생성을 방지하기 위해 일단 할당 전에 레코드 생성
-        obj.assign()
-        return obj if obj and obj.is_active else None
+        obj = None
+        try:
+            # 휴대폰 번호 정상여부 체크
+            if is_valid_mobile:
+                obj = self.create(assigned_number=safety_number, number=user.mobile, user=user)  # 중복 생성을 방지하기 위해 일단 할당 전에 레코드 생성
+                if not obj.assign():
+                    obj = None
+        finally:
+            if obj is None and from_pool:
+                SafetyNumberSlot.objects.release(safety_number)
+        return obj
 
     def assign_pair_from_bid(self, bid):
         try:
             relay_url = getattr(settings, 'KCT_RELAY_URL')
             if relay_url:
-                requests.get(relay_url + str(bid.id) + '/')
+                HttpJob.objects.enqueue('kct_relay', ordering_key='kct_relay:%s' % bid.id,
+                                        method='get', bid_id=bid.id)
             else:
-                suffix = self.get_available_random_4_number('customer')
-                bid.customer_safety_number = self.assign(bid._mission.user, suffix, 'customer')
-                bid.helper_safety_number = self.assign(bid.helper.user, suffix, 'helper')
-                bid.save()
+                self._assign_pair(bid)
         except:
             pass
 
+    def _assign_pair(self, bid):
+        """
+        고객/헬퍼 대역의 같은 뒷자리로 한 쌍을 할당하고, 둘 다 할당해서 저장하지 못하면 모두 해제해서 풀로 반환
+        (assign() 이 실패하면 그 번호는 assign() 에서 반환하므로, 여기서는 assign() 을 호출하지 않은 대역만 반환)
+        """
+        suffix = self.get_available_4_number('customer', 'helper')
+        if not suffix:
+            return
+        customer = helper = None
+        attempted = set()
+        saved = False
+        try:
+            attempted.add('customer')
+            customer = self.assign(bid._mission.user, suffix, 'customer')
+            if customer:
+                attempted.add('helper')
+                helper = self.assign(bid.helper.user, suffix, 'helper')
+            if customer and helper:
+                bid.customer_safety_number, bid.helper_safety_number = customer, helper
+                bid.save()
+                saved = True
+        finally:
+            if not saved:
+                for range_name, obj in (('customer', customer), ('helper', helper)):
+                    if obj:
+                        obj.unassign()
+                    elif range_name not in attempted:
+                        SafetyNumberSlot.objects.release(self.number_prefix + self.range_prefix[range_name] + suffix)
+
     def unassign_pair_from_bid(self, bid):
         try:
             relay_url = getattr(settings, 'KCT_RELAY_URL')
             if relay_url:
-                requests.delete(relay_url + str(bid.id) + '/')
+                HttpJob.objects.enqueue('kct_relay', ordering_key='kct_relay:%s' % bid.id,
+                                        method='delete', bid_id=bid.id)
             else:
-                if bid.customer_safety_number:
-                    bid.customer_safety_number.unassign()
-                if bid.helper_safety_number:
-                    bid.helper_safety_number.unassign()
+                self.unassign_many([bid.customer_safety_number, bid.helper_safety_number])
         except:
             pass
 
     def unassign_by_user(self, user):
-        for safety_number in self.current_using(user=user):
-            safety_number.unassign()
+        self.unassign_many(self.current_using(user=user))
+
+    def unassign_many(self, safety_numbers):
+        """안심번호들을 해제하고 KCT 해제 요청은 한 번에 보냄"""
+        unassigned = [obj for obj in safety_numbers if obj and obj.unassign(send=False)]
+        if unassigned:
+            kct.unassign_numbers([obj.assigned_number for obj in unassigned])
+        return unassigned
+
+
+class SafetyNumberSlotQuerySet(models.QuerySet):
+    """
+    안심번호 빈 번호 풀 쿼리셋
+    """
+    def allocate(self, *range_names):
+        """
+        지정한 대역이 모두 비어있는 번호 하나를 사용중으로 표시하고 뒷자리 4자리 반환 (없으면 None)
+        다른 트랜잭션이 잠근 번호는 건너뛰므로 동시에 할당해도 중복되지 않음
+        """
+        free = {'%s_used' % range_name: False for range_name in range_names}
+        with transaction.atomic():
+            slot = self.select_for_update(skip_locked=True).filter(**free).order_by('released_datetime').first()
+            if not slot:
+                return None
+            self.filter(id=slot.id).update(**{key: True for key in free})
+        return slot.suffix
+
+    def release(self, assigned_number):
+        """안심번호를 빈 번호 풀로 반환"""
+        range_name = SafetyNumber.objects.get_range_name(assigned_number)
+        if not range_name:
+            return False
+        return bool(self.filter(suffix=assigned_number[-4:], **{'%s_used' % range_name: True})
+                    .update(**{'%s_used' % range_name: False, 'released_datetime': timezone.now()}))
+
+    def get_usage(self):
+        """대역별 사용량 : {대역명: (사용중, 전체, 사용률)}"""
+        range_names = SafetyNumberQuerySet.range_prefix.keys()
+        counts = self.aggregate(
+            total=models.Count('id'),
+            **{name: models.Count('id', filter=models.Q(**{'%s_used' % name: True})) for name in range_names}
+        )
+        total = counts['total']
+        return {name: (counts[name], total, round(counts[name] / total * 100, 1) if total else 0)
+                for name in range_names}
 
 
 class AddressManager(models.Manager):
@@ -168,8 +247,7 @@ class MultiMissionQuerySet(models.QuerySet):
         area_ids = area_ids or user.helper.accept_area_ids
         return self.requested().in_bidding().filter(
             models.Q(request_helpers=user.helper)
-            | models.Q(request_helpers__isnull=True, children__area__in=area_ids)
-            | models.Q(request_helpers__isnull=True, children__area__parent__in=area_ids)
+            | models.Q(request_helpers__isnull=True, children__area__in=AreaReach.objects.get_reachable_ids(area_ids))
         )
 
 
@@ -186,10 +264,8 @@ class MissionQuerySet(models.QuerySet):
 
     def available(self, helper_user, area_ids=[]):
         area_ids = area_ids or helper_user.helper.accept_area_ids
-        query = models.Q(stopovers__area__id__in=area_ids) \
-            | models.Q(stopovers__area__parent__id__in=area_ids) \
-            | models.Q(final_address__area__parent__id__in=area_ids) \
-            | models.Q(final_address__area__id__in=area_ids)
+        reachable_ids = AreaReach.objects.get_reachable_ids(area_ids)  # 지역 및 하위 지역
+        query = models.Q(stopovers__area__in=reachable_ids) | models.Q(final_address__area__in=reachable_ids)
         if helper_user.helper.is_online_acceptable:
             query = query | models.Q(final_address=None, request_areas=None)
         qs = self.filter(saved_state='bidding').filter(query)  # 요청 지역이 없는 미션이거나, 내 지역 및 인근지역 미션만 필터링
@@ -200,6 +276,24 @@ class MissionQuerySet(models.QuerySet):
         qs = qs.exclude(id__in=Bid.objects.applied(helper_user.id).values_list('mission_id', flat=True))  # 내가 입찰한 미션 제외
         return qs.distinct('id')
 
+    def available_from_cache(self, helper_user, area_ids=[]):
+        """
+        지역별 입찰가능 미션 후보 캐쉬에서 헬퍼별 제외 조건(블럭, 내 미션, 신고, 입찰)을 메모리에서 적용
+        결과는 available()과 같음
+        """
+        area_ids = area_ids or helper_user.helper.accept_area_ids
+        candidates = AvailableMissionCache().get_candidates(area_ids, online=helper_user.helper.is_online_acceptable)
+        now = timezone.now().timestamp()
+        excluded_user_ids = helper_user.blocked_ids | {helper_user.id}
+        excluded_ids = set(Report.objects.filter(created_user_id=helper_user.id, mission__isnull=False)
+                           .values_list('mission_id', flat=True))
+        excluded_ids |= set(Bid.objects.applied(helper_user.id).values_list('mission_id', flat=True))
+        ids = [
+            mission_id for mission_id, (user_id, bid_limit) in candidates.items()
+            if user_id not in excluded_user_ids and mission_id not in excluded_ids and not (bid_limit and bid_limit <= now)
+        ]
+        return self.filter(id__in=ids, saved_state='bidding')
+
     def assigned(self, helper_user):
         return self.filter(
             saved_state='waiting_assignee',
@@ -249,6 +343,67 @@ class MissionQuerySet(models.QuerySet):
     def in_action(self):
         return self.filter(id__in=Bid.objects.in_action().values_list('mission_id', flat=True))
 
+    def with_bid_stats(self):
+        """
+        목록 시리얼라이져용 입찰 집계 annotation
+        입찰 수, 최저 입찰가, 진행중인 낙찰 입찰은 미션에 저장된 집계값을 사용하고, 나머지는 서브쿼리로 한 번에 조회
+        (첨부파일, 진행중인 낙찰 입찰은 prefetch : prefetched_active_bids)
+        """
+        won = Bid.objects.filter(mission=models.OuterRef('pk'), won_datetime__isnull=False)
+        first_won = won.order_by('id')
+        return self.select_related('user', 'final_address', 'template', 'push_result').prefetch_related(
+            'files',
+            models.Prefetch(
+                'bids',
+                queryset=Bid.objects.filter(won_datetime__isnull=False, _canceled_datetime__isnull=True)
+                .select_related('helper__user', 'customer_safety_number', 'helper_safety_number'),
+                to_attr='prefetched_active_bids'
+            ),
+        ).annotate(
+            stats_assigned_bid_ids=Coalesce(
+                models.Subquery(
+                    Bid.objects.filter(mission=models.OuterRef('pk'), is_assigned=True)
+                    .values('mission').annotate(ids=ArrayAgg('id')).values('ids'),
+                    output_field=ArrayField(models.IntegerField())
+                ),
+                models.Value([], output_field=ArrayField(models.IntegerField()))
+            ),
+            stats_active_due=Coalesce(
+                models.Subquery(
+                    first_won.annotate(
+                        active_due=Coalesce('adjusted_due_datetime', 'due_datetime')
+                    ).values('active_due')[:1],
+                    output_field=models.DateTimeField()
+                ),
+                'due_datetime'
+            ),
+            stats_bid_canceled_datetime=Coalesce(
+                models.Subquery(first_won.values('_canceled_datetime')[:1], output_field=models.DateTimeField()),
+                'canceled_datetime'
+            ),
+            stats_bid_done_datetime=models.Subquery(
+                first_won.values('_done_datetime')[:1], output_field=models.DateTimeField()
+            ),
+        ).with_payment_summary()
+
+    def with_payment_summary(self):
+        """
+        낙찰된 입찰의 결제 집계 annotation (customer_paid, customer_point_used, customer_coupon_used 와 같은 값)
+        : payment_paid, payment_point_used, payment_coupon_used
+        """
+        Payment = apps.get_model('payment', 'Payment')
+        Coupon = apps.get_model('payment', 'Coupon')
+        payments = Payment.objects.filter(
+            bid__mission=models.OuterRef('pk'), bid__won_datetime__isnull=False
+        ).get_succeeded()
+        return self.annotate(
+            payment_paid=payments.sum_subquery('bid__mission'),
+            payment_point_used=payments.sum_subquery('bid__mission', models.F('point__amount') * -1),
+            payment_coupon_used=payments.filter(coupon__isnull=False).sum_subquery(
+                'bid__mission', Coupon.discount_expression(models.F('bid__amount'), 'coupon__template') * -1
+            ),
+        )
+
     def check_user_bidding(self, user_id):
         return self.filter(user_id=user_id, saved_state__code__in=('bidding', 'waiting_assignee')).exists()
 
@@ -283,6 +438,28 @@ class BidQuerySet(models.QuerySet):
     def in_action(self):
         return self.filter(saved_state='in_action')
 
+    def with_payment_summary(self):
+        """
+        결제 집계 annotation (customer_paid, customer_point_used, customer_coupon_used 와 같은 값)
+        : payment_paid, payment_point_used, payment_coupon_used
+        """
+        Payment = apps.get_model('payment', 'Payment')
+        Coupon = apps.get_model('payment', 'Coupon')
+        payments = Payment.objects.filter(bid=models.OuterRef('pk')).get_succeeded()
+        return self.annotate(
+            payment_paid=models.Case(
+                models.When(mission__isnull=True, then='amount'), default=payments.sum_subquery('bid'),
+                output_field=models.IntegerField()
+            ),
+            payment_point_used=models.Case(
+                models.When(mission__isnull=True, then=0), default=payments.sum_subquery('bid', 'point__amount'),
+                output_field=models.IntegerField()
+            ),
+            payment_coupon_used=payments.filter(coupon__isnull=False).sum_subquery(
+                'bid', Coupon.discount_expression(models.F('bid__amount'), 'coupon__template')
+            ),
+        )
+
     def canceled(self, days=None):
         qs = self.filter(applied_datetime__isnull=False, saved_state__in=[
                              'done_and_canceled', 'admin_canceled', 'user_canceled',
@@ -367,6 +544,40 @@ class ReportQuerySet(models.QuerySet):
         return self.filter(bid__helper__user=user).exclude(created_user=user)
 
 
+class MissionDeadlineQuerySet(models.QuerySet):
+    """
+    미션 기한 쿼리셋
+    """
+    def schedule(self, deadline_type, due_datetime, mission, bid=None):
+        """
+        처리되지 않은 같은 기한이 있으면 기한만 변경
+        (동시에 생성하면 부분 unique 제약으로 하나만 생성되고, 나머지는 update_or_create 에서 생성된 행을 다시 조회해서 변경)
+        """
+        if not due_datetime:
+            return None
+        obj, _ = self.update_or_create(
+            deadline_type=deadline_type, mission=mission, bid=bid, processed_datetime__isnull=True,
+            defaults={'due_datetime': due_datetime}
+        )
+        return obj
+
+    def schedule_mission(self, mission):
+        """요청된 미션의 기한 등록 : 입찰제한, 낙찰자 선택 독려 푸쉬, 지정헬퍼 응답시간"""
+        self.schedule('bid_limit', mission.bid_limit_datetime, mission)
+        if mission.bid_limit_datetime and mission.mission_type.push_before_finish:
+            self.schedule('select_helper', mission.bid_limit_datetime
+                          - timezone.timedelta(minutes=mission.mission_type.push_before_finish), mission)
+        for bid in mission.bids.filter(is_assigned=True, amount=0):
+            self.schedule('assign_timeout', mission.requested_datetime + MissionDeadline.ASSIGN_TIMEOUT, mission, bid)
+
+    def due(self, now=None):
+        return self.filter(processed_datetime__isnull=True, due_datetime__lte=now or timezone.now())
+
+    def claim(self, obj):
+        """중복 실행 방지 : 처리일시를 먼저 기록하는데 성공한 경우만 처리"""
+        return bool(self.filter(id=obj.id, processed_datetime__isnull=True).update(processed_datetime=timezone.now()))
+
+
 """
 models
 """
@@ -398,7 +609,6 @@ class SafetyNumber(models.Model):
     def assign(self):
         if self.assigned_datetime:
             return False
-        kct.login()
         response = kct.assign_number(self.assigned_number, self.user.mobile)
         if response:
             self.assigned_datetime = timezone.now()
@@ -406,16 +616,44 @@ class SafetyNumber(models.Model):
             return True
         return False
 
-    def unassign(self):
+    def unassign(self, send=True):
+        """할당 해제 (send 가 False 이면 KCT 해제 요청은 호출하는 쪽에서 모아서 보냄)"""
         if self.unassigned_datetime:
             return False
         self.unassigned_datetime = timezone.now()
         self.save()
-        kct.login()
-        kct.unassign_number(self.assigned_number)
+        SafetyNumberSlot.objects.release(self.assigned_number)
+        if send:
+            kct.unassign_number(self.assigned_number)
         return True
 
 
+class SafetyNumberSlot(models.Model):
+    """
+    안심번호 빈 번호 풀 : 뒷자리 4자리별 대역 사용 여부
+    """
+    suffix = models.CharField('뒷자리', max_length=4, unique=True)
+    customer_used = models.BooleanField('고객 대역 사용', default=False)
+    helper_used = models.BooleanField('헬퍼 대역 사용', default=False)
+    normal_used = models.BooleanField('일반 대역 사용', default=False)
+    released_datetime = models.DateTimeField('반환 일시', default=timezone.now)
+
+    objects = SafetyNumberSlotQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = '안심번호 풀'
+        verbose_name_plural = '안심번호 풀'
+        indexes = [
+            models.Index(fields=['released_datetime'], name='safety_slot_free_pair',
+                         condition=models.Q(customer_used=False, helper_used=False)),
+            models.Index(fields=['released_datetime'], name='safety_slot_free_normal',
+                         condition=models.Q(normal_used=False)),
+        ]
+
+    def __str__(self):
+        return self.suffix
+
+
 class MissionWarningNotice(models.Model):
     """
     위험미션 키워드
@@ -853,6 +1091,11 @@ class Mission(models.Model):
                                        related_name='mission', on_delete=models.CASCADE)
     saved_state = models.ForeignKey(State, verbose_name='상태', blank=True, default='draft', to_field='code',
                                     related_name='missions', on_delete=models.SET_DEFAULT)
+    # 입찰 집계 : 입찰 저장시 상태 엔진에서 함께 갱신
+    _bidded_count = models.PositiveIntegerField('입찰 수', blank=True, default=0)
+    _bidded_lowest = models.IntegerField('최저 입찰가', blank=True, default=0)
+    _active_bid_id = models.IntegerField('진행중인 낙찰 입찰 id', null=True, blank=True)
+    _won_amount = models.IntegerField('낙찰가', null=True, blank=True)
 
     objects = MissionQuerySet.as_manager()
     # objects = MissionManager()
@@ -865,8 +1108,18 @@ class Mission(models.Model):
         return '[%s] %s' % (str(self.mission_type), self.code)
 
     def save(self, *args, **kwargs):
-        self.set_state(save=False)
-        return super(Mission, self).save(*args, **kwargs)
+        # 미션 상태와 함께 바뀐 입찰 상태도 한 트랜잭션 안에서 저장
+        engine = StateEngine()
+        bids, transitions = engine.evaluate_bids(self) if self.pk else ([], [])
+        from_state = self.saved_state_id
+        self.saved_state_id = engine.get_mission_state(self, bids)
+        for field, value in engine.evaluate_stats(self, bids).items():
+            setattr(self, field, value)
+        with transaction.atomic():
+            rtn = super(Mission, self).save(*args, **kwargs)
+            engine.apply(transitions)
+            engine.on_mission_state_changed(self, from_state, self.saved_state_id)
+        return rtn
 
     def handle_image_at_home(self, file_obj):
         file = UploadFileHandler(self, file_obj).with_timestamp()
@@ -947,6 +1200,9 @@ class Mission(models.Model):
 
     @property
     def active_bid(self):
+        # with_bid_stats() 로 진행중인 낙찰 입찰을 미리 가져온 경우 저장된 입찰 id 로 찾음
+        if hasattr(self, 'prefetched_active_bids'):
+            return next((bid for bid in self.prefetched_active_bids if bid.id == self._active_bid_id), None)
         return self.won.filter(_canceled_datetime__isnull=True).last()
 
     @property
@@ -963,7 +1219,7 @@ class Mission(models.Model):
 
     @property
     def won_amount(self):
-        return self.won.last().amount if self.won.exists() else None
+        return self._won_amount
 
     @property
     def can_cancel(self):
@@ -1009,15 +1265,15 @@ class Mission(models.Model):
 
     @property
     def customer_coupon_used(self):
-        return -sum([w.customer_coupon_used for w in self.won]) or 0
+        return -sum(self.won.with_payment_summary().values_list('payment_coupon_used', flat=True)) or 0
 
     @property
     def customer_paid(self):
-        return sum([w.customer_paid for w in self.won])
+        return sum(self.won.with_payment_summary().values_list('payment_paid', flat=True))
 
     @property
     def customer_point_used(self):
-        return -sum([w.customer_point_used for w in self.won])
+        return -sum(self.won.with_payment_summary().values_list('payment_point_used', flat=True))
 
     @property
     def all_request_area_ids(self):
@@ -1061,7 +1317,7 @@ class Mission(models.Model):
     @property
     def state(self):
         """미션 상태"""
-        return self.saved_state.code
+        return self.saved_state_id
 
     def set_state(self, save=True):
         try:
@@ -1072,27 +1328,7 @@ class Mission(models.Model):
             self.save()
 
     def get_state_code(self):
-        if not self.requested_datetime:
-            return 'draft'  # 미션 작성이 완료되지 않음
-        if not self.bid_closed_datetime:
-            if self.canceled_datetime:
-                return 'user_canceled'  # 낙찰 전 취소
-            if self.is_timeout:
-                return 'timeout_canceled'  # 시간제한 취소
-            else:
-                return 'bidding'  # 입찰중
-        else:
-            if self.active_bid:
-                return self.active_bid.state
-            elif self.won.exists():
-                return self.won.last().state
-            elif self.assigned_bid_ids:
-                if self.is_timeout:
-                    return 'timeout_canceled'  # 시간제한 취소
-                if self.canceled_datetime:
-                    return 'user_canceled'  # 낙찰 전 취소
-                return 'waiting_assignee'  # 지정 헬퍼 입찰대기
-        return 'unknown'
+        return StateEngine().get_mission_state(self, None if self.pk else [])
 
     def get_state_display(self):
         status = dict(MISSION_STATUS)
@@ -1112,6 +1348,7 @@ class Mission(models.Model):
             self.bid_limit_datetime = self.requested_datetime \
                                       + timezone.timedelta(minutes=self.mission_type.bidding_limit)
         self.save()
+        MissionDeadline.objects.schedule_mission(self)
 
         # 푸쉬 & 로그
         if self.assigned_bids.exists():
@@ -1151,16 +1388,12 @@ class Mission(models.Model):
             return False
         self.canceled_datetime = timezone.now()
         self.canceled_detail = detail
-        self.save()
-        for bid in self.bids.all():
-            bid.set_state()
+        self.save()  # 입찰 상태도 함께 갱신됨
         return True
 
     def close(self):
         self.bid_closed_datetime = timezone.now()
-        self.save()
-        for bid in self.bids.all():
-            bid.set_state()
+        self.save()  # 입찰 상태도 함께 갱신됨
         return True
 
 
@@ -1231,9 +1464,17 @@ class Bid(models.Model):
         return '[입찰] %s' % self._mission
 
     def save(self, *args, **kwargs):
-        self.set_state(save=False)
-        rtn = super(Bid, self).save(*args, **kwargs)
-        self._mission.set_state()
+        if not self.mission_id:
+            # 다중지역 미션 입찰
+            self.set_state(save=False)
+            rtn = super(Bid, self).save(*args, **kwargs)
+            self._mission.set_state()
+            return rtn
+        # 입찰 저장 후 미션 및 다른 입찰의 상태는 바뀐 행만 한 트랜잭션 안에서 갱신
+        with transaction.atomic():
+            self.saved_state_id = self.get_state_code()
+            rtn = super(Bid, self).save(*args, **kwargs)
+            StateEngine().refresh(self.mission, bid=self)
         return rtn
 
     @property
@@ -1327,41 +1568,12 @@ class Bid(models.Model):
         except:
             return False
         if save:
-            self.save()
-        self._mission.set_state(save=save)
+            self.save()  # 미션 상태도 함께 갱신됨
+        else:
+            self._mission.set_state(save=False)
 
     def get_state_code(self):
-        if self._locked_datetime:
-            return 'applied'
-        if self.done_datetime:
-            if self.canceled_datetime:
-                return 'done_and_canceled'  # 완료 후 취소
-            else:
-                return 'done'  # 완료
-        if self.canceled_datetime:
-            if self._canceled_by_admin:
-                if self.applied_datetime:
-                    return 'admin_canceled'  # 관리자 취소
-                else:
-                    return 'not_applied'  # 지정헬퍼 미입찰
-            if self.won_datetime:
-                return 'won_and_canceled'  # 낙찰 후 취소
-            else:
-                if self._mission.canceled_datetime:
-                    return 'user_canceled'  # 낙찰 전 취소
-                else:
-                    return 'bid_and_canceled'  # 입찰 취소
-        if self.won_datetime:
-            return 'in_action'  # 수행중
-        if self.applied_datetime:
-            if self._mission.bid_closed_datetime and not self.is_assigned:
-                return 'failed'  # 패찰
-            if self.mission and self.mission.is_timeout:
-                return 'timeout_canceled'
-            return 'applied'  # 입찰중
-        elif self.is_assigned:
-            return 'waiting_assignee'  # 지정 헬퍼 입찰대기
-        return 'unknown'
+        return StateEngine().get_bid_state(self, self._mission)
 
     @property
     def is_locked(self):
@@ -1371,6 +1583,9 @@ class Bid(models.Model):
         if self.get_state_code() == 'applied' and not self._mission.is_timeout:
             self._locked_datetime = timezone.now()
             self.save()
+            if self.mission:
+                MissionDeadline.objects.schedule('unlock', self._locked_datetime + MissionDeadline.LOCK_TIMEOUT,
+                                                 self.mission, self)
             return True
         return False
 
@@ -1458,11 +1673,8 @@ class Bid(models.Model):
 
             # 제휴사 템플릿 미션 매칭성공 url이 있는 경우 호출
             if self.mission.template and self.mission.template.partnership and self.mission.template.matching_success_url:
-                try:
-                    data = {'code': self.mission.code}
-                    requests.get(self.mission.template.matching_success_url, params=data, timeout=1)
-                except:
-                    pass
+                HttpJob.objects.enqueue('matching_success', url=self.mission.template.matching_success_url,
+                                        code=self.mission.code)
 
         # Notification.objects.push_preset(self.helper.user, 'bidded_mission_matched',
         #                                  args=[self._mission.content_short],
@@ -1486,7 +1698,9 @@ class Bid(models.Model):
         Cash = apps.get_model('payment', 'Cash')
         fee_rate = self.helper.fee_rate.fee if self.helper.fee_rate else self._mission.charge_rate
         cash_amount = int(self.amount * (100 - fee_rate) / 100) if self.mission else self.amount
-        self.cash = Cash.objects.create(helper=self.helper, amount=cash_amount)
+        self.cash = Cash(helper=self.helper, amount=cash_amount)
+        self.cash.is_mission_fee = True
+        self.cash.save()
 
         if self.mission and not self.point:
             # 고객 미션완료 리워드 처리
@@ -1973,6 +2187,45 @@ class CustomerService(models.Model):
         verbose_name_plural = '상담 내역'
 
 
+class MissionDeadline(models.Model):
+    """
+    미션 기한 모델 : 1분단위 자동처리 커맨드에서 기한이 된 것만 처리
+    """
+    DEADLINE_TYPES = (
+        ('bid_limit', '입찰제한 시간초과'),
+        ('select_helper', '낙찰자 선택 독려 푸쉬'),
+        ('assign_timeout', '지정헬퍼 응답시간 초과'),
+        ('unlock', '입찰 잠금 해제'),
+    )
+    ASSIGN_TIMEOUT = timezone.timedelta(minutes=10)
+    LOCK_TIMEOUT = timezone.timedelta(minutes=10)
+
+    deadline_type = models.CharField('기한 유형', max_length=20, choices=DEADLINE_TYPES)
+    mission = models.ForeignKey(Mission, verbose_name='미션', related_name='deadlines', on_delete=models.CASCADE)
+    bid = models.ForeignKey(Bid, verbose_name='입찰', related_name='deadlines', null=True, blank=True,
+                            on_delete=models.CASCADE)
+    due_datetime = models.DateTimeField('기한')
+    created_datetime = models.DateTimeField('등록 일시', auto_now_add=True)
+    processed_datetime = models.DateTimeField('처리 일시', null=True, blank=True)
+
+    objects = MissionDeadlineQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = '미션 기한'
+        verbose_name_plural = '미션 기한'
+        index_together = (('processed_datetime', 'due_datetime'),)
+        # 처리되지 않은 같은 기한은 하나만 (동시에 schedule 해도 중복 생성되지 않음, bid 가 NULL 인 경우는 따로 지정)
+        constraints = [
+            models.UniqueConstraint(fields=['deadline_type', 'mission', 'bid'], name='unique_pending_bid_deadline',
+                                    condition=models.Q(processed_datetime__isnull=True, bid__isnull=False)),
+            models.UniqueConstraint(fields=['deadline_type', 'mission'], name='unique_pending_mission_deadline',
+                                    condition=models.Q(processed_datetime__isnull=True, bid__isnull=True)),
+        ]
+
+    def __str__(self):
+        return '[%s] %s' % (self.get_deadline_type_display(), self.mission_id)
+
+
 
 """
 미션 템플릿
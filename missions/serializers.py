@@ -3,7 +3,7 @@ from django.utils import timezone
 from rest_framework import serializers
 from accounts import models
 
-from common.fields import FullURLField
+from common.fields import FullURLField, AnnotatedIntegerField, AnnotatedDateTimeField, AnnotatedListField
 from common.utils import CachedProperties
 from common.exceptions import Errors
 from accounts.serializers import (
@@ -54,8 +54,9 @@ class MultiAreaMissionSerializer(serializers.ModelSerializer):
     warnings = serializers.ListField(read_only=True)
     customer_paid = serializers.IntegerField(read_only=True, required=False)
     customer_point_used = serializers.IntegerField(read_only=True, required=False)
-    bid_canceled_datetime = serializers.DateTimeField(read_only=True, required=False)
-    bid_done_datetime = serializers.DateTimeField(read_only=True, required=False)
+    bid_canceled_datetime = AnnotatedDateTimeField(read_only=True, required=False,
+                                                   annotation='stats_bid_canceled_datetime')
+    bid_done_datetime = AnnotatedDateTimeField(read_only=True, required=False, annotation='stats_bid_done_datetime')
     mission_type = serializers.IntegerField(source='mission_type_id', read_only=True)
     title = serializers.CharField(read_only=True)
     banner = serializers.ImageField(read_only=True)
@@ -128,17 +129,18 @@ class MissionSerializer(serializers.ModelSerializer):
     final_address = AddressSerializer(write_only=True, required=False)
     state = serializers.CharField(read_only=True)
     charge_rate = serializers.IntegerField(read_only=True)
-    active_due = serializers.DateTimeField(read_only=True)
+    active_due = AnnotatedDateTimeField(read_only=True, annotation='stats_active_due')
     warnings = serializers.ListField(read_only=True)
     assigned_helper = serializers.CharField(write_only=True, required=False)
-    assigned_bid_ids = serializers.ListField(read_only=True, required=False)
-    bidded_count = serializers.IntegerField(read_only=True, required=False)
-    bidded_lowest = serializers.IntegerField(read_only=True, required=False)
-    customer_coupon_used = serializers.IntegerField(read_only=True, required=False)
-    customer_paid = serializers.IntegerField(read_only=True, required=False)
-    customer_point_used = serializers.IntegerField(read_only=True, required=False)
-    bid_canceled_datetime = serializers.DateTimeField(read_only=True, required=False)
-    bid_done_datetime = serializers.DateTimeField(read_only=True, required=False)
+    assigned_bid_ids = AnnotatedListField(read_only=True, required=False, annotation='stats_assigned_bid_ids')
+    bidded_count = serializers.IntegerField(source='_bidded_count', read_only=True, required=False)
+    bidded_lowest = serializers.IntegerField(source='_bidded_lowest', read_only=True, required=False)
+    customer_coupon_used = AnnotatedIntegerField(read_only=True, required=False, annotation='payment_coupon_used')
+    customer_paid = AnnotatedIntegerField(read_only=True, required=False, annotation='payment_paid')
+    customer_point_used = AnnotatedIntegerField(read_only=True, required=False, annotation='payment_point_used')
+    bid_canceled_datetime = AnnotatedDateTimeField(read_only=True, required=False,
+                                                   annotation='stats_bid_canceled_datetime')
+    bid_done_datetime = AnnotatedDateTimeField(read_only=True, required=False, annotation='stats_bid_done_datetime')
     files = MissionFileSerializer(read_only=True, many=True, required=False)
     push_result = NotificationResultSerializer(read_only=True, required=False)
 
@@ -267,6 +269,8 @@ class MissionAvailableSerializer(serializers.ModelSerializer):
     """
     실시간 미션 목록용 시리얼라이져
     """
+    active_due = AnnotatedDateTimeField(read_only=True, annotation='stats_active_due')
+    bidded_count = serializers.IntegerField(source='_bidded_count', read_only=True)
 
     class Meta:
         model = Mission
@@ -0,0 +1,354 @@
+from collections import namedtuple
+
+from django.apps import apps
+from django.db import models, transaction
+from django.utils import timezone
+
+from .utils import AvailableMissionCache
+
+
+"""
+미션/입찰 상태 엔진
+
+저장된 필드값에 전이표(transition table)를 적용하여 상태를 계산하고, 상태가 바뀐 행만 한 트랜잭션 안에서 saved_state를 갱신한다.
+입찰 저장 -> 미션 저장 -> 입찰 재조회로 이어지던 재귀적인 set_state 호출을 대신한다.
+"""
+
+
+Transition = namedtuple('Transition', ['model', 'pk', 'from_state', 'to_state'])
+
+
+BID_STATE_FIELDS = (
+    'id', 'mission_id', 'area_mission_id', 'amount', 'is_assigned', 'applied_datetime', 'won_datetime',
+    '_canceled_datetime', '_canceled_by_admin', '_done_datetime', '_locked_datetime', 'saved_state_id',
+)
+
+
+def _get(obj, name):
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def _is_timeout(mission, now):
+    # 다중지역 미션에는 입찰제한일시가 없음
+    limit = _get(mission, 'bid_limit_datetime')
+    return bool(limit and limit < now)
+
+
+def _is_canceled(bid, mission):
+    """미션취소(낙찰 전 취소)나 입찰취소(낙찰 후 취소) 둘 중에 하나라도 있으면 취소된 것으로 판단"""
+    return bool(_get(bid, '_canceled_datetime') or _get(mission, 'canceled_datetime'))
+
+
+def _last_won(bids, active_only=False):
+    won = [b for b in bids if b['won_datetime'] and not (active_only and b['_canceled_datetime'])]
+    return max(won, key=lambda b: b['id']) if won else None
+
+
+def get_bid_stats(bids):
+    """미션 입찰 집계 : 입찰 수, 최저 입찰가, 진행중인 낙찰 입찰 id, 낙찰가"""
+    applied = [b['amount'] for b in bids if b['applied_datetime'] and not b['_canceled_datetime']]
+    active = _last_won(bids, active_only=True)
+    won = _last_won(bids)
+    return {
+        '_bidded_count': len(applied),
+        '_bidded_lowest': min(applied) if applied else 0,
+        '_active_bid_id': active['id'] if active else None,
+        '_won_amount': won['amount'] if won else None,
+    }
+
+
+# 입찰 상태 전이표 : (상태, 조건(입찰, 미션, 현재시각)) 위에서부터 처음 만족하는 상태로 전이
+BID_TRANSITIONS = (
+    ('applied', lambda b, m, now: _get(b, '_locked_datetime')),  # 잠금
+    ('done_and_canceled', lambda b, m, now: _get(b, '_done_datetime') and _is_canceled(b, m)),  # 완료 후 취소
+    ('done', lambda b, m, now: _get(b, '_done_datetime')),  # 완료
+    ('admin_canceled', lambda b, m, now: _is_canceled(b, m) and _get(b, '_canceled_by_admin')
+        and _get(b, 'applied_datetime')),  # 관리자 취소
+    ('not_applied', lambda b, m, now: _is_canceled(b, m) and _get(b, '_canceled_by_admin')),  # 지정헬퍼 미입찰
+    ('won_and_canceled', lambda b, m, now: _is_canceled(b, m) and _get(b, 'won_datetime')),  # 낙찰 후 취소
+    ('user_canceled', lambda b, m, now: _is_canceled(b, m) and _get(m, 'canceled_datetime')),  # 낙찰 전 취소
+    ('bid_and_canceled', lambda b, m, now: _is_canceled(b, m)),  # 입찰 취소
+    ('in_action', lambda b, m, now: _get(b, 'won_datetime')),  # 수행중
+    ('failed', lambda b, m, now: _get(b, 'applied_datetime') and _get(m, 'bid_closed_datetime')
+        and not _get(b, 'is_assigned')),  # 패찰
+    ('timeout_canceled', lambda b, m, now: _get(b, 'applied_datetime') and _is_timeout(m, now)),  # 시간제한 취소
+    ('applied', lambda b, m, now: _get(b, 'applied_datetime')),  # 입찰중
+    ('waiting_assignee', lambda b, m, now: _get(b, 'is_assigned')),  # 지정 헬퍼 입찰대기
+)
+
+
+# 미션 상태 전이표 : (상태, 조건(미션, 입찰목록, 현재시각)) 상태가 callable인 경우 해당 입찰의 상태를 따름
+MISSION_TRANSITIONS = (
+    ('draft', lambda m, bids, now: not m.requested_datetime),  # 미션 작성이 완료되지 않음
+    ('user_canceled', lambda m, bids, now: not m.bid_closed_datetime and m.canceled_datetime),  # 낙찰 전 취소
+    ('timeout_canceled', lambda m, bids, now: not m.bid_closed_datetime and _is_timeout(m, now)),  # 시간제한 취소
+    ('bidding', lambda m, bids, now: not m.bid_closed_datetime),  # 입찰중
+    (lambda m, bids: _last_won(bids, active_only=True)['state'],
+     lambda m, bids, now: _last_won(bids, active_only=True)),  # 진행중인 낙찰 입찰 상태
+    (lambda m, bids: _last_won(bids)['state'], lambda m, bids, now: _last_won(bids)),  # 마지막 낙찰 입찰 상태
+    ('timeout_canceled', lambda m, bids, now: any(b['is_assigned'] for b in bids) and _is_timeout(m, now)),
+    ('user_canceled', lambda m, bids, now: any(b['is_assigned'] for b in bids) and m.canceled_datetime),
+    ('waiting_assignee', lambda m, bids, now: any(b['is_assigned'] for b in bids)),  # 지정 헬퍼 입찰대기
+)
+
+
+class StateEngine:
+    """
+    미션/입찰 상태 엔진
+
+    dry_run=True 이면 적용할 전이 목록만 계산하고 저장하지 않는다.
+    """
+    def __init__(self, dry_run=False, now=None):
+        self.dry_run = dry_run
+        self.now = now or timezone.now()
+        self.transitions = []
+
+    def get_bid_state(self, bid, mission):
+        for state, condition in BID_TRANSITIONS:
+            if condition(bid, mission, self.now):
+                return state
+        return 'unknown'
+
+    def get_mission_state(self, mission, bids=None):
+        """bids는 BID_STATE_FIELDS 값과 계산된 'state' 키를 가진 dict 목록"""
+        if bids is None:
+            bids = self.get_bid_rows(mission)
+        for state, condition in MISSION_TRANSITIONS:
+            if condition(mission, bids, self.now):
+                return state(mission, bids) if callable(state) else state
+        return 'unknown'
+
+    def get_bid_rows(self, mission, instance=None):
+        """미션의 입찰들을 한 번의 쿼리로 읽고 상태를 계산 (instance가 주어지면 해당 입찰은 인스턴스 값을 사용)"""
+        rows = list(mission.bids.values(*BID_STATE_FIELDS))
+        for row in rows:
+            if instance is not None and row['id'] == instance.id:
+                row.update({field: getattr(instance, field) for field in BID_STATE_FIELDS})
+            row['state'] = self.get_bid_state(row, mission)
+        return rows
+
+    def evaluate_bids(self, mission, bid=None):
+        """
+        미션 소속 입찰들에 적용할 전이 목록 계산
+        bid가 주어지면 DB 값 대신 해당 인스턴스의 현재 값으로 계산한다.
+        """
+        Bid = apps.get_model('missions', 'Bid')
+        bids = self.get_bid_rows(mission, instance=bid)
+        transitions = [
+            Transition(Bid, row['id'], row['saved_state_id'], row['state'])
+            for row in bids if row['state'] != row['saved_state_id']
+        ]
+        return bids, transitions
+
+    def evaluate(self, mission, bid=None):
+        """미션과 소속 입찰들에 적용할 전이 목록 계산"""
+        bids, transitions = self.evaluate_bids(mission, bid=bid)
+        state = self.get_mission_state(mission, bids)
+        if state != mission.saved_state_id:
+            transitions.append(Transition(type(mission), mission.pk, mission.saved_state_id, state))
+        return transitions
+
+    def evaluate_stats(self, mission, bids):
+        """미션에 저장된 입찰 집계 중 바뀐 값"""
+        return {k: v for k, v in get_bid_stats(bids).items() if getattr(mission, k) != v}
+
+    def _write(self, transitions):
+        grouped = {}
+        for t in transitions:
+            if t.pk:
+                grouped.setdefault((t.model, t.to_state), []).append(t.pk)
+        for (model, to_state), pks in grouped.items():
+            model.objects.filter(pk__in=pks).update(saved_state_id=to_state)
+
+    def apply(self, transitions):
+        """상태가 바뀐 행만 상태별로 묶어서 한 트랜잭션 안에서 갱신"""
+        self.transitions.extend(transitions)
+        if self.dry_run or not transitions:
+            return transitions
+        with transaction.atomic():
+            self._write(transitions)
+        return transitions
+
+    def refresh(self, mission, bid=None):
+        """미션과 소속 입찰들의 상태, 미션의 입찰 집계를 재계산하여 저장"""
+        bids, transitions = self.evaluate_bids(mission, bid=bid)
+        values = self.evaluate_stats(mission, bids)
+        state = self.get_mission_state(mission, bids)
+        if state != mission.saved_state_id:
+            transitions.append(Transition(type(mission), mission.pk, mission.saved_state_id, state))
+            values['saved_state_id'] = state
+        self.transitions.extend(transitions)
+        if self.dry_run:
+            return transitions
+
+        with transaction.atomic():
+            self._write([t for t in transitions if t.model is not type(mission)])
+            if values:
+                type(mission).objects.filter(pk=mission.pk).update(**values)
+        for field, value in values.items():
+            setattr(mission, field, value)
+        for t in transitions:
+            if t.model is type(mission):
+                self.on_mission_state_changed(mission, t.from_state, t.to_state)
+        if bid is not None:
+            for t in transitions:
+                if t.model is type(bid) and t.pk == bid.pk:
+                    bid.saved_state_id = t.to_state
+        return transitions
+
+    def on_mission_state_changed(self, mission, from_state, to_state):
+        """입찰중 상태로 들어오거나 나간 미션은 커밋 후 지역별 입찰가능 미션 캐쉬에 반영"""
+        if self.dry_run or from_state == to_state or 'bidding' not in (from_state, to_state):
+            return
+        if type(mission) is apps.get_model('missions', 'Mission'):
+            transaction.on_commit(lambda: AvailableMissionCache().update(mission))
+
+    def refresh_many(self, missions):
+        """여러 미션의 상태를 재계산하여 저장"""
+        transitions = []
+        for mission in missions:
+            transitions.extend(self.refresh(mission))
+        return transitions
+
+    def report(self):
+        """적용된(dry_run인 경우 적용될) 전이 요약"""
+        counts = {}
+        for t in self.transitions:
+            key = (t.model._meta.model_name, t.from_state, t.to_state)
+            counts[key] = counts.get(key, 0) + 1
+        return counts
+
+
+class BulkStateRecompute:
+    """
+    미션/입찰 상태 일괄 재계산
+
+    테이블별로 하나의 SQL CASE 식으로 상태를 계산하고, 상태가 바뀐 행만 상태별로 한 번씩 UPDATE 한다.
+    (다중지역 미션 입찰은 제외)
+    """
+    def __init__(self, dry_run=False, since=None, now=None):
+        self.dry_run = dry_run
+        self.since = since
+        self.now = now or timezone.now()
+        self.report = {}
+
+    def get_bid_state_case(self, prefix=''):
+        """BID_TRANSITIONS와 같은 순서의 CASE 식"""
+        def q(**kwargs):
+            return models.Q(**{prefix + key: value for key, value in kwargs.items()})
+
+        mission_canceled = q(mission__canceled_datetime__isnull=False)
+        canceled = q(_canceled_datetime__isnull=False) | mission_canceled
+        return models.Case(
+            models.When(q(_locked_datetime__isnull=False), then=models.Value('applied')),
+            models.When(q(_done_datetime__isnull=False) & canceled, then=models.Value('done_and_canceled')),
+            models.When(q(_done_datetime__isnull=False), then=models.Value('done')),
+            models.When(canceled & q(_canceled_by_admin=True, applied_datetime__isnull=False),
+                        then=models.Value('admin_canceled')),
+            models.When(canceled & q(_canceled_by_admin=True), then=models.Value('not_applied')),
+            models.When(canceled & q(won_datetime__isnull=False), then=models.Value('won_and_canceled')),
+            models.When(mission_canceled, then=models.Value('user_canceled')),
+            models.When(canceled, then=models.Value('bid_and_canceled')),
+            models.When(q(won_datetime__isnull=False), then=models.Value('in_action')),
+            models.When(q(applied_datetime__isnull=False, mission__bid_closed_datetime__isnull=False, is_assigned=False),
+                        then=models.Value('failed')),
+            models.When(q(applied_datetime__isnull=False, mission__bid_limit_datetime__lt=self.now),
+                        then=models.Value('timeout_canceled')),
+            models.When(q(applied_datetime__isnull=False), then=models.Value('applied')),
+            models.When(q(is_assigned=True), then=models.Value('waiting_assignee')),
+            default=models.Value('unknown'),
+            output_field=models.CharField(),
+        )
+
+    def get_mission_state_case(self):
+        """MISSION_TRANSITIONS와 같은 순서의 CASE 식 (낙찰 입찰 상태는 입찰 CASE 식을 서브쿼리로 사용)"""
+        closed = models.Q(bid_closed_datetime__isnull=False)
+        timeout = models.Q(bid_limit_datetime__lt=self.now)
+        return models.Case(
+            models.When(requested_datetime__isnull=True, then=models.Value('draft')),
+            models.When(~closed & models.Q(canceled_datetime__isnull=False), then=models.Value('user_canceled')),
+            models.When(~closed & timeout, then=models.Value('timeout_canceled')),
+            models.When(~closed, then=models.Value('bidding')),
+            models.When(bulk_active_state__isnull=False, then=models.F('bulk_active_state')),
+            models.When(bulk_won_state__isnull=False, then=models.F('bulk_won_state')),
+            models.When(models.Q(bulk_has_assigned=True) & timeout, then=models.Value('timeout_canceled')),
+            models.When(bulk_has_assigned=True, canceled_datetime__isnull=False, then=models.Value('user_canceled')),
+            models.When(bulk_has_assigned=True, then=models.Value('waiting_assignee')),
+            default=models.Value('unknown'),
+            output_field=models.CharField(),
+        )
+
+    def get_bids(self, queryset=None):
+        Bid = apps.get_model('missions', 'Bid')
+        qs = Bid.objects.all() if queryset is None else queryset
+        qs = qs.filter(mission__isnull=False)
+        if self.since:
+            qs = qs.filter(mission_id__in=self.get_changed_mission_ids())
+        return qs.annotate(bulk_state=self.get_bid_state_case())
+
+    def get_changed_mission_ids(self):
+        """since 이후에 상태 계산에 쓰이는 일시값이 바뀐(또는 입찰제한 시간이 지난) 미션 id 서브쿼리"""
+        Bid = apps.get_model('missions', 'Bid')
+        Mission = apps.get_model('missions', 'Mission')
+        changed_bids = Bid.objects.filter(
+            models.Q(applied_datetime__gte=self.since) | models.Q(won_datetime__gte=self.since)
+            | models.Q(_canceled_datetime__gte=self.since) | models.Q(_done_datetime__gte=self.since)
+            | models.Q(_locked_datetime__gte=self.since)
+        ).values('mission_id')
+        return Mission.objects.filter(
+            models.Q(created_datetime__gte=self.since) | models.Q(requested_datetime__gte=self.since)
+            | models.Q(canceled_datetime__gte=self.since) | models.Q(bid_closed_datetime__gte=self.since)
+            | models.Q(bid_limit_datetime__range=(self.since, self.now)) | models.Q(id__in=changed_bids)
+        ).values('id')
+
+    def get_missions(self, queryset=None):
+        Bid = apps.get_model('missions', 'Bid')
+        Mission = apps.get_model('missions', 'Mission')
+        qs = Mission.objects.all() if queryset is None else queryset
+        if self.since:
+            qs = qs.filter(id__in=self.get_changed_mission_ids())
+        won = Bid.objects.filter(mission=models.OuterRef('pk'), won_datetime__isnull=False)\
+            .annotate(bulk_state=self.get_bid_state_case()).order_by('-id')
+        return qs.annotate(
+            bulk_active_state=models.Subquery(won.filter(_canceled_datetime__isnull=True).values('bulk_state')[:1]),
+            bulk_won_state=models.Subquery(won.values('bulk_state')[:1]),
+            bulk_has_assigned=models.Exists(Bid.objects.filter(mission=models.OuterRef('pk'), is_assigned=True)),
+        ).annotate(bulk_state=self.get_mission_state_case())
+
+    def recompute(self, annotated):
+        """상태가 바뀐 행만 상태별로 UPDATE, {(이전 상태, 새 상태): 행 수} 리턴"""
+        model = annotated.model
+        changed = annotated.exclude(saved_state_id=models.F('bulk_state'))
+        counts = {
+            (row['saved_state_id'], row['bulk_state']): row['count']
+            for row in changed.order_by().values('saved_state_id', 'bulk_state').annotate(count=models.Count('id'))
+        }
+        if not self.dry_run:
+            with transaction.atomic():
+                for state in set(to_state for _, to_state in counts):
+                    model.objects.filter(
+                        id__in=changed.filter(bulk_state=state).values('id')
+                    ).update(saved_state_id=state)
+        self.report[model._meta.model_name] = counts
+        return counts
+
+    def run(self, bids=None, missions=None):
+        """입찰을 먼저, 미션을 나중에 재계산"""
+        self.recompute(self.get_bids(bids))
+        self.recompute(self.get_missions(missions))
+        return self.report
+
+    def get_report_lines(self):
+        lines = []
+        for model_name, counts in self.report.items():
+            totals = {}
+            for (from_state, to_state), count in sorted(counts.items()):
+                lines.append('[%s] %s -> %s : %s' % (model_name, from_state, to_state, count))
+                totals[to_state] = totals.get(to_state, 0) + count
+            for state, count in sorted(totals.items()):
+                lines.append('[%s] %s : %s' % (model_name, state, count))
+            if not counts:
+                lines.append('[%s] no changes' % model_name)
+        return lines
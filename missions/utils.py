@@ -1,10 +1,16 @@
 import socket
+import queue
+import threading
+import time
+import uuid
 from collections import OrderedDict
 
 import requests
 from bs4 import BeautifulSoup
 
 from django.apps import apps
+from django.core.cache import cache
+from django.db import models
 from django.conf import settings
 
 from common.utils import SingletonOptimizedMeta
@@ -116,6 +122,172 @@ class KCTPacket(dict):
         self.update({key: val for key, val in data.items() if val})
 
 
+class KCTRateLimiter:
+    """
+    KCT 허용 TPS 제한 (토큰 버킷)
+    """
+    def __init__(self, tps):
+        self.tps = tps
+        self.tokens = float(tps)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, count=1):
+        """count 건을 보낼 수 있을 때까지 대기"""
+        if not self.tps:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(float(self.tps), self.tokens + (now - self.updated) * self.tps)
+                self.updated = now
+                if self.tokens >= min(count, self.tps):
+                    self.tokens -= count
+                    return
+                wait = (min(count, self.tps) - self.tokens) / self.tps
+            time.sleep(wait)
+
+    def drain(self):
+        """서버에서 TPS 초과 응답을 받으면 남은 토큰을 비워 속도를 늦춤"""
+        with self.lock:
+            self.tokens = 0.0
+            self.updated = time.monotonic()
+
+
+class KCTConnection:
+    """
+    KCT 소켓 연결 : 연결시 로그인하고, 여러 패킷을 한번에 보낸 뒤 순서대로 응답을 받음
+    """
+    def __init__(self, host, port, timeout):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.sock = None
+        self.sequence = 0
+        self.last_used = 0
+
+    def connect(self):
+        self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.sequence = 0
+        response = self.send([KCTPacket(packet_id=2500)])[0]
+        if response.get('result') != '00':
+            self.close()
+            raise IOError('KCT 로그인 실패 : %s' % response.get('result'))
+
+    def close(self):
+        if self.sock:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+        self.sock = None
+
+    def next_sequence(self):
+        self.sequence = self.sequence % 9999999999 + 1
+        return str(self.sequence).zfill(10)
+
+    def recv_packet(self):
+        data = b''
+        while len(data) < KCTPacket.SIZE:
+            chunk = self.sock.recv(KCTPacket.SIZE - len(data))
+            if not chunk:
+                raise ConnectionError('KCT 연결 끊김')
+            data += chunk
+        return KCTPacket(data)
+
+    def send(self, packets):
+        for packet in packets:
+            packet['sequence'] = self.next_sequence()
+        self.sock.sendall(b''.join(bytes(packet) for packet in packets))
+        responses = [self.recv_packet() for _ in packets]
+        self.last_used = time.monotonic()
+
+        # 응답에 순번이 있으면 순번으로 요청과 매칭
+        by_sequence = {response.get('sequence'): response for response in responses}
+        if all(packet['sequence'] in by_sequence for packet in packets):
+            return [by_sequence[packet['sequence']] for packet in packets]
+        return responses
+
+
+class KCTConnectionPool:
+    """
+    프로세스별 KCT 연결 풀 : 최대 연결 수 제한, 유휴 연결 keepalive(2600), 오류난 연결은 폐기 후 재연결
+    """
+    def __init__(self, host, port, size=2, timeout=5, keepalive=60):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.keepalive = keepalive
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+        self.keepalive_thread = None
+
+    def acquire(self):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise IOError('KCT 연결 대기시간 초과')
+        try:
+            conn = self.idle.get_nowait()
+        except queue.Empty:
+            conn = KCTConnection(self.host, self.port, self.timeout)
+        try:
+            if not conn.sock:
+                conn.connect()
+            elif self.keepalive and time.monotonic() - conn.last_used > self.keepalive:
+                self.ping(conn)
+        except Exception:
+            conn.close()
+            self.slots.release()
+            raise
+        return conn
+
+    def release(self, conn, broken=False):
+        if broken:
+            conn.close()
+        else:
+            self.idle.put(conn)
+        self.slots.release()
+
+    def ping(self, conn):
+        """유휴 연결 확인, 응답이 없으면 다시 연결"""
+        try:
+            conn.send([KCTPacket(packet_id=2600)])
+        except (OSError, ValueError):
+            conn.close()
+            conn.connect()
+
+    def run_keepalive(self):
+        while True:
+            time.sleep(self.keepalive)
+            # LIFO 라서 하나씩 꺼냈다 넣으면 같은 연결만 다시 나오므로 유휴 연결을 모두 꺼낸 뒤 확인하고 돌려놓음
+            conns = []
+            while self.slots.acquire(blocking=False):
+                try:
+                    conns.append(self.idle.get_nowait())
+                except queue.Empty:
+                    self.slots.release()
+                    break
+            for conn in reversed(conns):
+                broken = False
+                if time.monotonic() - conn.last_used >= self.keepalive:
+                    try:
+                        self.ping(conn)
+                    except Exception:
+                        broken = True
+                self.release(conn, broken=broken)
+
+    def start_keepalive(self):
+        if self.keepalive and not self.keepalive_thread:
+            self.keepalive_thread = threading.Thread(target=self.run_keepalive, daemon=True)
+            self.keepalive_thread.start()
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
 class KCTSafetyNumber(metaclass=SingletonOptimizedMeta):
     """
     KCT 안심번호 핸들러
@@ -137,58 +309,81 @@ class KCTSafetyNumber(metaclass=SingletonOptimizedMeta):
         '13': '허용 TPS 초과',
         '14': '등록된 IP정보가 아닌 곳에서 로그인 요청',
     }
-    sock = None
-    _host = ''
-    _port = ''
+    TPS_EXCEEDED = '13'
     fail_silently = True
+    retry = 3
 
     def __init__(self):
         self._host = settings.KCT_CONNECT_HOST
         self._port = settings.KCT_CONNECT_PORT
-        # self._host = '112.140.147.113'
-        # self._port = 60001
-
-    def connect(self):
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.sock.connect((self._host, self._port))
-
-    def disconnect(self):
-        self.sock.close()
-        self.sock = None
+        self._pool = None
+        self.limiter = KCTRateLimiter(getattr(settings, 'KCT_TPS', 10))
+
+    @property
+    def pool(self):
+        if not self._pool:
+            self._pool = KCTConnectionPool(
+                self._host, self._port,
+                size=getattr(settings, 'KCT_POOL_SIZE', 2),
+                timeout=getattr(settings, 'KCT_TIMEOUT', 5),
+                keepalive=getattr(settings, 'KCT_KEEPALIVE_SECONDS', 60),
+            )
+            self._pool.start_keepalive()
+        return self._pool
 
     def get_error(self, result_code):
         if result_code in self.RESULT_CODES:
             return IOError(self.RESULT_CODES[result_code])
         return IOError('알 수 없는 오류 : %s' % result_code)
 
-    def request(self, packet):
-        if not self.sock:
-            self.connect()
-        connected = False
-        tried = 0
-        while connected is False:
+    def send(self, packets, tried=0):
+        """연결 하나로 패킷들을 연달아 보내고 응답 목록 반환, 연결 오류시 새 연결로 재시도"""
+        size = self.limiter.tps
+        if size and len(packets) > size:
+            return [response for i in range(0, len(packets), size)
+                    for response in self.send(packets[i:i + size], tried)]
+
+        while True:
+            self.limiter.acquire(len(packets))
+            conn = None
             try:
-                self.sock.sendall(bytes(packet))
-            except BrokenPipeError:
-                self.connect()
-            else:
-                connected = True
-            if tried > 2:
-                raise IOError('연결할 수 없음')
-            tried += 1
-        return self.get_response()
-
-    def get_response(self):
-        response = KCTPacket(self.sock.recv(KCTPacket.SIZE))
+                conn = self.pool.acquire()
+                responses = conn.send(packets)
+            except (OSError, ValueError):
+                if conn:
+                    self.pool.release(conn, broken=True)
+                tried += 1
+                if tried >= self.retry:
+                    raise IOError('연결할 수 없음')
+                continue
+            self.pool.release(conn)
+            break
+
+        # 허용 TPS 초과 건만 속도를 늦춰 다시 보냄
+        exceeded = [i for i, response in enumerate(responses) if response.get('result') == self.TPS_EXCEEDED]
+        if exceeded and tried + 1 < self.retry:
+            self.limiter.drain()
+            retried = self.send([packets[i] for i in exceeded], tried + 1)
+            for i, response in zip(exceeded, retried):
+                responses[i] = response
+        return responses
+
+    def get_response(self, response):
         if 'result' in response and response['result'] == '00':
             return response
         if not self.fail_silently:
-            raise self.get_error(response['result'])
+            raise self.get_error(response.get('result'))
         return None
 
+    def request(self, packet):
+        return self.get_response(self.send([packet])[0])
+
+    def request_many(self, packets):
+        return [self.get_response(response) for response in self.send(packets)]
+
     def login(self):
-        packet = KCTPacket(packet_id=2500)
-        self.request(packet)
+        """로그인은 연결시 자동으로 하므로 연결만 확인"""
+        self.pool.release(self.pool.acquire())
 
     def health_check(self):
         packet = KCTPacket(packet_id=2600)
@@ -204,6 +399,10 @@ class KCTSafetyNumber(metaclass=SingletonOptimizedMeta):
         packet = KCTPacket(packet_id=2502, safety_number=safety_number)
         return self.request(packet)
 
+    def unassign_numbers(self, safety_numbers):
+        """여러 안심번호 해제 요청을 한 연결로 연달아 보냄"""
+        return self.request_many([KCTPacket(packet_id=2502, safety_number=n) for n in safety_numbers])
+
     def pause_number(self, safety_number):
         packet = KCTPacket(packet_id=2503, safety_number=safety_number)
         return self.request(packet)
@@ -224,6 +423,82 @@ kct.login()
 """
 
 
+class AvailableMissionCache(metaclass=SingletonOptimizedMeta):
+    """
+    지역별 입찰가능 미션 후보 캐쉬
+
+    수락 지역(또는 인근 지역) id별로 해당 지역에서 도달 가능한 입찰중 미션을 {미션 id: (작성자 id, 입찰제한 timestamp)} 형태로 저장한다.
+    지역마다 버전 토큰을 두고, 미션이 입찰중 상태로 들어오거나 나가면 해당 지역의 토큰을 바꿔서 다음 조회시 DB에서 다시 만든다.
+    (공유 캐쉬를 읽고 고쳐서 쓰지 않으므로 동시에 바뀐 미션이 빠지지 않고, 조회 도중 바뀐 경우에는 이전 토큰으로 저장되어 다시 만들어짐)
+    """
+    prefix = 'available_missions'
+    online_key = 'online'
+    timeout = 60 * 10
+
+    def get_key(self, area_id):
+        return '%s:%s' % (self.prefix, area_id)
+
+    def get_version_key(self, area_id):
+        return '%s:version:%s' % (self.prefix, area_id)
+
+    def get_area_ids(self, mission):
+        """미션이 속하는 캐쉬 지역 id 목록"""
+        AreaReach = apps.get_model('base', 'AreaReach')
+        area_ids = set(mission.stopovers.values_list('area_id', flat=True))
+        if mission.final_address_id:
+            area_ids.add(mission.final_address.area_id)
+        rtn = list(AreaReach.objects.filter(
+            reachable_id__in=area_ids, reach_type__in=('self', 'child')
+        ).values_list('area_id', flat=True).distinct())
+        if not mission.final_address_id and not mission.request_areas.exists():
+            rtn.append(self.online_key)
+        return rtn
+
+    def get_version(self, area_id, version=None):
+        """지역 버전 토큰 (없으면 새로 만듦)"""
+        if version is None:
+            cache.add(self.get_version_key(area_id), uuid.uuid4().hex, None)
+            version = cache.get(self.get_version_key(area_id))
+        return version
+
+    def build(self, area_id, version=None):
+        """DB에서 지역 캐쉬 생성 : 조회 전의 버전 토큰과 함께 저장"""
+        Mission = apps.get_model('missions', 'Mission')
+        AreaReach = apps.get_model('base', 'AreaReach')
+        version = self.get_version(area_id, version)
+        qs = Mission.objects.all_view_only().filter(saved_state='bidding')
+        if area_id == self.online_key:
+            qs = qs.filter(final_address=None, request_areas=None)
+        else:
+            reachable_ids = AreaReach.objects.get_reachable_ids([area_id])
+            qs = qs.filter(models.Q(stopovers__area__in=reachable_ids) | models.Q(final_address__area__in=reachable_ids))
+        data = {}
+        for mission_id, user_id, bid_limit_datetime in qs.values_list('id', 'user_id', 'bid_limit_datetime').distinct():
+            data[mission_id] = (user_id, bid_limit_datetime.timestamp() if bid_limit_datetime else None)
+        cache.set(self.get_key(area_id), (version, data), self.timeout)
+        return data
+
+    def get_candidates(self, area_ids, online=False):
+        """지역들의 후보 미션 {미션 id: (작성자 id, 입찰제한 timestamp)}"""
+        area_ids = list(area_ids) + ([self.online_key] if online else [])
+        cached = cache.get_many([self.get_key(area_id) for area_id in area_ids]
+                                + [self.get_version_key(area_id) for area_id in area_ids])
+        candidates = {}
+        for area_id in area_ids:
+            version = cached.get(self.get_version_key(area_id))
+            entry = cached.get(self.get_key(area_id))
+            if version is not None and entry is not None and entry[0] == version:
+                data = entry[1]
+            else:
+                data = self.build(area_id, version)
+            candidates.update(data)
+        return candidates
+
+    def update(self, mission):
+        """미션이 속한 지역들의 버전 토큰을 바꿔서 다음 조회시 다시 만들도록 함"""
+        cache.set_many({self.get_version_key(area_id): uuid.uuid4().hex for area_id in self.get_area_ids(mission)}, None)
+
+
 class IkeaProductCrawler:
     """
     이케아 제품 크롤러
@@ -1,7 +1,6 @@
 import logging
 from re import template
 
-import requests
 
 from django.utils.decorators import method_decorator
 from django.utils import timezone
@@ -19,7 +18,7 @@ from common.views import swagger_auto_boolean_schema
 from common.exceptions import Errors
 from common.admin import log_with_reason
 from common.utils import get_md5_hash, CachedProperties
-from base.models import BannedWord
+from base.models import BannedWord, HttpJob
 from base.exceptions import ExternalErrors
 from base.constants import MISSION_STATUS
 from base.views import BaseModelViewSet
@@ -27,6 +26,7 @@ from accounts import permissions
 from accounts import authentication
 from accounts.models import MobileVerification
 from notification.models import Notification, Tasker
+from notification.utils import UnreadNotificationCounter
 from .models import (
     MissionTemplate, MissionType, Address, MultiMission, MultiAreaMission, Mission, MissionFile, Bid, BidFile, Interaction,
     Review, Report, TemplateCategory, TemplateQuestion, UserBlock, FavoriteUser, SafetyNumber
@@ -280,7 +280,7 @@ class MissionViewSet(mixins.CreateModelMixin,
         if self.action == 'available' and self.request.user.is_helper:
             # 헬퍼로 승인된 사람일 때만 필터링
             # 헬퍼가 아닌 경우 전체 입찰중인 미션 뿌려줌
-            qs = qs.available(self.request.user, self.area_ids)
+            qs = qs.available_from_cache(self.request.user, self.area_ids)
         elif self.action == 'list':
             qs = qs.filter(user=self.request.user, requested_datetime__isnull=False)
         elif self.action == 'assigned':
@@ -303,6 +303,8 @@ class MissionViewSet(mixins.CreateModelMixin,
             qs = qs.filter(user_id=self.request.user.id, requested_datetime__isnull=True)
         elif self.action == 'destroy':
             qs = qs.filter(user_id=self.request.user.id, canceled_datetime__isnull=True)
+        if self.action not in ('create', 'update', 'partial_update', 'destroy'):
+            qs = qs.with_bid_stats()
         return qs.order_by('-id')
 
     def get_serializer_class(self):
@@ -424,8 +426,8 @@ class MissionViewSet(mixins.CreateModelMixin,
             self.area_ids = request.user.helper.accept_area_ids
         available_view = self.list(request, *args, **kwargs)
         multi = MultiMission.objects.available(request.user, self.area_ids).distinct('id')
-        assigned = Mission.objects.assigned(request.user)
-        new_count = Notification.objects.get_by_usercode(request.user.code, exclude_read=True).count()
+        assigned = Mission.objects.assigned(request.user).with_bid_stats()
+        new_count = UnreadNotificationCounter().get(request.user)
         return response.Response({
             'assigned': {'data': MissionAvailableSerializer(assigned, many=True).data},
             'multi': {'data': MultiMissionSerializer(multi, many=True, context={'request': request}).data},
@@ -621,24 +623,9 @@ class BidViewSet(mixins.CreateModelMixin,
                 Tasker.objects.task('mission_bidded', user=self._mission.user,
                                     kwargs={'count': self._mission.bidded_count}, data={'obj_id': self._mission.id})
 
-        # 좌표 있는 경우 행정동 검색 추가
+        # 좌표 있는 경우 행정동 검색 추가 (백그라운드) : 응답의 location 은 검색 전이므로 빈 값
         if obj.longitude and obj.latitude:
-            headers = {
-                'Authorization': 'KakaoAK %s' % settings.KAKAO_REST_API_KEY,
-                'content-type': 'application/json',
-            }
-            params = {
-                'x': str(obj.longitude),
-                'y': str(obj.latitude)
-            }
-            res = requests.get(settings.KAKAO_LOCATION_URL, headers=headers, params=params)
-            if res.status_code == 200:
-                try:
-                    result = res.json()
-                    obj.location = result['documents'][0]['address_name']
-                    obj.save()
-                except:
-                    pass
+            HttpJob.objects.enqueue('bid_location', bid_id=obj.id)
 
         log_with_reason(request.user, obj, 'added', '"%s" 미션 %s원으로 입찰' % (self._mission.content_short, obj.amount))
         return response.Response(data=self.serializer_class(instance=obj).data)
@@ -1,11 +1,14 @@
+import dateutil.parser
+
 from django.contrib import admin
 from django import forms
 from django.contrib import messages
 from django.db.models import Q, Count, Sum, Case, When, F, IntegerField
+from django.http import JsonResponse
 
 from common.admin import RelatedAdminMixin, NullFilter, AdditionalAdminUrlsMixin
-from base.admin import BaseAdmin
-from .models import ReceiverGroup, Notification, Tasker
+from base.admin import BaseAdmin, get_preset_dates
+from .models import ReceiverGroup, Notification, Tasker, PushDeliveryMetric
 
 
 class NotificationAdminForm(forms.ModelForm):
@@ -203,3 +206,42 @@ class TaskerAdmin(BaseAdmin):
     def get_last_task(self, obj):
         return obj.last_notification.created_datetime if obj.last_notification else '-'
     get_last_task.short_description = '마지막 전송 작업'
+
+
+@admin.register(PushDeliveryMetric)
+class PushDeliveryMetricAdmin(AdditionalAdminUrlsMixin, BaseAdmin):
+    """
+    푸쉬 발송 측정 어드민
+    """
+    list_display = ('created_datetime', 'condition', 'data_type', 'notification', 'request_count', 'success_count',
+                    'failure_count', 'token_seconds', 'fcm_seconds_max', 'reach_seconds', 'delay_seconds')
+    list_filter = ('condition', 'data_type')
+    raw_id_fields = ('notification',)
+    date_hierarchy = 'created_datetime'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_additional_urls(self):
+        return {
+            'summary': 'summary/',
+        }
+
+    def view_summary(self, request, *args, **kwargs):
+        """태스커 조건, 랜딩 타입별 집계 json : ?preset= 또는 ?start=&end= (통계 페이지와 같음)"""
+        if not self.has_view_permission(request):
+            return JsonResponse({'detail': 'permission denied'}, status=403)
+        current_date, start_date, end_date = get_preset_dates(request.GET.get('preset') or None)
+        if request.GET.get('start'):
+            start_date = dateutil.parser.parse(request.GET['start']).date()
+        if request.GET.get('end'):
+            end_date = dateutil.parser.parse(request.GET['end']).date()
+        qs = self.model.objects.filter(created_datetime__date__range=(start_date, end_date))
+        return JsonResponse({
+            'start_date': start_date,
+            'end_date': end_date,
+            'results': qs.summarize(),
+        })
@@ -0,0 +1,34 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from notification.models import Notification
+
+
+class Command(BaseCommand):
+    """
+    sms 전송결과 확인 커맨드 : 결과를 받지 못한 알림을 모아서 확인
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, dest='batch_size', default=500, help='한번에 확인할 알림 수')
+        parser.add_argument('--concurrency', type=int, dest='concurrency',
+                            default=getattr(settings, 'SMS_RESULT_CHECK_CONCURRENCY', 4), help='동시 확인 수')
+
+    def handle(self, *args, **options):
+        pending = list(Notification.objects.result_pending().order_by('requested_datetime')[:options['batch_size']])
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            results = list(executor.map(self.check, pending))
+        print('checked %s, done %s' % (len(pending), sum(results)))
+
+    def check(self, obj):
+        try:
+            obj.check_result()
+            return bool(obj.done_datetime)
+        except Exception as e:
+            print('Notification', obj.id, ':', e)
+            return False
+        finally:
+            connection.close()
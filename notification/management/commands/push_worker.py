@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from notification.workers import PushWorker
+
+
+class Command(BaseCommand):
+    """
+    푸쉬 발송 워커 실행 커맨드 (queued.py 대체)
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, dest='port', default=None, help='큐 등록 포트 (기본 PUSH_QUEUE_PORT)')
+        parser.add_argument('--no-listen', action='store_true', dest='no_listen',
+                            help='포트를 열지 않고 대기열만 처리 (워커를 여러개 띄울 때)')
+        parser.add_argument('--batch-size', type=int, dest='batch_size', default=None, help='한번에 선점할 알림 수')
+        parser.add_argument('--concurrency', type=int, dest='concurrency', default=None, help='동시 발송 스레드 수')
+
+    def handle(self, *args, **options):
+        worker = PushWorker(batch_size=options['batch_size'], concurrency=options['concurrency'])
+        if options['no_listen']:
+            worker.run_forever()
+        else:
+            worker.serve(port=options['port'])
@@ -0,0 +1,52 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import models
+from django.utils import timezone
+
+from notification.models import Notification, NotificationReceipt
+from notification.utils import UnreadNotificationCounter
+
+
+class Command(BaseCommand):
+    """
+    읽지 않은 알림 수 캐쉬 보정 커맨드
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true', dest='check',
+            help='보정하지 않고 캐쉬와 실제 값이 다른 회원만 출력',
+        )
+
+    def handle(self, *args, **options):
+        counter = UnreadNotificationCounter()
+        actual = self.get_actual_counts()
+        keys = {user_id: counter.get_key(user_id) for user_id in actual}
+        cached = cache.get_many(keys.values())
+
+        drifted = {}
+        for user_id, count in actual.items():
+            value = cached.get(keys[user_id])
+            if value is not None and value != count:
+                drifted[user_id] = (value, count)
+
+        if options['check']:
+            for user_id, (value, count) in drifted.items():
+                print('user %s : cached %s, actual %s' % (user_id, value, count))
+        else:
+            cache.set_many({keys[user_id]: count for user_id, count in actual.items()}, counter.timeout)
+        print('checked %s users, drifted %s' % (len(actual), len(drifted)))
+
+    def get_actual_counts(self):
+        """최근 30일 내 푸쉬를 받은 회원별 읽지 않은 알림 수 (get_by_usercode 기준)"""
+        notifications = Notification.objects.filter(
+            send_method='push', receiver_user__isnull=False,
+            requested_datetime__gte=timezone.now() - timezone.timedelta(days=30)
+        )
+        counts = dict.fromkeys(notifications.values_list('receiver_user_id', flat=True).distinct(), 0)
+        unread = notifications.annotate(is_read=models.Exists(NotificationReceipt.objects.filter(
+            notification=models.OuterRef('pk'), user=models.OuterRef('receiver_user'), read_datetime__isnull=False
+        ))).filter(is_read=False).values('receiver_user_id').annotate(count=models.Count('id')).order_by()
+        for row in unread:
+            counts[row['receiver_user_id']] = row['count']
+        return counts
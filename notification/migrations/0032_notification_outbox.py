@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+
+ENQUEUE_SQL = """
+UPDATE notification_notification SET next_attempt_datetime = now()
+WHERE send_method IN ('push', 'kakao') AND requested_datetime IS NULL
+    AND created_datetime > now() - interval '5 minutes';
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notification', '0031_auto_20211005_1430'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='next_attempt_datetime',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='발송 대기 일시'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(blank=True, default=0, verbose_name='발송 시도 횟수'),
+        ),
+        migrations.RunSQL(ENQUEUE_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BACKFILL_SQL = """
+INSERT INTO notification_notificationreceipt (notification_id, user_id, read_datetime, acted_datetime, created_datetime)
+SELECT DISTINCT ON (n.id, u.id)
+    n.id, u.id,
+    COALESCE(n.requested_datetime, n.created_datetime),
+    CASE WHEN jsonb_typeof(n.result->'did_action') = 'array' AND (n.result->'did_action') ? u.code
+        THEN COALESCE(n.requested_datetime, n.created_datetime) END,
+    now()
+FROM notification_notification n
+CROSS JOIN LATERAL jsonb_array_elements_text(
+    CASE WHEN jsonb_typeof(n.result->'read') = 'array' THEN n.result->'read' ELSE '[]'::jsonb END
+    || CASE WHEN jsonb_typeof(n.result->'did_action') = 'array' THEN n.result->'did_action' ELSE '[]'::jsonb END
+) AS r(code)
+JOIN accounts_user u ON u.code = r.code
+WHERE n.result IS NOT NULL
+ON CONFLICT DO NOTHING;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notification', '0032_notification_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationReceipt',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('read_datetime', models.DateTimeField(blank=True, null=True, verbose_name='읽음 일시')),
+                ('acted_datetime', models.DateTimeField(blank=True, null=True, verbose_name='누름 일시')),
+                ('created_datetime', models.DateTimeField(auto_now_add=True, verbose_name='작성일시')),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='receipts', to='notification.Notification', verbose_name='알림')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notification_receipts', to=settings.AUTH_USER_MODEL, verbose_name='회원')),
+            ],
+            options={
+                'verbose_name': '알림 수신 확인',
+                'verbose_name_plural': '알림 수신 확인',
+                'unique_together': {('notification', 'user')},
+                'index_together': {('user', 'notification', 'read_datetime', 'acted_datetime')},
+            },
+        ),
+        migrations.RunSQL(BACKFILL_SQL, migrations.RunSQL.noop),
+    ]
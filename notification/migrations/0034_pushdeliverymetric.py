@@ -0,0 +1,38 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notification', '0033_notificationreceipt'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PushDeliveryMetric',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification_count', models.PositiveIntegerField(default=1, verbose_name='알림 수')),
+                ('condition', models.CharField(blank=True, default='', max_length=100, verbose_name='태스커 조건')),
+                ('data_type', models.CharField(blank=True, default='', max_length=30, verbose_name='랜딩 타입')),
+                ('request_count', models.PositiveIntegerField(default=0, verbose_name='요청 수')),
+                ('success_count', models.PositiveIntegerField(default=0, verbose_name='성공 수')),
+                ('failure_count', models.PositiveIntegerField(default=0, verbose_name='실패 수')),
+                ('unregistered_count', models.PositiveIntegerField(default=0, verbose_name='무효 토큰 수')),
+                ('slice_count', models.PositiveIntegerField(default=0, verbose_name='멀티캐스트 수')),
+                ('token_seconds', models.FloatField(blank=True, null=True, verbose_name='토큰 조회 시간')),
+                ('fcm_seconds_avg', models.FloatField(blank=True, null=True, verbose_name='FCM 평균 응답시간')),
+                ('fcm_seconds_max', models.FloatField(blank=True, null=True, verbose_name='FCM 최대 응답시간')),
+                ('send_seconds', models.FloatField(blank=True, null=True, verbose_name='발송 소요시간')),
+                ('reach_seconds', models.FloatField(blank=True, help_text='발송 시작부터 요청 토큰의 95%가 성공할 때까지의 시간', null=True, verbose_name='95% 도달시간')),
+                ('delay_seconds', models.FloatField(blank=True, help_text='작성부터 발송요청까지의 시간', null=True, verbose_name='발송 지연시간')),
+                ('created_datetime', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='작성일시')),
+                ('notification', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='push_metrics', to='notification.Notification', verbose_name='알림')),
+            ],
+            options={
+                'verbose_name': '푸쉬 발송 측정',
+                'verbose_name_plural': '푸쉬 발송 측정',
+            },
+        ),
+    ]
@@ -1,6 +1,7 @@
 import threading
 import time
 import socket
+import string
 import json
 from logging import getLogger
 
@@ -10,7 +11,8 @@ from harupy.text import String
 from harupy.shell import cmd
 
 from django.apps import apps
-from django.db import models
+from django.db import models, transaction
+from django.core.cache import cache
 from django.core.mail import EmailMultiAlternatives
 from django.conf import settings
 from django.contrib.auth import get_user_model
@@ -22,10 +24,10 @@ from django.utils.functional import cached_property
 from django.template.loader import render_to_string
 from django.forms import ValidationError
 
-from common.utils import CachedProperties
+from common.utils import CachedProperties, SingletonOptimizedMeta
 from base.models import Area
 from accounts.serializers import SimpleProfileSerializer
-from notification.utils import SMSHandler, KakaoHandler, PushHandler
+from notification.utils import SMSHandler, KakaoHandler, PushHandler, UnreadNotificationCounter
 
 
 sms = SMSHandler()
@@ -305,18 +307,6 @@ EMAIL_PRESETS = {
 }
 
 
-def sms_result_check_worker(obj):
-    """sms 결과확인 수행 워커"""
-    i = 0
-    if obj.result and 'code' in obj.result and obj.result['code'] == '200':
-        while not ('data' in obj.result and 'resultCode' in obj.result['data'] and obj.result['data']['resultCode']):
-            time.sleep(settings.SMS_RESULT_DELAY)
-            obj.check_result()
-            i += 1
-            if i > 10:
-                break
-
-
 def push_worker(obj):
     """push 수행 워커"""
     obj.send()
@@ -373,6 +363,13 @@ class QueueRegisterer:
     def push(self, obj_id):
         return self.request('PUSH:%s' % str(obj_id))
 
+    def wake(self, obj_id):
+        """발송 워커 깨우기 : 워커가 꺼져 있어도 발송 대기열에 남아 있으므로 실패는 무시"""
+        try:
+            return self.push(obj_id)
+        except OSError:
+            return False
+
 
 class NotificationManager(models.Manager):
     """
@@ -382,28 +379,31 @@ class NotificationManager(models.Manager):
         self.user_model = get_user_model()
         super(NotificationManager, self).__init__()
 
+    def with_is_read(self, qs, code):
+        """회원의 읽음 여부 annotate"""
+        return qs.annotate(is_read=models.Exists(NotificationReceipt.objects.filter(
+            notification=models.OuterRef('pk'), user__code=code, read_datetime__isnull=False
+        )))
+
     def get_by_usercode(self, code, days=30, limit=0, exclude_read=False, send_method='push'):
         qs = self.get_queryset().filter(receiver_user__code=code, send_method=send_method).order_by('-requested_datetime')
         if days:
             qs = qs.filter(requested_datetime__gte=(timezone.now() - timezone.timedelta(days=days)))
+        qs = self.with_is_read(qs, code)
         if exclude_read:
-            qs = qs.exclude(result__read__contains=code)
+            qs = qs.filter(is_read=False)
         if limit:
             return qs[:limit]
         return qs
 
-    def _get_by_usercode(self, code, days=30, limit=0, exclude_read=False):
-        qs = self.get_queryset().filter(send_method='push', result__requested__contains=code) \
-             .exclude(receiver_areas__id__isnull=False) \
-             .exclude(receiver_groups__code='online_helper') \
-             .order_by('-requested_datetime')
-        if days:
-            qs = qs.filter(requested_datetime__gte=(timezone.now() - timezone.timedelta(days=days)))
-        if exclude_read:
-            qs = qs.exclude(result__read__contains=code)
-        if limit:
-            return qs[:limit]
-        return qs
+    def result_pending(self, send_method='sms'):
+        """전송결과를 아직 받지 못한 알림 : 발송요청 후 SMS_RESULT_DELAY 초 지났고 SMS_RESULT_CHECK_HOURS 시간 이내"""
+        now = timezone.now()
+        return self.filter(
+            send_method=send_method, done_datetime__isnull=True, failed_datetime__isnull=True, result__code='200',
+            requested_datetime__lte=now - timezone.timedelta(seconds=getattr(settings, 'SMS_RESULT_DELAY', 5)),
+            requested_datetime__gte=now - timezone.timedelta(hours=getattr(settings, 'SMS_RESULT_CHECK_HOURS', 1)),
+        ).filter(models.Q(result__data__resultCode__isnull=True) | models.Q(result__data__resultCode=''))
 
     def not_requested(self, send_method=None):
         qs = self.filter(requested_datetime__isnull=True)
@@ -411,6 +411,50 @@ class NotificationManager(models.Manager):
             qs = qs.filter(send_method=send_method)
         return qs
 
+    def outbox(self):
+        """발송 대기 알림 : 발송요청 전이고 다음 시도일시가 지정된 것"""
+        return self.filter(requested_datetime__isnull=True, next_attempt_datetime__isnull=False)
+
+    def enqueue(self, obj, delay=None):
+        """발송 대기열에 등록"""
+        obj.next_attempt_datetime = timezone.now() + (delay or timezone.timedelta())
+        self.filter(id=obj.id).update(next_attempt_datetime=obj.next_attempt_datetime)
+        return obj
+
+    def claim(self, limit=50, lease=None):
+        """
+        발송할 알림 id 선점 : 다른 워커가 잠근 행은 건너뛰고, 선점한 행은 lease 동안 다른 워커가 가져가지 않음
+        (워커가 중간에 죽으면 lease 이후 다시 시도)
+        """
+        now = timezone.now()
+        lease = lease or timezone.timedelta(seconds=getattr(settings, 'NOTIFICATION_OUTBOX_LEASE', 300))
+        with transaction.atomic():
+            ids = list(self.outbox().filter(next_attempt_datetime__lte=now).select_for_update(skip_locked=True)
+                       .order_by('next_attempt_datetime').values_list('id', flat=True)[:limit])
+            if ids:
+                self.filter(id__in=ids).update(attempts=models.F('attempts') + 1, next_attempt_datetime=now + lease)
+        return ids
+
+    def claim_relayed(self, notification_id, lease=None):
+        """
+        릴레이 서버에서 발송할 알림 선점 : 아직 워커가 선점하지 않은(attempts=0) 경우에만 성공
+        선점하면 lease 동안 발송 대기열에서 가져가지 않음
+        """
+        lease = lease or timezone.timedelta(seconds=getattr(settings, 'NOTIFICATION_OUTBOX_LEASE', 300))
+        return bool(self.filter(id=notification_id, requested_datetime__isnull=True, attempts=0).update(
+            attempts=1, next_attempt_datetime=timezone.now() + lease
+        ))
+
+    def renew_lease(self, notification_id, attempts, lease=None):
+        """
+        선점 연장 : 오래 걸리는 발송 중에 lease 가 끝나 다른 워커가 다시 선점하지 않도록 함
+        (선점한 뒤 다른 워커가 다시 선점하지 않은 경우(attempts 가 같은 경우)만 연장)
+        """
+        lease = lease or timezone.timedelta(seconds=getattr(settings, 'NOTIFICATION_OUTBOX_LEASE', 300))
+        return bool(self.filter(id=notification_id, requested_datetime__isnull=True, attempts=attempts).update(
+            next_attempt_datetime=timezone.now() + lease
+        ))
+
     def kakao(self, receiver, template_code, title, content, sender=None, tasker=None):
         kwargs = {
             'send_method': 'kakao',
@@ -449,9 +493,6 @@ class NotificationManager(models.Manager):
         if sender and isinstance(sender, self.user_model):
             kwargs.update({'created_user': sender})
         obj = self.create(**kwargs)
-        # obj.send()
-        # worker = threading.Thread(target=sms_result_check_worker, args=(obj,))
-        # worker.start()
         return obj.send_or_relay()
 
     def sms_preset(self, receiver, preset, args=[], sender=None):
@@ -517,6 +558,44 @@ class NotificationManager(models.Manager):
             obj.send(commit=False)
         return obj
 
+    def push_many(self, receivers, data={}, tasker=None):
+        """
+        회원별 푸쉬 알림 일괄 생성 및 전송 : receivers 는 (회원, 제목, 내용) 목록
+        제목/내용이 같은 알림끼리 멀티캐스트로 한번에 보내고, 푸쉬 토큰이 없는 회원은 제외
+        """
+        user_ids = [user.id for user, _, _ in receivers]
+        codes_with_tokens = {code for code, _ in self.user_model.objects.filter(id__in=user_ids)
+                             .get_code_and_push_tokens(only_if_allowed=False)}
+        objs = self.bulk_create([
+            self.model(send_method='push', subject=title, content=content, tasker=tasker, receiver_user=user,
+                       **{'data_' + k: v for k, v in data.items()})
+            for user, title, content in receivers if user.code in codes_with_tokens
+        ])
+
+        groups = {}
+        for obj in objs:
+            groups.setdefault((obj.subject, obj.content), []).append(obj)
+        now = timezone.now()
+        retry_at = now + timezone.timedelta(seconds=self.model.BACKOFF_SECONDS)
+        metrics = []
+        for group in groups.values():
+            results, group_metrics = push.send_many(group)
+            for obj in group:
+                obj.result = results[obj.id]
+                # 한 건도 전송되지 않은 알림은 요청일시를 남기지 않고 발송 대기열에서 재시도
+                if obj.result['success_count']:
+                    obj.requested_datetime = now
+                else:
+                    obj.next_attempt_datetime = retry_at
+            metrics.append((group, group_metrics))
+        self.bulk_update(objs, ['result', 'requested_datetime', 'next_attempt_datetime'])
+        PushDeliveryMetric.objects.record_many(metrics)
+
+        counter = UnreadNotificationCounter()
+        requested_user_ids = [obj.receiver_user_id for obj in objs if obj.requested_datetime]
+        transaction.on_commit(lambda: [counter.incr(user_id) for user_id in requested_user_ids])
+        return objs
+
     def push_preset(self, receiver, preset, args=[], kwargs={}, request=None, sender=None, title='애니맨 알림', lazy=False):
         content = PUSH_PRESETS[preset][0].format(*args)
         data = PUSH_PRESETS[preset][1]
@@ -654,11 +733,16 @@ class Notification(models.Model):
     done_datetime = models.DateTimeField('발송완료일시', null=True, blank=True)
     failed_datetime = models.DateTimeField('발송실패일시', null=True, blank=True)
     read_datetime = models.DateTimeField('수신일시', null=True, blank=True)
+    next_attempt_datetime = models.DateTimeField('발송 대기 일시', null=True, blank=True, db_index=True)
+    attempts = models.PositiveSmallIntegerField('발송 시도 횟수', blank=True, default=0)
     receiver_identifier = models.TextField('수신 식별자', blank=True, default='')
     result = JSONField('결과', null=True, blank=True)
 
     objects = NotificationManager()
 
+    MAX_ATTEMPTS = 5
+    BACKOFF_SECONDS = 30
+
     class Meta:
         verbose_name = '알림'
         verbose_name_plural = '알림'
@@ -728,15 +812,21 @@ class Notification(models.Model):
 
     @cached_property
     def code_and_tokens(self):
+        return list(self.iter_code_and_tokens())
+
+    def iter_code_and_tokens(self):
+        """(회원코드, 푸쉬토큰) 을 토큰 중복없이 순차적으로 가져옴"""
         if self.receiver_identifier and not self.receiver_user:
             try:
-                return json.loads(self.receiver_identifier)
+                code_and_tokens = json.loads(self.receiver_identifier)
             except:
-                return []
+                return iter([])
+            return iter(dict((token, (code, token)) for code, token in code_and_tokens).values())
         # 수신회원이 특정된 경우에는 알림허용 여부를 무시하고 보냄
         only_if_allowed = False if self.receiver_user else True
         return self.target_users.get_code_and_push_tokens(only_if_allowed=only_if_allowed,
-                                                          is_mission_request=self.receiver_areas.exists())
+                                                          is_mission_request=self.receiver_areas.exists(),
+                                                          iterator=True)
 
     @property
     def success_count(self):
@@ -756,11 +846,19 @@ class Notification(models.Model):
         return self._requested_count
 
     def send_worker_start(self):
+        """
+        릴레이 서버에서의 발송
+        sms 는 바로 발송 (전송결과는 check_sms_results 커맨드에서 주기적으로 확인)
+        kakao 는 발송 대기열의 워커보다 먼저 선점한 경우에만 발송
+        """
         if self.send_method == 'sms':
             self.send()
-            worker = threading.Thread(target=sms_result_check_worker, args=(self,))
-            worker.start()
             return True
+        if self.send_method == 'kakao':
+            if not Notification.objects.claim_relayed(self.id):
+                return False
+            self.refresh_from_db()
+            return self.send_from_outbox()
         return False
 
     def send_or_relay(self, lazy=False):
@@ -773,6 +871,8 @@ class Notification(models.Model):
 
         if self.send_method == 'kakao':
             if settings.NOTIFICATION['relay_url']:
+                # 릴레이 서버가 먼저 선점해서 발송하고, 선점하지 못한 경우(릴레이 실패) 발송 대기열에서 발송
+                Notification.objects.enqueue(self, delay=timezone.timedelta(minutes=1))
                 requests.get(settings.NOTIFICATION['relay_url'] + str(self.id) + '/')
             else:
                 self.send()
@@ -780,22 +880,23 @@ class Notification(models.Model):
 
         if self.send_method == 'push':
             if lazy:
-                if self.tasker_id:
-                    # 태스커에 의한 lazy 전송의 경우 별도 스크립트로 처리
-                    return self
-                queue = QueueRegisterer()
-                if queue.push(self.id):
-                    return self
+                # lazy 전송은 발송 대기열에 등록하고 발송 워커를 깨움
+                Notification.objects.enqueue(self)
+                QueueRegisterer().wake(self.id)
+                return self
 
             # cmd('nohup ./venv/bin/python3 manage.py notify push %s' % obj.id)
             self.send()
+            if not self.requested_datetime:
+                Notification.objects.enqueue(self, delay=timezone.timedelta(seconds=self.BACKOFF_SECONDS))
             return self
 
         if self.send_method == 'email':
             self.send()
             return self
 
-    def send(self, commit=True):
+    def send(self, commit=True, heartbeat=None):
+        metrics = None
         if self.send_method == 'sms':
             self.result = sms.send(self.receiver_identifier, self.content, self.id)
             if self.result and 'code' in self.result and self.result['code'] == '200':
@@ -808,12 +909,17 @@ class Notification(models.Model):
 
         if self.send_method == 'push':
             # self.result = push.send(self.subject, self.content, self.data, tokens=self.tokens)
-            self.result = push.send_by_obj(self) if commit else push.no_send_by_obj(self)
+            self.result = push.send_by_obj(self, heartbeat) if commit else push.no_send_by_obj(self)
+            metrics = self.result.pop('metrics', None)
 
-            if self.requested_datetime:
-                self.retried_datetime = timezone.now()
-            else:
-                self.requested_datetime = timezone.now()
+            # 보낼 토큰이 있었는데 한 건도 전송되지 않은 경우는 요청되지 않은 것으로 두고 발송 대기열에서 재시도
+            if not commit or self.result.get('success_count') or not self.result.get('request_count'):
+                if self.requested_datetime:
+                    self.retried_datetime = timezone.now()
+                else:
+                    self.requested_datetime = timezone.now()
+                    if self.receiver_user_id:
+                        transaction.on_commit(lambda: UnreadNotificationCounter().incr(self.receiver_user_id))
 
         if self.send_method == 'kakao':
             self.result = kakao.send(self.receiver_identifier, self.data_type, self.subject, self.content, self.id)
@@ -855,31 +961,42 @@ class Notification(models.Model):
                 }
                 self.failed_datetime = timezone.now()
 
+        if self.requested_datetime:
+            self.next_attempt_datetime = None
         self.save()
+        if metrics:
+            PushDeliveryMetric.objects.record_many([([self], metrics)])
+
+    def send_from_outbox(self):
+        """
+        발송 대기열에서 선점한 알림 발송, 실패하면 backoff 후 재시도하고 최대 횟수를 넘으면 실패 처리
+        지역/그룹 푸쉬처럼 오래 걸리는 발송은 slice 마다 선점을 연장
+        """
+        try:
+            self.send(heartbeat=lambda: Notification.objects.renew_lease(self.id, self.attempts))
+            error = None if self.requested_datetime else '발송요청 실패'
+        except Exception as e:
+            error = e
+        if error:
+            if self.attempts >= self.MAX_ATTEMPTS:
+                self.next_attempt_datetime = None
+                self.failed_datetime = timezone.now()
+            else:
+                self.next_attempt_datetime = timezone.now() + timezone.timedelta(
+                    seconds=self.BACKOFF_SECONDS * 2 ** (self.attempts - 1))
+            Notification.objects.filter(id=self.id).update(
+                next_attempt_datetime=self.next_attempt_datetime, failed_datetime=self.failed_datetime)
+            logger.warning('[outbox] %s failed (%s) : %s' % (self.id, self.attempts, error))
+            return False
+        return True
 
-    def read(self, code):
-        if 'read' not in self.result:
-            self.result['read'] = [code]
-            self.save()
-            return True
-        elif code not in self.result['read']:
-            self.result['read'].append(code)
-            self.save()
-            return True
-        return False
+    def read(self, user):
+        """회원(또는 회원코드)의 읽음 처리, 새로 읽은 경우 True"""
+        return NotificationReceipt.objects.mark(self, user)
 
-    def did_action(self, code):
-        if 'did_action' not in self.result:
-            self.result['did_action'] = [code]
-            if not self.read(code):
-                self.save()
-            return True
-        elif code not in self.result['did_action']:
-            self.result['did_action'].append(code)
-            if not self.read(code):
-                self.save()
-            return True
-        return False
+    def did_action(self, user):
+        """회원(또는 회원코드)의 누름 처리, 새로 누른 경우 True"""
+        return NotificationReceipt.objects.mark(self, user, action=True)
 
     def check_result(self):
         if not self.result:
@@ -930,20 +1047,231 @@ class Notification(models.Model):
         return '[%s] %s' % (self.get_state_display, localize(dt))
 
 
+class NotificationReceiptQuerySet(models.QuerySet):
+    """
+    알림 수신 확인 쿼리셋
+    """
+    def mark(self, notification, user, action=False):
+        """읽음(action 이면 누름도) 기록, 새로 기록된 경우 True"""
+        if isinstance(user, str):
+            user = get_user_model().objects.get(code=user)
+        field = 'acted_datetime' if action else 'read_datetime'
+        now = timezone.now()
+        obj, created = self.get_or_create(notification=notification, user=user, defaults={
+            'read_datetime': now,
+            'acted_datetime': now if action else None,
+        })
+        if created:
+            self.decr_unread(notification, user)
+            return True
+        marked = self.filter(id=obj.id, **{'%s__isnull' % field: True}).update(**{field: now})
+        read = marked if not action else \
+            self.filter(id=obj.id, read_datetime__isnull=True).update(read_datetime=now)  # 누르면 읽음 처리도 함께
+        if read:
+            self.decr_unread(notification, user)
+        return bool(marked)
+
+    def decr_unread(self, notification, user):
+        """읽지 않은 알림 수에 포함되는 알림(회원에게 보낸 푸쉬, 같은 집계 기간 내 발송요청)인 경우 감소"""
+        counter = UnreadNotificationCounter()
+        if notification.receiver_user_id == user.id and counter.is_counted(notification):
+            counter.decr(user.id)
+
+
+class NotificationReceipt(models.Model):
+    """
+    알림 수신 확인 : 회원별 읽음/누름 일시
+    """
+    notification = models.ForeignKey(Notification, verbose_name='알림', related_name='receipts',
+                                     on_delete=models.CASCADE)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, verbose_name='회원', related_name='notification_receipts',
+                             on_delete=models.CASCADE)
+    read_datetime = models.DateTimeField('읽음 일시', null=True, blank=True)
+    acted_datetime = models.DateTimeField('누름 일시', null=True, blank=True)
+    created_datetime = models.DateTimeField('작성일시', auto_now_add=True)
+
+    objects = NotificationReceiptQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = '알림 수신 확인'
+        verbose_name_plural = '알림 수신 확인'
+        unique_together = (('notification', 'user'),)
+        index_together = (('user', 'notification', 'read_datetime', 'acted_datetime'),)
+
+    def __str__(self):
+        return '%s - %s' % (self.notification_id, self.user_id)
+
+
+class Percentile(models.Aggregate):
+    """
+    postgresql 백분위수 집계
+    """
+    function = 'PERCENTILE_CONT'
+    template = '%(function)s(%(percentile)s) WITHIN GROUP (ORDER BY %(expressions)s)'
+    output_field = models.FloatField()
+
+    def __init__(self, expression, percentile, **extra):
+        super(Percentile, self).__init__(expression, percentile=percentile, **extra)
+
+
+class PushDeliveryMetricQuerySet(models.QuerySet):
+    """
+    푸쉬 발송 측정 쿼리셋
+    """
+    def record_many(self, metrics):
+        """[(같이 발송한 알림 목록, PushHandler 측정값)] 저장"""
+        objs = []
+        for notifications, data in metrics:
+            first = notifications[0]
+            objs.append(self.model(
+                notification=first,
+                notification_count=len(notifications),
+                condition=first.tasker.condition if first.tasker_id else '',
+                data_type=first.data_type,
+                delay_seconds=(first.requested_datetime - first.created_datetime).total_seconds()
+                if first.requested_datetime and first.created_datetime else None,
+                **{field: data.get(field) for field in self.model.METRIC_FIELDS}
+            ))
+        try:
+            with transaction.atomic():
+                return self.bulk_create(objs)
+        except Exception as e:
+            # 측정값 저장 실패로 발송 처리가 실패하지 않도록 함
+            logger.error('[PushDeliveryMetric] %s' % e)
+            return []
+
+    def summarize(self):
+        """태스커 조건, 랜딩 타입별 집계"""
+        conditions = dict(CONDITIONS)
+        rows = list(self.values('condition', 'data_type').annotate(
+            sends=models.Count('id'),
+            notifications=models.Sum('notification_count'),
+            request_count=models.Sum('request_count'),
+            success_count=models.Sum('success_count'),
+            failure_count=models.Sum('failure_count'),
+            unregistered_count=models.Sum('unregistered_count'),
+            token_seconds=models.Avg('token_seconds'),
+            fcm_seconds_avg=models.Avg('fcm_seconds_avg'),
+            fcm_seconds_max=models.Max('fcm_seconds_max'),
+            send_seconds=models.Avg('send_seconds'),
+            reach_seconds=models.Avg('reach_seconds'),
+            reach_seconds_p95=Percentile('reach_seconds', 0.95),
+            delay_seconds=models.Avg('delay_seconds'),
+            delay_seconds_p95=Percentile('delay_seconds', 0.95),
+        ).order_by('-request_count'))
+        for row in rows:
+            row['condition_display'] = conditions.get(row['condition'], row['condition'])
+            for key, value in row.items():
+                if type(value) == float:
+                    row[key] = round(value, 3)
+        return rows
+
+
+class PushDeliveryMetric(models.Model):
+    """
+    푸쉬 발송 측정 : 발송 1회(멀티캐스트 묶음)마다 토큰 조회, FCM 응답, 도달 시간과 결과 건수
+    """
+    notification = models.ForeignKey(Notification, verbose_name='알림', null=True, blank=True,
+                                     related_name='push_metrics', on_delete=models.SET_NULL)
+    notification_count = models.PositiveIntegerField('알림 수', default=1)
+    condition = models.CharField('태스커 조건', max_length=100, blank=True, default='')
+    data_type = models.CharField('랜딩 타입', max_length=30, blank=True, default='')
+    request_count = models.PositiveIntegerField('요청 수', default=0)
+    success_count = models.PositiveIntegerField('성공 수', default=0)
+    failure_count = models.PositiveIntegerField('실패 수', default=0)
+    unregistered_count = models.PositiveIntegerField('무효 토큰 수', default=0)
+    slice_count = models.PositiveIntegerField('멀티캐스트 수', default=0)
+    token_seconds = models.FloatField('토큰 조회 시간', null=True, blank=True)
+    fcm_seconds_avg = models.FloatField('FCM 평균 응답시간', null=True, blank=True)
+    fcm_seconds_max = models.FloatField('FCM 최대 응답시간', null=True, blank=True)
+    send_seconds = models.FloatField('발송 소요시간', null=True, blank=True)
+    reach_seconds = models.FloatField('95% 도달시간', null=True, blank=True,
+                                      help_text='발송 시작부터 요청 토큰의 95%가 성공할 때까지의 시간')
+    delay_seconds = models.FloatField('발송 지연시간', null=True, blank=True, help_text='작성부터 발송요청까지의 시간')
+    created_datetime = models.DateTimeField('작성일시', auto_now_add=True, db_index=True)
+
+    objects = PushDeliveryMetricQuerySet.as_manager()
+
+    METRIC_FIELDS = ('request_count', 'success_count', 'failure_count', 'unregistered_count', 'slice_count',
+                     'token_seconds', 'fcm_seconds_avg', 'fcm_seconds_max', 'send_seconds', 'reach_seconds')
+
+    class Meta:
+        verbose_name = '푸쉬 발송 측정'
+        verbose_name_plural = '푸쉬 발송 측정'
+
+    def __str__(self):
+        return '%s %s (%s)' % (self.condition or '-', self.data_type or '-', self.notification_id)
+
+
+class TaskerTemplate:
+    """
+    미리 파싱한 태스커 문구
+    """
+    formatter = string.Formatter()
+
+    def __init__(self, text):
+        self.text = text
+        self.fields = {name.split('.')[0].split('[')[0] for _, name, _, _ in self.formatter.parse(text) if name}
+
+    def render(self, context):
+        return self.text.format(**context)
+
+
+class TaskerRegistry(metaclass=SingletonOptimizedMeta):
+    """
+    조건별 활성 태스커 (프로세스별)
+
+    태스커가 저장/삭제되면 캐쉬의 버전을 바꾸고, 각 프로세스는 check_interval 초마다 버전을 확인해서 다시 읽는다.
+    """
+    version_key = 'tasker_registry_version'
+
+    def __init__(self):
+        self.check_interval = getattr(settings, 'TASKER_REGISTRY_CHECK_INTERVAL', 10)
+        self.taskers = None
+        self.version = None
+        self.checked = 0
+
+    def load(self):
+        version = cache.get(self.version_key)
+        taskers = {}
+        for t in Tasker.objects.filter(is_active=True).select_related('auto_issue_coupon').order_by('condition', 'id'):
+            t.profile_fields  # 문구 파싱
+            taskers.setdefault(t.condition, []).append(t)
+        anyman.taskers = taskers
+        self.taskers, self.version, self.checked = taskers, version, time.monotonic()
+        return taskers
+
+    def invalidate(self):
+        cache.set(self.version_key, str(time.time()), None)
+        self.taskers = None
+
+    def get_taskers(self):
+        taskers = self.taskers
+        if taskers is None:
+            return self.load()
+        if time.monotonic() - self.checked > self.check_interval:
+            self.checked = time.monotonic()
+            if cache.get(self.version_key) != self.version:
+                return self.load()
+        return taskers
+
+    def get_active(self, condition, peoriod_only=False):
+        """TaskerQuerySet.get_active 와 같은 조건"""
+        today = timezone.now().date()
+        return [t for t in self.get_taskers().get(condition, [])
+                if (t.start_date and t.end_date and t.start_date <= today <= t.end_date)
+                or (not peoriod_only and not t.start_date and not t.end_date)]
+
+
 class TaskerQuerySet(models.QuerySet):
     """
     알림 태스커 쿼리셋
     """
     def cache_taskers(self):
-        anyman.taskers = {}
         try:
-            for t in self.filter(is_active=True).order_by('condition'):
-                if t.condition in anyman.taskers:
-                    anyman.taskers[t.condition].append(t)
-                else:
-                    anyman.taskers.update({t.condition: [t]})
+            TaskerRegistry().load()
         except:
-            pass
+            anyman.taskers = {}
 
     def get_active(self, condition=None, peoriod_only=False):
         today = timezone.now().date()
@@ -955,16 +1283,26 @@ class TaskerQuerySet(models.QuerySet):
         return qs
 
     def task(self, condition, request=None, user=None, obj=None, kwargs={}, data={}):
-        # if condition in anyman.taskers:
         user = user or request.user
         notifications = []
-        for t in self.get_active(condition=condition):
+        for t in TaskerRegistry().get_active(condition):
             notifications.append(t.send(user, obj=obj, kwargs=kwargs, additional_data=data))
         notifications = [n for n in notifications if n]
         return  notifications[0] if notifications else None
 
+    def task_many(self, condition, users_with_kwargs, data={}):
+        """
+        여러 회원에게 태스커 일괄 실행 : users_with_kwargs 는 (회원, kwargs) 목록
+        lazy 태스커도 바로 발송 (배치 작업에서만 사용)
+        """
+        users_with_kwargs = list(users_with_kwargs)
+        notifications = []
+        for t in TaskerRegistry().get_active(condition):
+            notifications += t.send_many(users_with_kwargs, additional_data=data)
+        return notifications
+
     def check_and_run_peoriod_task(self, condition, user):
-        for t in self.get_active(condition, peoriod_only=True):
+        for t in TaskerRegistry().get_active(condition, peoriod_only=True):
             if condition == '2nd_mission_done_in_peoriod':
                 if user.get_mission_done_in_peoriod(t.start_date, t.end_date).count() == 2:
                     t.send(user)
@@ -991,6 +1329,13 @@ class Tasker(models.Model):
 
     objects = TaskerQuerySet.as_manager()
 
+    TEMPLATE_FIELDS = {
+        'push': ('push_title', 'push_content'),
+        'kakao': ('kakao_content',),
+        'email': ('email_title', 'email_content'),
+        'sms': ('sms_content',),
+    }
+
     class Meta:
         verbose_name = '알림 태스커'
         verbose_name_plural = '알림 태스커'
@@ -1009,9 +1354,14 @@ class Tasker(models.Model):
         #     if same_conditions.exists():
         #         same_conditions.update(is_active=False)
         saved = super(Tasker, self).save(*args, **kwargs)
-        Tasker.objects.cache_taskers()
+        transaction.on_commit(TaskerRegistry().invalidate)
         return saved
 
+    def delete(self, *args, **kwargs):
+        deleted = super(Tasker, self).delete(*args, **kwargs)
+        transaction.on_commit(TaskerRegistry().invalidate)
+        return deleted
+
     @property
     def send_methods(self):
         rtn = []
@@ -1032,21 +1382,32 @@ class Tasker(models.Model):
     def get_condition_display(self):
         return dict(CONDITIONS)[self.condition]
 
+    @cached_property
+    def templates(self):
+        """사용하는 발송 방법의 문구만 미리 파싱"""
+        return {field: TaskerTemplate(getattr(self, field))
+                for send_method in self.send_methods for field in self.TEMPLATE_FIELDS[send_method]}
+
+    @cached_property
+    def profile_fields(self):
+        """문구에서 사용하는 회원 프로필 항목"""
+        fields = set()
+        for template in self.templates.values():
+            fields |= template.fields
+        return fields & set(SimpleProfileSerializer.Meta.fields)
+
     def render(self, user, kwargs={}):
+        """사용하는 발송 방법의 문구만 렌더링해서 {항목명: 문구} 로 반환, 실패시 None"""
         try:
-            data = SimpleProfileSerializer(user).data
-            setattr(self, 'push_title_rendered', self.push_title.format(**data, **kwargs))
-            setattr(self, 'push_content_rendered', self.push_content.format(**data, **kwargs))
-            setattr(self, 'email_title_rendered', self.email_title.format(**data, **kwargs))
-            setattr(self, 'email_content_rendered', self.email_content.format(**data, **kwargs))
-            setattr(self, 'kakao_content_rendered', self.kakao_content.format(**data, **kwargs))
-            setattr(self, 'sms_content_rendered', self.sms_content.format(**data, **kwargs))
+            context = {field: getattr(user, field) for field in self.profile_fields}
+            context.update(kwargs)
+            return {field: template.render(context) for field, template in self.templates.items()}
         except:
-            return False
-        return True
+            return None
 
     def send(self, user, obj=None, kwargs={}, additional_data={}):
-        if not self.render(user, kwargs):
+        rendered = self.render(user, kwargs)
+        if rendered is None:
             return False
         if self.auto_issue_coupon:
             self.auto_issue_coupon.issue([user], tasker=self)
@@ -1054,56 +1415,85 @@ class Tasker(models.Model):
         for send_method in self.send_methods:
             send = getattr(self, 'send_%s' % send_method, None)
             if send and callable(send):
-                rtn = send(user, additional_data)
+                rtn = send(user, rendered, additional_data)
         return rtn
 
-    def send_push(self, user, additional_data={}):
+    def get_push_data(self, additional_data={}):
         data = {}
         if self.condition in CONDITION_PUSH_DATA:
             data.update(CONDITION_PUSH_DATA[self.condition])
         if self.auto_issue_coupon:
             data['page'] = 'MYPAGE_HISTORY_COUPON'
         data.update(additional_data)
+        return data
+
+    def send_many(self, users_with_kwargs, additional_data={}):
+        """여러 회원에게 일괄 발송 : 푸쉬는 같은 문구끼리 멀티캐스트, 나머지 발송 방법은 회원별 발송"""
+        rendered_users = []
+        for user, kwargs in users_with_kwargs:
+            rendered = self.render(user, kwargs)
+            if rendered is not None:
+                rendered_users.append((user, rendered))
+        if not rendered_users:
+            return []
+        if self.auto_issue_coupon:
+            self.auto_issue_coupon.issue([user for user, _ in rendered_users], tasker=self)
+
+        notifications = []
+        for send_method in self.send_methods:
+            if send_method == 'push':
+                notifications += Notification.objects.push_many(
+                    [(user, rendered['push_title'], rendered['push_content']) for user, rendered in rendered_users],
+                    data=self.get_push_data(additional_data),
+                    tasker=self
+                )
+                continue
+            send = getattr(self, 'send_%s' % send_method)
+            for user, rendered in rendered_users:
+                notifications.append(send(user, rendered, additional_data))
+        return [n for n in notifications if n]
+
+    def send_push(self, user, rendered, additional_data={}):
         try:
             return Notification.objects.push(
                 user,
-                self.push_title_rendered,
-                self.push_content_rendered,
-                data=data,
+                rendered['push_title'],
+                rendered['push_content'],
+                data=self.get_push_data(additional_data),
                 tasker=self,
                 lazy=self.is_lazy
             )
         except:
             return None
 
-    def send_kakao(self, user, additional_data={}):
+    def send_kakao(self, user, rendered, additional_data={}):
         try:
             return Notification.objects.kakao(
                 user,
                 self.kakao_template_code,
                 self.condition,
-                self.kakao_content_rendered,
+                rendered['kakao_content'],
                 tasker=self
             )
         except:
             return None
 
-    def send_sms(self, user, additional_data={}):
+    def send_sms(self, user, rendered, additional_data={}):
         try:
             return Notification.objects.sms(
                 user,
-                self.sms_content_rendered,
+                rendered['sms_content'],
                 tasker=self
             )
         except:
             return None
 
-    def send_email(self, user, additional_data={}):
+    def send_email(self, user, rendered, additional_data={}):
         try:
             return Notification.objects.email(
                 user,
-                self.email_title_rendered,
-                self.email_content_rendered,
+                rendered['email_title'],
+                rendered['email_content'],
                 tasker=self
             )
         except:
@@ -18,13 +18,14 @@ class NotificationSerializer(serializers.ModelSerializer):
         order_by = ('-created_datetime',)
 
     def get_is_new(self, obj):
-        is_new = 'read' not in obj.result or self.context['request'].user.code not in obj.result['read']
-        return is_new
+        if hasattr(obj, 'is_read'):
+            return not obj.is_read
+        return not obj.receipts.filter(user=self.context['request'].user, read_datetime__isnull=False).exists()
 
     def to_representation(self, instance):
         data = super(NotificationSerializer, self).to_representation(instance)
         if data['is_new']:
-            instance.read(self.context['request'].user.code)
+            instance.read(self.context['request'].user)
         return data
 
 
@@ -2,14 +2,24 @@ import json
 import requests
 import time
 import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 import firebase_admin
 from firebase_admin import credentials
 from firebase_admin import messaging, db, firestore
 from firebase_admin._messaging_utils import Aps, APNSPayload, APNSConfig, AndroidConfig, AndroidNotification
 
+from django.apps import apps
 from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
+from django.utils.functional import cached_property
 
 from common.utils import SingletonOptimizedMeta
 from accounts.models import User, LoggedInDevice
@@ -17,11 +27,22 @@ from accounts.models import User, LoggedInDevice
 
 class FirebaseAdmin(metaclass=SingletonOptimizedMeta):
     """
-    파이어베이스 초기화
+    파이어베이스 초기화 : 인증파일 로드와 앱 초기화는 처음 사용할 때 한번만 함
     """
     def __init__(self):
-        self.cred = credentials.Certificate(settings.FIREBASE_SERVICE_ACCOUNT_FILE)
-        self.app = firebase_admin.initialize_app(self.cred, settings.FIREBASE_OPTIONS, settings.FIREBASE_APP)
+        self.cred = None
+        self._app = None
+        self.lock = threading.Lock()
+
+    @property
+    def app(self):
+        if self._app is None:
+            with self.lock:
+                if self._app is None:
+                    self.cred = credentials.Certificate(settings.FIREBASE_SERVICE_ACCOUNT_FILE)
+                    self._app = firebase_admin.initialize_app(self.cred, settings.FIREBASE_OPTIONS,
+                                                              settings.FIREBASE_APP)
+        return self._app
 
 
 firebase = FirebaseAdmin()
@@ -29,22 +50,51 @@ firebase = FirebaseAdmin()
 logger = logging.getLogger('django')
 
 
+class SejongClient(metaclass=SingletonOptimizedMeta):
+    """
+    세종텔레콤 SMS/알림톡 api 클라이언트 : 커넥션 풀 공유, 타임아웃, 재시도
+    (발송 요청(POST)은 중복 발송을 막기 위해 연결 실패시에만 재시도)
+    """
+    def __init__(self):
+        pool_size = getattr(settings, 'SEJONG_POOL_SIZE', 10)
+        retry = Retry(total=getattr(settings, 'SEJONG_RETRY', 2), backoff_factor=0.3,
+                      status_forcelist=(500, 502, 503, 504), raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'Content-Type': 'application/json; charset=utf-8',
+            'sejongApiKey': settings.SMS_API_KEY,
+        })
+        self.timeout = getattr(settings, 'SEJONG_TIMEOUT', (3, 10))
+
+    def request(self, method, url, params):
+        response = self.session.request(method, url, params=params, timeout=self.timeout)
+        result = json.loads(response.text)
+        if 'sendCode' in result:
+            result.pop('sendCode')
+        return result
+
+    def get(self, url, params):
+        return self.request('get', url, params)
+
+    def post(self, url, params):
+        return self.request('post', url, params)
+
+
 class SMSHandler(metaclass=SingletonOptimizedMeta):
     """
     sms 처리기
     """
     api_key = None
     default_sender = None
-    headers = {}
     must_send = True
 
     def __init__(self):
         self.api_key = settings.SMS_API_KEY
         self.default_sender = settings.SMS_SENDER_NUMBER
-        self.headers = {
-            'Content-Type': 'application/json; charset=utf-8',
-            'sejongApiKey': settings.SMS_API_KEY,
-        }
+        self.client = SejongClient()
         self.must_send = getattr(settings, 'SMS_SEND', True)
 
     def send(self, receiver_number, content, obj_id, sender_number=''):
@@ -57,22 +107,14 @@ class SMSHandler(metaclass=SingletonOptimizedMeta):
             'receiverTelNo': receiver_number,
             'userKey': obj_id,
         }
-        response = requests.post(settings.SMS_SEND_URL, headers=self.headers, params=payload)
-        result = json.loads(response.text)
-        if 'sendCode' in result:
-            result.pop('sendCode')
-        return result
+        return self.client.post(settings.SMS_SEND_URL, payload)
 
     def check(self, obj_id):
         """sms 전송결과 확인"""
         payload = {
             'sendCode': obj_id
         }
-        response = requests.get(settings.SMS_RESULT_URL, headers=self.headers, params=payload)
-        result = json.loads(response.text)
-        if 'sendCode' in result:
-            result.pop('sendCode')
-        return result
+        return self.client.get(settings.SMS_RESULT_URL, payload)
 
 
 class KakaoHandler(metaclass=SingletonOptimizedMeta):
@@ -82,17 +124,13 @@ class KakaoHandler(metaclass=SingletonOptimizedMeta):
     api_key = None
     default_id = None
     default_sender = None
-    headers = {}
     must_send = True
 
     def __init__(self):
         self.api_key = settings.SMS_API_KEY
         self.default_id = settings.KAKAO_PLUS_ID
         self.default_sender = settings.KAKAO_SENDER_KEY
-        self.headers = {
-            'Content-Type': 'application/json; charset=utf-8',
-            'sejongApiKey': settings.SMS_API_KEY,
-        }
+        self.client = SejongClient()
         self.must_send = getattr(settings, 'KAKAO_SEND', True)
 
     def send(self, receiver_number, template_code, title, content, obj_id, sender_number=''):
@@ -108,22 +146,113 @@ class KakaoHandler(metaclass=SingletonOptimizedMeta):
             'receiverTelNo': receiver_number,
             'userKey': obj_id,
         }
-        response = requests.post(settings.KAKAO_SEND_URL, headers=self.headers, params=payload)
-        result = json.loads(response.text)
-        if 'sendCode' in result:
-            result.pop('sendCode')
-        return result
+        return self.client.post(settings.KAKAO_SEND_URL, payload)
 
     def check(self, obj_id):
         """알림톡 전송결과 확인"""
         payload = {
             'sendCode': obj_id
         }
-        response = requests.get(settings.SMS_RESULT_URL, headers=self.headers, params=payload)
-        result = json.loads(response.text)
-        if 'sendCode' in result:
-            result.pop('sendCode')
-        return result
+        return self.client.get(settings.SMS_RESULT_URL, payload)
+
+
+class UnreadNotificationCounter(metaclass=SingletonOptimizedMeta):
+    """
+    회원별 읽지 않은 알림 수 캐쉬
+
+    알림 발송요청시 증가, 읽음 처리시 감소하고, 캐쉬가 없으면 get_by_usercode 기준으로 다시 계산한다.
+    30일이 지난 알림이 빠지는 것은 reconcile_unread_counts 커맨드에서 주기적으로 맞춘다.
+    """
+    prefix = 'unread_notifications'
+    timeout = 60 * 60 * 24
+    days = 30
+
+    def get_key(self, user_id):
+        return '%s:%s' % (self.prefix, user_id)
+
+    def count(self, user):
+        Notification = apps.get_model('notification', 'Notification')
+        return Notification.objects.get_by_usercode(user.code, days=self.days, exclude_read=True).count()
+
+    def is_counted(self, notification):
+        """읽지 않은 알림 수에 포함되는 알림 : 발송요청된 지 days 일 이내의 푸쉬"""
+        return bool(
+            notification.send_method == 'push' and notification.requested_datetime
+            and notification.requested_datetime >= timezone.now() - timezone.timedelta(days=self.days)
+        )
+
+    def get(self, user):
+        value = cache.get(self.get_key(user.id))
+        if value is None:
+            value = self.reset(user)
+        return value
+
+    def set(self, user_id, value):
+        cache.set(self.get_key(user_id), value, self.timeout)
+
+    def reset(self, user):
+        value = self.count(user)
+        self.set(user.id, value)
+        return value
+
+    def incr(self, user_id, delta=1):
+        """캐쉬가 없으면 다음 조회시 새로 계산하므로 무시"""
+        try:
+            value = cache.incr(self.get_key(user_id), delta)
+        except ValueError:
+            return None
+        if value < 0:
+            cache.delete(self.get_key(user_id))
+            return None
+        return value
+
+    def decr(self, user_id, delta=1):
+        return self.incr(user_id, -delta)
+
+
+class PushDeliveryTimer:
+    """
+    푸쉬 발송 1회의 시간 측정 : 토큰 조회 시간, slice 별 FCM 응답시간, 발송 시작부터 성공 누적 95% 도달까지의 시간
+    """
+    reach_ratio = 0.95
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.token_seconds = 0.0
+        self.slices = []
+
+    def read_tokens(self, code_and_tokens, count):
+        started = time.monotonic()
+        sliced = list(islice(code_and_tokens, count))
+        self.token_seconds += time.monotonic() - started
+        return sliced
+
+    def add_slice(self, seconds, success_count):
+        """slice 발송 완료 : (FCM 응답시간, 발송 시작부터 완료까지 시간, 성공 수)"""
+        self.slices.append((seconds, time.monotonic() - self.started, success_count))
+
+    def get_metrics(self, response):
+        fcm_seconds = [s[0] for s in self.slices]
+        reach_seconds = None
+        target = response['request_count'] * self.reach_ratio
+        success = 0
+        for _, finished, success_count in sorted(self.slices, key=lambda s: s[1]):
+            success += success_count
+            if target and success >= target:
+                reach_seconds = finished
+                break
+        return {
+            'request_count': response['request_count'],
+            'success_count': response['success_count'],
+            'failure_count': response['failure_count'],
+            'unregistered_count': len(response['unregistered']) + len(response['sender_id_mismatch']),
+            'slice_count': len(self.slices),
+            'token_seconds': round(self.token_seconds, 3),
+            'fcm_seconds_avg': round(sum(fcm_seconds) / len(fcm_seconds), 3) if fcm_seconds else None,
+            'fcm_seconds_max': round(max(fcm_seconds), 3) if fcm_seconds else None,
+            'send_seconds': round(time.monotonic() - self.started, 3),
+            'reach_seconds': round(reach_seconds, 3) if reach_seconds is not None else None,
+        }
 
 
 class PushHandler(metaclass=SingletonOptimizedMeta):
@@ -133,72 +262,114 @@ class PushHandler(metaclass=SingletonOptimizedMeta):
     slice_count = 500
 
     def __init__(self, apns=None, android=None):
-        self.app = firebase.app
+        self.concurrency = getattr(settings, 'PUSH_MULTICAST_CONCURRENCY', 4)
         self.apns = apns or APNSConfig(headers={'apns-priority': '5'}, payload=APNSPayload(aps=Aps(sound='notification.caf')))
         self.android = android or AndroidConfig(notification=AndroidNotification(
             sound='notification', channel_id='notification', priority='high'
         ))
 
-    def send_by_obj(self, obj):
-        """알림 오브젝트를 통해 전송 ;; condition은 적용하지 않음"""
-        code_and_tokens = obj.code_and_tokens
-        if not code_and_tokens:
+    @property
+    def app(self):
+        return firebase.app
+
+    def send_by_obj(self, obj, heartbeat=None):
+        """
+        알림 오브젝트를 통해 전송 ;; condition은 적용하지 않음
+        heartbeat 가 있으면 slice 결과를 받을 때마다 호출 (발송 대기열 선점 연장)
+        """
+        notification = messaging.Notification(title=obj.subject, body=obj.content)
+        timer = PushDeliveryTimer()
+
+        # slice 별 결과를 요청 순서대로 합침
+        response = self._initialize_response()
+        sent = 0
+        for sliced_code_and_tokens, sliced_response in self._send_slices(
+                obj.iter_code_and_tokens(), notification, obj.data, timer):
+            response = self._add_response(response, **sliced_response)
+            sent += 1
+            if heartbeat:
+                heartbeat()
+        if not sent:
             logger.error('[PushHandler] 대상 유져가 없음')
             # raise ValueError('No target users.')
             return self._initialize_response()
 
-        # 중복제거 방어코드 추가
-        code_and_tokens = list(set(code_and_tokens))
-
-        notification = messaging.Notification(title=obj.subject, body=obj.content)
-        response = self._initialize_response(len(obj.code_and_tokens))
-        i = 0
-        while code_and_tokens[i: i + self.slice_count]:
-            sliced_code_and_tokens = code_and_tokens[i: i + self.slice_count]
-            sliced_tokens = [ct[1] for ct in sliced_code_and_tokens]
-            message = messaging.MulticastMessage(
-                tokens=sliced_tokens,
-                notification=notification,
-                apns=self.apns,
-                android=self.android,
-                data=obj.data
-            )
-            try:
-                result = messaging.send_multicast(message, app=self.app)
-            except:
-                logger.info('multiple push failed : ("%s", "%s", %s)' % (notification.title, notification.body, obj.data))
-            else:
-                result_ids = []
-                unregistered = []
-                sender_id_mismatch = []
-                for r, ct in zip(result.responses, sliced_code_and_tokens):
-                    if r.success:
-                        result_ids.append(ct[0])
-                    else:
-                        try:
-                            j = r.exception.http_response.json()
-                            result_ids.append(list(ct) + list([e['errorCode'] for e in j['error']['details']]))
-                        except:
-                            result_ids.append(None)
-                        else:
-                            if 'UNREGISTERED' in result_ids[-1]:
-                                unregistered.append(ct)
-                            if 'SENDER_ID_MISMATCH' in result_ids[-1]:
-                                sender_id_mismatch.append(ct)
-                response = self._add_response(
-                    response,
-                    failure_count=result.failure_count,
-                    success_count=result.success_count,
-                    data=result_ids,
-                    unregistered=unregistered,
-                    sender_id_mismatch=sender_id_mismatch
-                )
-            i += self.slice_count
-
         self.handle_unregistered([u[1] for u in response['unregistered']])
         self.handle_sender_id_mismatch([m[1] for m in response['sender_id_mismatch']])
+        response['metrics'] = timer.get_metrics(response)
+        return self._set_requested(response)
+
+    def send_many(self, objs):
+        """
+        제목/내용/데이터가 같은 회원별 알림 오브젝트들을 멀티캐스트로 한번에 전송하고 ({알림 id: 결과}, 발송 측정값) 반환
+        결과는 알림마다 send_by_obj 와 같은 형태이고, 같은 회원의 알림이 여럿이면 한번만 보내고 결과를 함께 사용
+        """
+        by_code = {}
+        for obj in objs:
+            by_code.setdefault(obj.receiver_user.code, []).append(obj)
+        responses = {code: self._initialize_response() for code in by_code}
+        code_and_tokens = User.objects.filter(id__in=[obj.receiver_user_id for obj in objs])\
+            .get_code_and_push_tokens(only_if_allowed=False, iterator=True)
+        notification = messaging.Notification(title=objs[0].subject, body=objs[0].content)
+        timer = PushDeliveryTimer()
+        total = self._initialize_response()
+
+        # 멀티캐스트 결과를 회원코드별로 나눔
+        for sliced_code_and_tokens, sliced_response in self._send_slices(code_and_tokens, notification, objs[0].data, timer):
+            self._add_response(total, **{k: v for k, v in sliced_response.items() if k != 'data'})
+            results = sliced_response.get('data')
+            for i, ct in enumerate(sliced_code_and_tokens):
+                response = responses[ct[0]]
+                response['request_count'] += 1
+                if results is None:
+                    continue
+                if type(results[i]) == str:
+                    response['success_count'] += 1
+                else:
+                    response['failure_count'] += 1
+                    for key in ('unregistered', 'sender_id_mismatch'):
+                        if ct in sliced_response[key]:
+                            response[key].append(ct)
+                response['data'].append(results[i])
+
+        self.handle_unregistered([u[1] for r in responses.values() for u in r['unregistered']])
+        self.handle_sender_id_mismatch([m[1] for r in responses.values() for m in r['sender_id_mismatch']])
+        results = {}
+        for code, response in responses.items():
+            response = self._set_requested(response)
+            results.update({obj.id: response for obj in by_code[code]})
+        return results, timer.get_metrics(total)
+
+    def _send_slices(self, code_and_tokens, notification, data, timer=None):
+        """
+        토큰을 slice_count 단위로 읽으면서 동시에 concurrency 개까지 발송하고 (slice, 결과) 를 요청 순서대로 yield
+        발송중인 slice 가 concurrency 개가 되면 가장 먼저 보낸 slice 의 결과를 기다린 뒤 다음 토큰을 읽음
+        """
+        timer = timer or PushDeliveryTimer()
+        futures = deque()
+        code_and_tokens = iter(code_and_tokens)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while True:
+                if len(futures) >= self.concurrency:
+                    sliced_code_and_tokens, future = futures.popleft()
+                    yield sliced_code_and_tokens, future.result()
+                sliced_code_and_tokens = timer.read_tokens(code_and_tokens, self.slice_count)
+                if not sliced_code_and_tokens:
+                    break
+                futures.append((sliced_code_and_tokens, executor.submit(
+                    self._send_timed_slice, timer, sliced_code_and_tokens, notification, data)))
+            while futures:
+                sliced_code_and_tokens, future = futures.popleft()
+                yield sliced_code_and_tokens, future.result()
+
+    def _send_timed_slice(self, timer, sliced_code_and_tokens, notification, data):
+        started = time.monotonic()
+        response = self._send_slice(sliced_code_and_tokens, notification, data)
+        timer.add_slice(time.monotonic() - started, response.get('success_count', 0))
+        return response
 
-        # 푸시 요청된 회원코드 저장
+    def _set_requested(self, response):
+        """푸시 요청된 회원코드 저장"""
         data = response.pop('data')
         response['data'] = []
         codes = []
@@ -210,6 +381,48 @@ class PushHandler(metaclass=SingletonOptimizedMeta):
         response['requested'] = list(set(codes))
         return response
 
+    def _send_slice(self, sliced_code_and_tokens, notification, data):
+        """최대 slice_count 개의 토큰에 멀티캐스트 발송하고 _add_response 인자 형태로 결과 반환"""
+        response = {'request_count': len(sliced_code_and_tokens)}
+        message = messaging.MulticastMessage(
+            tokens=[ct[1] for ct in sliced_code_and_tokens],
+            notification=notification,
+            apns=self.apns,
+            android=self.android,
+            data=data
+        )
+        try:
+            result = messaging.send_multicast(message, app=self.app)
+        except:
+            logger.info('multiple push failed : ("%s", "%s", %s)' % (notification.title, notification.body, data))
+            return response
+
+        result_ids = []
+        unregistered = []
+        sender_id_mismatch = []
+        for r, ct in zip(result.responses, sliced_code_and_tokens):
+            if r.success:
+                result_ids.append(ct[0])
+            else:
+                try:
+                    j = r.exception.http_response.json()
+                    result_ids.append(list(ct) + list([e['errorCode'] for e in j['error']['details']]))
+                except:
+                    result_ids.append(None)
+                else:
+                    if 'UNREGISTERED' in result_ids[-1]:
+                        unregistered.append(ct)
+                    if 'SENDER_ID_MISMATCH' in result_ids[-1]:
+                        sender_id_mismatch.append(ct)
+        response.update(
+            failure_count=result.failure_count,
+            success_count=result.success_count,
+            data=result_ids,
+            unregistered=unregistered,
+            sender_id_mismatch=sender_id_mismatch
+        )
+        return response
+
     def no_send_by_obj(self, obj):
         if not obj.target_users and not obj.code_and_tokens:
             logger.error('[PushHandler] 대상 유져가 없음')
@@ -308,14 +521,14 @@ class PushHandler(metaclass=SingletonOptimizedMeta):
         return response
 
     def handle_unregistered(self, unregistered):
-        for device in LoggedInDevice.objects.get_by_tokens(unregistered):
-            device.logout()
-            logger.warning('%s <%s> 로그아웃 처리 (푸시 시도했으나, 등록 토큰 유효하지 않음)' % (str(device.user), str(device)))
+        if unregistered:
+            count = LoggedInDevice.objects.logout_by_tokens(unregistered)
+            logger.warning('기기 %s개 로그아웃 처리 (푸시 시도했으나, 등록 토큰 %s개 유효하지 않음)' % (count, len(unregistered)))
 
     def handle_sender_id_mismatch(self, sender_id_mismatch):
-        for device in LoggedInDevice.objects.get_by_tokens(sender_id_mismatch):
-            device.logout()
-            logger.warning('%s <%s> 로그아웃 처리 (푸시 시도했으나, 등록 토큰 발신자와 매치되지 않음)' % (str(device.user), str(device)))
+        if sender_id_mismatch:
+            count = LoggedInDevice.objects.logout_by_tokens(sender_id_mismatch)
+            logger.warning('기기 %s개 로그아웃 처리 (푸시 시도했으나, 등록 토큰 %s개 발신자와 매치되지 않음)' % (count, len(sender_id_mismatch)))
 
     def _send_condition(self, condition, notification, data):
         message = messaging.Message(
@@ -408,7 +621,10 @@ class FirebaseHandler:
 
     def __init__(self):
         self.firebase = firebase
-        self.db = firestore.client(self.firebase.app)
+
+    @cached_property
+    def db(self):
+        return firestore.client(self.firebase.app)
 
     def get_document(self, id):
         return self.ref.document(str(id))
@@ -435,9 +651,9 @@ class FirebaseFirestoreChatHandler(FirebaseHandler):
     """
     users = {}
 
-    def __init__(self):
-        super(FirebaseFirestoreChatHandler, self).__init__()
-        self.ref = self.db.collection('anytalk_room')
+    @cached_property
+    def ref(self):
+        return self.db.collection('anytalk_room')
 
     def get(self, bid_id):
         document = self.get_document(bid_id)
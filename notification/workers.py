@@ -0,0 +1,190 @@
+import json
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from common.utils import SingletonOptimizedMeta
+from .models import Notification
+
+
+logger = getLogger('queued')
+
+
+"""
+푸쉬 발송 워커
+
+Django와 Firebase 앱을 한번만 로드한 상태로 상주하면서
+발송 대기열(Notification.next_attempt_datetime)에서 알림을 선점해 동시 발송 스레드로 처리한다.
+선점은 SELECT ... FOR UPDATE SKIP LOCKED 로 하므로 여러 워커를 동시에 띄워도 같은 알림을 중복 발송하지 않는다.
+
+깨우기 : QueueRegisterer().wake(id)  ->  'PUSH:<id>' (없어도 poll_interval 마다 대기열 확인)
+상태 확인 : 'STATS' 를 보내면 대기열 수, 발송 지연시간을 json 으로 응답
+"""
+
+
+class PushWorkerStats:
+    """
+    발송 워커 통계 : 처리 건수, 큐 대기부터 발송완료까지 지연시간, 발송 소요시간
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.duration_total = 0.0
+
+    def add(self, latency, duration, success=True):
+        with self.lock:
+            if success:
+                self.sent += 1
+            else:
+                self.failed += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+            self.duration_total += duration
+
+    def pop(self):
+        """현재까지의 통계를 반환하고 초기화"""
+        with self.lock:
+            count = self.sent + self.failed
+            data = {
+                'sent': self.sent,
+                'failed': self.failed,
+                'latency_avg': round(self.latency_total / count, 3) if count else 0,
+                'latency_max': round(self.latency_max, 3),
+                'duration_avg': round(self.duration_total / count, 3) if count else 0,
+            }
+            self.__init__()
+        return data
+
+
+class PushQueueHandler(socketserver.BaseRequestHandler):
+    """
+    'PUSH:<id>' 는 워커 깨우기, 'STATS' 는 통계 응답
+    """
+    def handle(self):
+        try:
+            data = self.request.recv(1024).decode().strip()
+        except (OSError, UnicodeDecodeError):
+            return
+        worker = self.server.worker
+        if data == 'STATS':
+            self.request.sendall(json.dumps(worker.get_stats()).encode())
+        elif 'PUSH:' in data:
+            worker.wake()
+
+
+class PushWorker(metaclass=SingletonOptimizedMeta):
+    """
+    푸쉬 발송 워커 : 대기열에서 batch_size 만큼 선점해서 concurrency 개의 스레드로 발송
+    """
+    def __init__(self, batch_size=None, concurrency=None, poll_interval=None, stats_interval=None):
+        self.batch_size = batch_size or getattr(settings, 'PUSH_WORKER_BATCH_SIZE', 50)
+        self.concurrency = concurrency or getattr(settings, 'PUSH_WORKER_CONCURRENCY', 8)
+        self.poll_interval = poll_interval or getattr(settings, 'PUSH_WORKER_POLL_INTERVAL', 5)
+        self.stats_interval = stats_interval or getattr(settings, 'PUSH_WORKER_STATS_INTERVAL', 60)
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        self.slots = threading.BoundedSemaphore(self.concurrency)
+        self.stats = PushWorkerStats()
+        self.last_stats = {}
+        self.woken = threading.Event()
+        self.running = threading.Event()
+
+    def wake(self):
+        self.woken.set()
+
+    def send(self, obj):
+        started = time.monotonic()
+        try:
+            success = obj.send_from_outbox()
+        except Exception as e:
+            success = False
+            logger.error('[push worker] %s send failed : %s' % (obj.id, e))
+        finally:
+            connection.close()
+            self.slots.release()
+        latency = (timezone.now() - obj.created_datetime).total_seconds()
+        self.stats.add(latency, time.monotonic() - started, success)
+
+    def process(self):
+        """발송 가능한 스레드 수만큼만 선점해서 발송, 선점한 건수 반환"""
+        count = 0
+        while count < self.batch_size and self.slots.acquire(blocking=False):
+            count += 1
+        if not count:
+            return None
+        notifications = []
+        try:
+            notifications = list(Notification.objects.filter(id__in=Notification.objects.claim(limit=count)))
+            for obj in notifications:
+                self.executor.submit(self.send, obj)
+        finally:
+            for _ in range(count - len(notifications)):
+                self.slots.release()
+        return len(notifications)
+
+    def run_dispatcher(self):
+        while self.running.is_set():
+            try:
+                claimed = self.process()
+            except Exception as e:
+                claimed = 0
+                logger.error('[push worker] claim failed : %s' % e)
+            finally:
+                connection.close()
+            if claimed is None:
+                # 발송중인 스레드가 모두 사용중
+                time.sleep(0.1)
+            elif not claimed:
+                self.woken.wait(self.poll_interval)
+                self.woken.clear()
+
+    def run_stats(self):
+        while self.running.is_set():
+            time.sleep(self.stats_interval)
+            self.last_stats = self.stats.pop()
+            logger.info('[push worker] %s' % json.dumps(self.get_stats()))
+
+    def get_stats(self):
+        stats = {'concurrency': self.concurrency}
+        try:
+            stats['depth'] = Notification.objects.outbox().filter(next_attempt_datetime__lte=timezone.now()).count()
+        finally:
+            connection.close()
+        stats.update(self.last_stats)
+        return stats
+
+    def start(self):
+        self.running.set()
+        threading.Thread(target=self.run_dispatcher, daemon=True).start()
+        threading.Thread(target=self.run_stats, daemon=True).start()
+        return self
+
+    def run_forever(self):
+        """깨우기 없이 대기열만 확인하는 추가 워커"""
+        self.start()
+        try:
+            while True:
+                time.sleep(self.stats_interval)
+        finally:
+            self.running.clear()
+
+    def serve(self, host='', port=None):
+        """깨우기/상태 확인용 tcp 서버 실행"""
+        self.start()
+        server = socketserver.ThreadingTCPServer((host, port or settings.PUSH_QUEUE_PORT), PushQueueHandler)
+        server.daemon_threads = True
+        server.worker = self
+        logger.info('[push worker] listening %s port' % server.server_address[1])
+        try:
+            server.serve_forever()
+        finally:
+            self.running.clear()
+            server.server_close()
@@ -15,7 +15,8 @@ from common.utils import RSACrypt, add_comma
 from base.admin import BaseAdmin
 from accounts.admin import UserCodeSearchMixin
 from .models import (
-    Billing, Payment, Cash, Point, Withdraw, PointVoucherTemplate, PointVoucher, Reward, CouponTemplate, Coupon
+    Billing, Payment, PaymentAttempt, Cash, Point, Withdraw, PointVoucherTemplate, PointVoucher, Reward, CouponTemplate,
+    Coupon
 )
 from .filters import (
     PointDetailTypeFilter, CashDetailTypeFilter, WithdrawStateFilter, PointNullFilter, ActiveRewardFilter
@@ -501,6 +502,46 @@ class PaymentAdmin(PaymentAdditionalAdmin, UserCodeSearchMixin, BaseAdmin):
     get_summary_display.short_description = '결제내용'
 
 
+@admin.register(PaymentAttempt)
+class PaymentAttemptAdmin(BaseAdmin):
+    """
+    결제대행사 요청 기록 어드민
+    """
+    list_display = ('payment', 'operation', 'idempotency_key', 'status_code', 'is_succeeded', 'is_pending', 'error',
+                    'duration', 'created_datetime')
+    list_display_links = None
+    list_filter = ('operation', 'is_succeeded', 'is_pending')
+    search_fields = ('payment__bid__mission__code', 'idempotency_key')
+    raw_id_fields = ('payment',)
+    actions = ('action_resolve_succeeded', 'action_resolve_failed')
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_resolve_permission(self, request):
+        return request.user.is_superuser
+
+    def action_resolve_succeeded(self, request, queryset):
+        for attempt in queryset.get_pending():
+            attempt.resolve(True)
+            log_with_reason(request.user, attempt, 'changed', {'결과 미확인': '결제대행사 확인 결과 성공'})
+    action_resolve_succeeded.short_description = '결과 미확인 요청을 성공으로 처리 (결제대행사에서 처리된 경우)'
+    action_resolve_succeeded.allowed_permissions = ('resolve',)
+
+    def action_resolve_failed(self, request, queryset):
+        for attempt in queryset.get_pending():
+            attempt.resolve(False)
+            log_with_reason(request.user, attempt, 'changed', {'결과 미확인': '결제대행사 확인 결과 실패'})
+    action_resolve_failed.short_description = '결과 미확인 요청을 실패로 처리 (다시 요청 가능)'
+    action_resolve_failed.allowed_permissions = ('resolve',)
+
+
 class RewardAdminForm(forms.ModelForm):
     """
     리워드 어드민 폼
@@ -0,0 +1,109 @@
+import copy
+import threading
+import uuid
+
+import requests
+
+from django.conf import settings
+from django.utils import timezone
+
+
+"""
+로컬/테스트용 가짜 결제대행사 (settings.PAYMENT_GATEWAY_TRANSPORT = 'fake')
+
+사용법 :
+    gateway = PaymentGateway().session
+    gateway.set_timeout(settings.PAYMENT_REFUND_URL)  # 다음 요청은 처리한 뒤 응답 대신 타임아웃
+    gateway.set_response(url, 200, {'resultCode': '01', 'resultMsg': '취소 실패'})
+    ...
+    gateway.requests  # [(url, data, headers)]
+    gateway.processed  # {멱등키: (status_code, 응답)}
+    gateway.duplicated  # 같은 멱등키로 다시 들어와 처음 응답을 그대로 돌려준 횟수
+"""
+
+
+class FakeGatewayResponse:
+    """
+    가짜 결제대행사 응답
+    """
+    def __init__(self, status_code=200, json_data=None):
+        self.status_code = status_code
+        # 호출하는 쪽에서 응답 데이터를 pop 하므로 매번 복사본을 돌려줌
+        self._json = copy.deepcopy(json_data if json_data is not None else {})
+
+    def json(self):
+        return self._json
+
+
+class FakeGateway:
+    """
+    가짜 결제대행사 : 외부 호출 없이 요청을 기록하고, 같은 멱등키의 요청에는 처음 응답을 다시 돌려줌
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = []
+        self.responses = {}
+        self.timeouts = {}
+        self.processed = {}
+        self.duplicated = 0
+
+    def set_response(self, url, status_code=200, json_data=None):
+        """url 로 들어오는 요청에 돌려줄 응답"""
+        self.responses[url] = (status_code, json_data)
+
+    def set_timeout(self, url, count=1, processed=True):
+        """
+        url 로 들어오는 다음 count 건의 요청은 타임아웃
+        processed 이면 처리는 된 상태(응답만 유실)로, 같은 멱등키로 다시 요청하면 처리된 응답을 돌려줌
+        """
+        self.timeouts[url] = (count, processed)
+
+    def get_default_response(self, url, data):
+        now = timezone.now()
+        if url == getattr(settings, 'PAYMENT_REFUND_URL', ''):
+            # 이니시스 환불
+            return 200, {
+                'resultCode': '00',
+                'resultMsg': '정상처리되었습니다.',
+                'cancelDate': now.strftime('%Y%m%d'),
+                'cancelTime': now.strftime('%H%M%S'),
+            }
+        # 스마트로(SPC) 결제/빌링
+        return 200, {
+            'resultCode': '200',
+            'resultMessage': '정상처리',
+            'developerMessage': '',
+            'data': {
+                'aid': uuid.uuid4().hex,
+                'nextMobileUrl': url,
+                'nextAppUrl': url,
+                'refNo': uuid.uuid4().hex[:20],
+                'applNo': now.strftime('%H%M%S%f')[:8],
+                'tranDate': now.strftime('%y%m%d'),
+                'tranTime': now.strftime('%H%M%S'),
+                'billkey': uuid.uuid4().hex,
+                'cardCompanyNo': '01',
+                'cardName': '테스트카드',
+                'cardNo': '1234********5678',
+                'custommerName': data.get('customerName', '') if data else '',
+                'custommerTelNo': data.get('customerTelNo', '') if data else '',
+            },
+        }
+
+    def post(self, url, data=None, headers=None, timeout=None):
+        key = (headers or {}).get('Idempotency-Key', '')
+        with self.lock:
+            self.requests.append((url, data, headers))
+            count, processed = self.timeouts.get(url, (0, False))
+            if count:
+                self.timeouts[url] = (count - 1, processed)
+            if key and key in self.processed:
+                self.duplicated += 1
+                status_code, json_data = self.processed[key]
+            else:
+                status_code, json_data = self.responses.get(url) or self.get_default_response(url, data)
+                if key and (not count or processed):
+                    self.processed[key] = (status_code, json_data)
+        if count:
+            raise requests.ReadTimeout('fake gateway timeout : %s' % url)
+        return FakeGatewayResponse(status_code, json_data)
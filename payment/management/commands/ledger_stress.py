@@ -0,0 +1,68 @@
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from payment.models import Point, Cash
+
+
+class Command(BaseCommand):
+    """
+    잔액 동시성 검증 커맨드 : 한 owner 에게 여러 스레드가 동시에 내역을 쓰고 잔액이 금액 누적합과 같은지 확인
+    스레드마다 같은 금액을 더하고 빼므로 최종 잔액은 시작 잔액과 같아야 함 (개발 서버 전용)
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('owner_id', type=int, help='회원 ID (포인트) 또는 헬퍼 ID (캐쉬)')
+        parser.add_argument('--ledger', dest='ledger', choices=('point', 'cash'), default='point')
+        parser.add_argument('--threads', type=int, dest='threads', default=20)
+        parser.add_argument('--entries', type=int, dest='entries', default=20, help='스레드당 내역 수 (짝수)')
+        parser.add_argument('--bulk', action='store_true', dest='bulk', help='bulk_create_with_balance 로 저장')
+        parser.add_argument('--force', action='store_true', dest='force', help='DEBUG 가 아닌 서버에서도 실행')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError('실제 내역을 쓰므로 DEBUG 서버에서만 실행합니다. (--force)')
+        model = Point if options['ledger'] == 'point' else Cash
+        owner_field = model.BALANCE_OWNER_FIELD + '_id'
+        owner = {owner_field: options['owner_id']}
+        last_id = model.objects.filter(**owner).order_by('id').values_list('id', flat=True).last() or 0
+        started_balance = model.objects.filter(**owner).get_balance()
+        errors = []
+
+        def hammer(number):
+            try:
+                amounts = [number + 1, -(number + 1)] * (options['entries'] // 2)
+                memo = 'ledger_stress %s' % number
+                if options['bulk']:
+                    model.objects.bulk_create_with_balance([model(amount=a, memo=memo, **owner) for a in amounts])
+                else:
+                    for amount in amounts:
+                        model.objects.create(amount=amount, memo=memo, **owner)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=hammer, args=(i,)) for i in range(options['threads'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        balance = started_balance
+        drifted = 0
+        created = model.objects.filter(**owner).filter(id__gt=last_id).order_by('id').values_list('amount', 'balance')
+        for amount, saved_balance in created:
+            balance += amount
+            if balance != saved_balance:
+                drifted += 1
+        final_balance = model.objects.filter(**owner).get_balance()
+        print('내역 %s건, 잔액 불일치 %s건, 시작 잔액 %s, 최종 잔액 %s, 오류 %s건' % (
+            len(created), drifted, started_balance, final_balance, len(errors)))
+        for e in errors[:5]:
+            print(e)
+        if drifted or final_balance != started_balance or errors:
+            raise CommandError('잔액 검증 실패')
+        self.stdout.write(self.style.SUCCESS('OK'))
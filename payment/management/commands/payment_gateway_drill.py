@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from payment.models import Payment
+from payment.utils import PaymentGateway
+
+
+class Command(BaseCommand):
+    """
+    결제취소 점검 커맨드 : 가짜 결제대행사로 결제 취소를 실행해 보고 요청 기록을 출력한 뒤 롤백
+    --timeout 이면 첫 취소 요청은 처리 후 타임아웃되어 결과 미확인으로 남고, 다시 취소해도 결제대행사로 보내지 않는지 확인
+    (요청 기록은 별도 연결로 커밋되므로 마지막에 따로 지움)
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('payment_id', type=int, help='결제 ID')
+        parser.add_argument('--timeout', action='store_true', dest='timeout', help='첫 취소 요청을 타임아웃으로 처리')
+        parser.add_argument('--fail', action='store_true', dest='fail', help='결제대행사가 취소 실패로 응답')
+
+    def handle(self, *args, **options):
+        if getattr(settings, 'PAYMENT_GATEWAY_TRANSPORT', 'requests') != 'fake':
+            raise CommandError('실제 결제대행사로 요청하지 않도록 PAYMENT_GATEWAY_TRANSPORT = \'fake\' 에서만 실행합니다.')
+        gateway = PaymentGateway().session
+        try:
+            payment = Payment.objects.get(id=options['payment_id'])
+        except Payment.DoesNotExist:
+            raise CommandError('결제가 없습니다.')
+        if payment.pay_method == 'Card':
+            url = settings.PAYMENT_REFUND_URL
+        elif payment.billing_id:
+            url = settings.SPC_BILLING_API_URL + '/v1/api/payments/payment/card/cancel'
+        else:
+            url = settings.SPC_BILLING_API_URL + '/v1/api/payments/payment/cancel'
+
+        with transaction.atomic():
+            last_attempt_id = payment.attempts.order_by('id').values_list('id', flat=True).last() or 0
+            if options['fail']:
+                gateway.set_response(url, 200, {'resultCode': '01', 'resultMsg': '취소 실패', 'resultMessage': '취소 실패'})
+            if options['timeout']:
+                gateway.set_timeout(url)
+                self.stdout.write('1차 취소 (타임아웃) : %s' % payment.cancel())
+                self.stdout.write('재시도 (결과 미확인, 요청하지 않아야 함) : %s' % payment.cancel())
+            else:
+                self.stdout.write('취소 : %s' % payment.cancel())
+            self.stdout.write('재취소 : %s' % payment.cancel())
+
+            self.stdout.write('%-10s %-45s %5s %-6s %-6s %s' % ('요청', '멱등키', '응답', '성공', '미확인', '오류/응답'))
+            for attempt in payment.attempts.filter(id__gt=last_attempt_id).order_by('id'):
+                self.stdout.write('%-10s %-45s %5s %-6s %-6s %s' % (
+                    attempt.operation, attempt.idempotency_key, attempt.status_code, attempt.is_succeeded,
+                    attempt.is_pending, attempt.error or attempt.result
+                ))
+            self.stdout.write('결제대행사 요청 %s건, 중복 요청 %s건' % (len(gateway.requests), gateway.duplicated))
+            transaction.set_rollback(True)
+        payment.attempts.filter(id__gt=last_attempt_id).delete()
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import Helper
+from payment.models import HelperEarnings
+
+
+class Command(BaseCommand):
+    """
+    헬퍼 수익 스냅샷 보정 커맨드 : 캐쉬 내역/인출요청으로 다시 계산해서 맞춤
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', dest='check', help='보정하지 않고 다른 헬퍼만 출력')
+        parser.add_argument('--batch-size', type=int, dest='batch_size', default=500)
+
+    def handle(self, *args, **options):
+        helper_ids = list(Helper.objects.filter(cashes__isnull=False).values_list('id', flat=True).distinct())
+        batch_size = options['batch_size']
+        changed = []
+        for i in range(0, len(helper_ids), batch_size):
+            batch = helper_ids[i:i + batch_size]
+            if options['check']:
+                changed += self.check(batch)
+            else:
+                changed += HelperEarnings.objects.recompute(batch)
+        print('checked %s helpers, drifted %s' % (len(helper_ids), len(changed)))
+
+    def check(self, helper_ids):
+        values = HelperEarnings.objects.calculate(helper_ids)
+        existing = {obj.helper_id: obj for obj in HelperEarnings.objects.filter(helper_id__in=helper_ids)}
+        drifted = []
+        for helper_id, fields in values.items():
+            obj = existing.get(helper_id)
+            diff = {k: (getattr(obj, k), v) for k, v in fields.items() if obj and getattr(obj, k) != v}
+            if obj is None or diff:
+                drifted.append(helper_id)
+                print('helper %s : %s' % (helper_id, diff or 'no snapshot'))
+        return drifted
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Sum, Window
+
+from payment.models import Point, Cash, BalanceSnapshot
+
+
+class Command(BaseCommand):
+    """
+    포인트/캐쉬 잔액 검증 커맨드 : 금액 누적합으로 잔액을 다시 계산해서 내역/스냅샷과 다른 owner 출력
+    """
+    ledger_models = (Point, Cash)
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ledger', dest='ledger', choices=('point', 'cash'), default=None, help='검증할 내역 종류')
+        parser.add_argument('--fix-snapshots', action='store_true', dest='fix_snapshots',
+                            help='스냅샷 잔액을 마지막 내역 잔액으로 맞춤')
+
+    def handle(self, *args, **options):
+        for model in self.ledger_models:
+            if options['ledger'] in (None, model.BALANCE_LEDGER):
+                self.verify(model, options['fix_snapshots'])
+
+    def verify(self, model, fix_snapshots=False):
+        owner_field = model.BALANCE_OWNER_FIELD + '_id'
+        rows = model.objects.annotate(running=Window(
+            expression=Sum('amount'), partition_by=[F(owner_field)], order_by=F('id').asc()
+        )).order_by(owner_field, 'id').values_list(owner_field, 'balance', 'running')
+
+        # owner 별 : [처음 어긋난 내역 수, 어긋난 내역 수, 마지막 잔액, 금액 합]
+        owners = {}
+        for owner_id, balance, running in rows.iterator():
+            owner = owners.setdefault(owner_id, [0, 0, 0, 0])
+            owner[0] += 1
+            if balance != running:
+                owner[1] += 1
+            owner[2], owner[3] = balance, running
+
+        snapshots = dict(BalanceSnapshot.objects.filter(ledger=model.BALANCE_LEDGER)
+                         .values_list('owner_id', 'balance'))
+        drifted = 0
+        for owner_id, (count, drift_count, balance, total) in owners.items():
+            snapshot = snapshots.get(owner_id)
+            if drift_count or balance != total or (snapshot is not None and snapshot != balance):
+                drifted += 1
+                print('[%s] %s : 내역 %s건 중 %s건 불일치, 마지막 잔액 %s, 금액 합 %s, 스냅샷 %s' % (
+                    model.BALANCE_LEDGER, owner_id, count, drift_count, balance, total, snapshot))
+        print('[%s] owner %s명 중 %s명 불일치' % (model.BALANCE_LEDGER, len(owners), drifted))
+
+        if fix_snapshots:
+            updated = 0
+            for snapshot in BalanceSnapshot.objects.filter(ledger=model.BALANCE_LEDGER, owner_id__in=owners):
+                balance = owners[snapshot.owner_id][2]
+                if snapshot.balance != balance:
+                    BalanceSnapshot.objects.filter(id=snapshot.id, balance=snapshot.balance).update(balance=balance)
+                    updated += 1
+            print('[%s] 스냅샷 %s건 수정' % (model.BALANCE_LEDGER, updated))
@@ -0,0 +1,38 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+SEED_SQL = """
+INSERT INTO payment_balancesnapshot (ledger, owner_id, balance, updated_datetime)
+SELECT DISTINCT ON (user_id) 'point', user_id, balance, now() FROM payment_point ORDER BY user_id, id DESC
+ON CONFLICT DO NOTHING;
+INSERT INTO payment_balancesnapshot (ledger, owner_id, balance, updated_datetime)
+SELECT DISTINCT ON (helper_id) 'cash', helper_id, balance, now() FROM payment_cash ORDER BY helper_id, id DESC
+ON CONFLICT DO NOTHING;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0032_point_added_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ledger', models.CharField(choices=[('point', '포인트'), ('cash', '캐쉬')], max_length=10, verbose_name='내역 종류')),
+                ('owner_id', models.PositiveIntegerField(verbose_name='회원/헬퍼 ID')),
+                ('balance', models.IntegerField(default=0, verbose_name='잔액')),
+                ('updated_datetime', models.DateTimeField(default=django.utils.timezone.now, verbose_name='수정일시')),
+            ],
+            options={
+                'verbose_name': '잔액 스냅샷',
+                'verbose_name_plural': '잔액 스냅샷',
+                'unique_together': {('ledger', 'owner_id')},
+            },
+        ),
+        migrations.RunSQL(SEED_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0065_loggedindevice_token_index'),
+        ('payment', '0033_balancesnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HelperEarnings',
+            fields=[
+                ('helper', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='earnings_snapshot', serialize=False, to='accounts.Helper', verbose_name='헬퍼')),
+                ('mission_fee_total', models.IntegerField(default=0, verbose_name='미션수행비 누적')),
+                ('etc_total', models.IntegerField(default=0, verbose_name='기타수익 누적')),
+                ('month', models.DateField(blank=True, null=True, verbose_name='집계월')),
+                ('month_mission_fee', models.IntegerField(default=0, verbose_name='이번달 미션수행비')),
+                ('month_etc', models.IntegerField(default=0, verbose_name='이번달 기타수익')),
+                ('withdraw_requested', models.IntegerField(default=0, verbose_name='인출요청 금액')),
+                ('updated_datetime', models.DateTimeField(default=django.utils.timezone.now, verbose_name='수정일시')),
+            ],
+            options={
+                'verbose_name': '헬퍼 수익 스냅샷',
+                'verbose_name_plural': '헬퍼 수익 스냅샷',
+            },
+        ),
+    ]
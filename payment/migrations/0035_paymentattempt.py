@@ -0,0 +1,38 @@
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0034_helperearnings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='idempotency_key',
+            field=models.CharField(blank=True, default='', help_text='결제대행사 요청시 작업명과 함께 보내 같은 작업이 두 번 처리되지 않도록 함', max_length=32, verbose_name='멱등키'),
+        ),
+        migrations.CreateModel(
+            name='PaymentAttempt',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('operation', models.CharField(choices=[('ready', '결제준비'), ('auth', '결제승인'), ('net_cancel', '망취소'), ('pay', '빌링결제'), ('cancel', '결제취소'), ('register', '빌링등록'), ('unregister', '빌링해지')], max_length=20, verbose_name='요청 종류')),
+                ('idempotency_key', models.CharField(blank=True, db_index=True, default='', max_length=50, verbose_name='멱등키')),
+                ('url', models.CharField(max_length=250, verbose_name='요청 url')),
+                ('status_code', models.PositiveSmallIntegerField(default=0, help_text='0 : 타임아웃/연결 오류로 응답 없음', verbose_name='응답코드')),
+                ('result', django.contrib.postgres.fields.jsonb.JSONField(default=dict, verbose_name='응답')),
+                ('error', models.CharField(blank=True, default='', max_length=250, verbose_name='오류')),
+                ('duration', models.FloatField(default=0, verbose_name='소요시간(초)')),
+                ('is_succeeded', models.BooleanField(default=False, verbose_name='성공여부')),
+                ('created_datetime', models.DateTimeField(auto_now_add=True, verbose_name='요청일시')),
+                ('payment', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='attempts', to='payment.Payment', verbose_name='결제')),
+            ],
+            options={
+                'verbose_name': '결제대행사 요청 기록',
+                'verbose_name_plural': '결제대행사 요청 기록',
+            },
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0035_paymentattempt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentattempt',
+            name='is_pending',
+            field=models.BooleanField(default=False, help_text='요청 후 응답을 받지 못해 결제대행사에서 처리 여부를 확인해야 하는 경우', verbose_name='결과 미확인'),
+        ),
+    ]
@@ -1,16 +1,16 @@
 import hashlib
 import logging
+import uuid
 
-import requests
-
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, Least
 from django.conf import settings
 from django.utils import timezone
 from django.utils.formats import localize
 from django.contrib.postgres.fields import ArrayField, JSONField
 from django.forms import ValidationError
 
-from .utils import PaymentAPI, BillingAPI
+from .utils import PaymentAPI, BillingAPI, PaymentGateway
 from common.utils import add_comma
 from accounts.models import Helper, BankAccount
 from missions.models import Bid
@@ -34,6 +34,152 @@ class OptionalBalanceQuerySet(models.QuerySet):
             return last.balance
         return 0
 
+    def get_last_balances(self, owner_ids):
+        """{owner id: 마지막 내역의 잔액}"""
+        owner_field = self.model.BALANCE_OWNER_FIELD + '_id'
+        return dict(self.filter(**{owner_field + '__in': owner_ids})
+                    .order_by(owner_field, '-id').distinct(owner_field).values_list(owner_field, 'balance'))
+
+    def bulk_create_with_balance(self, objs):
+        """여러 내역을 한 트랜잭션에서 잔액을 매겨서 한번에 저장"""
+        owner_field = self.model.BALANCE_OWNER_FIELD + '_id'
+        with transaction.atomic():
+            snapshots = BalanceSnapshot.objects.lock(self.model, [getattr(obj, owner_field) for obj in objs])
+            for obj in objs:
+                snapshot = snapshots[getattr(obj, owner_field)]
+                snapshot.balance += obj.amount
+                obj.balance = snapshot.balance
+            objs = self.bulk_create(objs)
+            BalanceSnapshot.objects.bulk_update(snapshots.values(), ['balance', 'updated_datetime'])
+            self.model.balance_entries_created(objs)
+        return objs
+
+
+class BalanceSnapshotQuerySet(models.QuerySet):
+    """
+    잔액 스냅샷 쿼리셋
+    """
+    def lock(self, ledger_model, owner_ids):
+        """
+        owner 별 잔액 스냅샷을 owner id 순서로 잠그고 {owner id: 스냅샷} 반환 (트랜잭션 안에서 호출)
+        스냅샷이 없으면 내역의 마지막 잔액으로 만듦
+        """
+        ledger = ledger_model.BALANCE_LEDGER
+        owner_ids = sorted(set(owner_ids))
+        qs = self.select_for_update().filter(ledger=ledger).order_by('owner_id')
+        snapshots = {s.owner_id: s for s in qs.filter(owner_id__in=owner_ids)}
+        missing = [owner_id for owner_id in owner_ids if owner_id not in snapshots]
+        if missing:
+            balances = ledger_model.objects.get_last_balances(missing)
+            self.bulk_create([
+                self.model(ledger=ledger, owner_id=owner_id, balance=balances.get(owner_id, 0))
+                for owner_id in missing
+            ], ignore_conflicts=True)
+            snapshots.update({s.owner_id: s for s in qs.filter(owner_id__in=missing)})
+        now = timezone.now()
+        for snapshot in snapshots.values():
+            snapshot.updated_datetime = now
+        return snapshots
+
+    def get_balance(self, ledger_model, owner_id):
+        """owner 의 잔액 : 스냅샷이 없으면 내역의 마지막 잔액"""
+        balance = self.filter(ledger=ledger_model.BALANCE_LEDGER, owner_id=owner_id)\
+            .values_list('balance', flat=True).first()
+        if balance is None:
+            balance = ledger_model.objects.get_last_balances([owner_id]).get(owner_id, 0)
+        return balance
+
+
+class HelperEarningsQuerySet(models.QuerySet):
+    """
+    헬퍼 수익 스냅샷 쿼리셋
+    """
+    def get_for_helper(self, helper_id):
+        try:
+            return self.get(helper_id=helper_id)
+        except self.model.DoesNotExist:
+            self.recompute([helper_id])
+            return self.get(helper_id=helper_id)
+
+    def add_cashes(self, cashes):
+        """
+        새 캐쉬 내역 반영 : 스냅샷이 없는 헬퍼는 새 내역을 뺀 기존 내역으로 먼저 만든 뒤 새 내역을 더함
+        (새 미션수행비는 아직 입찰에 연결되기 전이라 내역 전체로 계산하면 기타수익으로 분류되므로 is_mission_fee 로 분류)
+        """
+        month = timezone.localdate().replace(day=1)
+        deltas = {}
+        for cash in cashes:
+            delta = deltas.setdefault(cash.helper_id, {'mission_fee': 0, 'etc': 0})
+            if cash.amount >= 0:
+                delta['mission_fee' if cash.is_mission_fee else 'etc'] += cash.amount
+        existing = set(self.filter(helper_id__in=deltas.keys()).values_list('helper_id', flat=True))
+        missing = [helper_id for helper_id in deltas if helper_id not in existing]
+        if missing:
+            self.recompute(missing, exclude_cash_ids=[cash.id for cash in cashes])
+        for helper_id, delta in deltas.items():
+            self.filter(helper_id=helper_id).update(
+                mission_fee_total=models.F('mission_fee_total') + delta['mission_fee'],
+                etc_total=models.F('etc_total') + delta['etc'],
+                month_mission_fee=models.Case(
+                    models.When(month=month, then=models.F('month_mission_fee') + delta['mission_fee']),
+                    default=models.Value(delta['mission_fee'])),
+                month_etc=models.Case(
+                    models.When(month=month, then=models.F('month_etc') + delta['etc']),
+                    default=models.Value(delta['etc'])),
+                month=month,
+                updated_datetime=timezone.now(),
+            )
+
+    def refresh_withdraw_requested(self, helper_id):
+        requested = Withdraw.objects.filter(helper_id=helper_id).requested_amount()
+        if not self.filter(helper_id=helper_id).update(withdraw_requested=requested, updated_datetime=timezone.now()):
+            self.recompute([helper_id])
+
+    def calculate(self, helper_ids, exclude_cash_ids=()):
+        """내역 전체(exclude_cash_ids 제외)로 계산한 {헬퍼 id: 스냅샷 필드값}"""
+        month = timezone.localdate().replace(day=1)
+        mission_fee = models.Q(bid__isnull=False)
+        etc = models.Q(bid__isnull=True, withdraw__isnull=True, amount__gte=0)
+        this_month = models.Q(created_datetime__date__gte=month)
+        values = {helper_id: {
+            'mission_fee_total': 0, 'etc_total': 0, 'month': month,
+            'month_mission_fee': 0, 'month_etc': 0, 'withdraw_requested': 0,
+        } for helper_id in helper_ids}
+        cashes = Cash.objects.filter(helper_id__in=helper_ids).exclude(id__in=exclude_cash_ids)
+        rows = cashes.values('helper_id').annotate(
+            mission_fee_total=models.Sum('amount', filter=mission_fee),
+            etc_total=models.Sum('amount', filter=etc),
+            month_mission_fee=models.Sum('amount', filter=mission_fee & this_month),
+            month_etc=models.Sum('amount', filter=etc & this_month),
+        ).order_by()
+        for row in rows:
+            helper_id = row.pop('helper_id')
+            values[helper_id].update({k: v or 0 for k, v in row.items()})
+        requested = Withdraw.objects.filter(helper_id__in=helper_ids).requested_set()\
+            .values('helper_id').annotate(amount=models.Sum('amount')).order_by().values_list('helper_id', 'amount')
+        for helper_id, amount in requested:
+            values[helper_id]['withdraw_requested'] = amount
+        return values
+
+    def recompute(self, helper_ids, exclude_cash_ids=()):
+        """내역 전체로 다시 계산해서 저장하고 바뀐 헬퍼 id 목록 반환 (계산하는 동안 캐쉬 내역 저장을 막음)"""
+        with transaction.atomic():
+            BalanceSnapshot.objects.lock(Cash, helper_ids)
+            values = self.calculate(helper_ids, exclude_cash_ids)
+            existing = {obj.helper_id: obj for obj in self.filter(helper_id__in=helper_ids)}
+            now = timezone.now()
+            changed = []
+            for helper_id, fields in values.items():
+                obj = existing.get(helper_id)
+                if obj is None:
+                    self.bulk_create([self.model(helper_id=helper_id, updated_datetime=now, **fields)],
+                                     ignore_conflicts=True)
+                    changed.append(helper_id)
+                elif any(getattr(obj, k) != v for k, v in fields.items()):
+                    self.filter(helper_id=helper_id).update(updated_datetime=now, **fields)
+                    changed.append(helper_id)
+        return changed
+
 
 class WithdrawQuerySet(models.QuerySet):
     """
@@ -74,14 +220,14 @@ class CouponQuerySet(models.QuerySet):
     def usable_set(self):
         return self.filter(used_datetime__isnull=True, expire_date__gte=timezone.now().date())
 
+    def with_discount(self, bid):
+        """입찰 금액에 대한 할인액 (Coupon.calculate_discount 와 같은 계산) : discount_amount"""
+        return self.annotate(discount_amount=Coupon.discount_expression(bid.amount))
+
     def get_usable(self, user, bid=None):
-        qs = self.usable_set().filter(user=user)
+        qs = self.usable_set().filter(user=user).select_related('template')
         if bid:
-            usable_ids = []
-            for c in qs:
-                if c.calculate_discount(bid):
-                    usable_ids.append(c.id)
-            qs = qs.filter(id__in=usable_ids)
+            qs = qs.with_discount(bid).filter(discount_amount__gt=0)
         return qs
 
     def register(self, code, user):
@@ -128,17 +274,41 @@ class PaymentQuerySet(models.QuerySet):
 
     def get_paid_amount(self, exclude_points=False):
         """카드 및 포인트 결제금액합"""
-        paid = list(zip(*self.get_paid().values_list('amount', 'point__amount')))
-        if not paid:
-            return 0
-        amount = sum(paid[0])
-        if not exclude_points and len(paid) > 1:
-            amount -= sum([p for p in paid[1] if p])
-        return amount
+        paid = self.get_paid().aggregate(
+            amount=Coalesce(models.Sum('amount'), 0), point=Coalesce(models.Sum('point__amount'), 0)
+        )
+        if exclude_points:
+            return paid['amount']
+        return paid['amount'] - paid['point']
 
     def get_discounted_amount(self):
-        discounted = sum([p.coupon.calculate_discount(p.bid) for p in self.get_coupon_used()])
-        return discounted
+        return self.get_coupon_used().aggregate(discounted=Coalesce(models.Sum(
+            Coupon.discount_expression(models.F('bid__amount'), 'coupon__template')
+        ), 0))['discounted']
+
+    def sum_subquery(self, group_by, expression='amount'):
+        """group_by (OuterRef 로 거른 기준) 별 합계 서브쿼리 expression, 결제가 없으면 0"""
+        return Coalesce(
+            models.Subquery(
+                self.values(group_by).annotate(total=models.Sum(expression)).values('total'),
+                output_field=models.IntegerField()
+            ),
+            0
+        )
+
+
+class PaymentAttemptQuerySet(models.QuerySet):
+    """
+    결제대행사 요청 기록 쿼리셋
+    """
+    def get_unrepeatable(self, payment, operation):
+        """다시 요청하면 안 되는 시도 : 성공했거나 결과를 알 수 없는 것"""
+        return self.filter(payment=payment, operation=operation).filter(
+            models.Q(is_succeeded=True) | models.Q(is_pending=True)
+        ).order_by('id').last()
+
+    def get_pending(self):
+        return self.filter(is_pending=True)
 
 
 """
@@ -146,7 +316,56 @@ models
 """
 
 
-class Point(models.Model):
+class BalanceLedgerMixin:
+    """
+    잔액 내역 : 새 내역은 owner 의 잔액 스냅샷을 잠근 상태에서 잔액을 매겨서 저장
+    """
+    BALANCE_LEDGER = ''
+    BALANCE_OWNER_FIELD = ''
+
+    def save(self, *args, **kwargs):
+        if self.pk:
+            return super(BalanceLedgerMixin, self).save(*args, **kwargs)
+        owner_id = getattr(self, self.BALANCE_OWNER_FIELD + '_id')
+        with transaction.atomic():
+            snapshot = BalanceSnapshot.objects.lock(type(self), [owner_id])[owner_id]
+            snapshot.balance += self.amount
+            self.balance = snapshot.balance
+            super(BalanceLedgerMixin, self).save(*args, **kwargs)
+            snapshot.save(update_fields=['balance', 'updated_datetime'])
+            self.balance_entries_created([self])
+
+    @classmethod
+    def balance_entries_created(cls, objs):
+        """새 내역 저장 직후 (잔액 스냅샷을 잠근 트랜잭션 안)"""
+        pass
+
+
+class BalanceSnapshot(models.Model):
+    """
+    포인트/캐쉬 잔액 스냅샷 : owner 별로 한 줄, 내역 저장시 잠금과 잔액 계산에 사용
+    """
+    LEDGERS = (
+        ('point', '포인트'),
+        ('cash', '캐쉬'),
+    )
+
+    ledger = models.CharField('내역 종류', max_length=10, choices=LEDGERS)
+    owner_id = models.PositiveIntegerField('회원/헬퍼 ID')
+    balance = models.IntegerField('잔액', default=0)
+    updated_datetime = models.DateTimeField('수정일시', default=timezone.now)
+
+    objects = BalanceSnapshotQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = verbose_name_plural = '잔액 스냅샷'
+        unique_together = (('ledger', 'owner_id'),)
+
+    def __str__(self):
+        return '%s %s : %s' % (self.ledger, self.owner_id, self.balance)
+
+
+class Point(BalanceLedgerMixin, models.Model):
     """
     포인트 내역 모델
     """
@@ -170,6 +389,9 @@ class Point(models.Model):
 
     objects = OptionalBalanceQuerySet.as_manager()
 
+    BALANCE_LEDGER = 'point'
+    BALANCE_OWNER_FIELD = 'user'
+
     class Meta:
         verbose_name = verbose_name_plural = '포인트 내역'
         ordering = ('id',)
@@ -392,6 +614,29 @@ class Coupon(models.Model):
         else:
             return min(int(bid.amount * self.template.price / 100), self.template.amount_condition)
 
+    @classmethod
+    def discount_expression(cls, amount, template='template'):
+        """
+        calculate_discount 와 같은 계산의 쿼리 expression
+        amount 는 입찰 금액 (값 또는 F 등의 expression), template 은 쿠폰 템플릿까지의 lookup 경로
+        """
+        price = models.F(template + '__price')
+        if not hasattr(amount, 'resolve_expression'):
+            amount = models.Value(amount)
+        fixed = models.Case(
+            models.When(**{template + '__amount_condition__lte': amount, 'then': price}),
+            default=models.Value(0),
+        )
+        rate = Least(
+            models.ExpressionWrapper(price * amount / 100, output_field=models.IntegerField()),
+            models.F(template + '__amount_condition'),
+            output_field=models.IntegerField(),
+        )
+        return models.Case(
+            models.When(**{template + '__price__gt': 100, 'then': fixed}), default=rate,
+            output_field=models.IntegerField()
+        )
+
     def use(self):
         self.used_datetime = timezone.now()
         self.save()
@@ -401,7 +646,7 @@ class Coupon(models.Model):
         self.save()
 
 
-class Cash(models.Model):
+class Cash(BalanceLedgerMixin, models.Model):
     """
     캐쉬 내역 모델
     """
@@ -414,6 +659,12 @@ class Cash(models.Model):
 
     objects = OptionalBalanceQuerySet.as_manager()
 
+    BALANCE_LEDGER = 'cash'
+    BALANCE_OWNER_FIELD = 'helper'
+
+    # 미션수행비 여부 (Bid.finish 에서 저장 전에 지정, 헬퍼 수익 스냅샷 분류용)
+    is_mission_fee = False
+
     class Meta:
         verbose_name = verbose_name_plural = '캐쉬 내역'
 
@@ -450,6 +701,10 @@ class Cash(models.Model):
         self._detail = self.detail
         self.save()
 
+    @classmethod
+    def balance_entries_created(cls, objs):
+        HelperEarnings.objects.add_cashes(objs)
+
 
 class Withdraw(models.Model):
     """
@@ -482,7 +737,9 @@ class Withdraw(models.Model):
     def save(self, *args, **kwargs):
         if not self.bank_account:
             self.bank_account = self.helper.bank_account
-        return super(Withdraw, self).save(*args, **kwargs)
+        rtn = super(Withdraw, self).save(*args, **kwargs)
+        HelperEarnings.objects.refresh_withdraw_requested(self.helper_id)
+        return rtn
 
     def finish(self):
         self.cash = Cash.objects.create(helper=self.helper, amount=-self.amount)
@@ -521,6 +778,47 @@ class Withdraw(models.Model):
     get_state_display.short_description = '처리 상태'
 
 
+
+class HelperEarnings(models.Model):
+    """
+    헬퍼 수익 스냅샷 : 캐쉬 내역/인출요청 저장시 갱신하고 reconcile_helper_earnings 커맨드로 주기적으로 맞춤
+    (캐쉬 잔액은 잔액 스냅샷(BalanceSnapshot)을 사용)
+    """
+    helper = models.OneToOneField(Helper, verbose_name='헬퍼', primary_key=True, related_name='earnings_snapshot',
+                                  on_delete=models.CASCADE)
+    mission_fee_total = models.IntegerField('미션수행비 누적', default=0)
+    etc_total = models.IntegerField('기타수익 누적', default=0)
+    month = models.DateField('집계월', null=True, blank=True)
+    month_mission_fee = models.IntegerField('이번달 미션수행비', default=0)
+    month_etc = models.IntegerField('이번달 기타수익', default=0)
+    withdraw_requested = models.IntegerField('인출요청 금액', default=0)
+    updated_datetime = models.DateTimeField('수정일시', default=timezone.now)
+
+    objects = HelperEarningsQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = verbose_name_plural = '헬퍼 수익 스냅샷'
+
+    def __str__(self):
+        return str(self.helper_id)
+
+    @property
+    def is_this_month(self):
+        return self.month == timezone.localdate().replace(day=1)
+
+    @property
+    def profit_total(self):
+        return self.mission_fee_total + self.etc_total
+
+    @property
+    def profit_this_month(self):
+        return self.month_mission_fee + self.month_etc if self.is_this_month else 0
+
+    def get_withdrawable(self, cash_balance):
+        withdrawable = cash_balance - self.withdraw_requested
+        return withdrawable if withdrawable > 0 else 0
+
+
 class Billing(models.Model):
     """
     빌링 모델
@@ -573,6 +871,8 @@ class Payment(models.Model):
     authenticated_datetime = models.DateTimeField('승인일시', null=True)
     created_datetime = models.DateTimeField('작성일시', auto_now_add=True)
     is_succeeded = models.BooleanField('성공여부', blank=True, default=True)
+    idempotency_key = models.CharField('멱등키', max_length=32, blank=True, default='',
+                                       help_text='결제대행사 요청시 작업명과 함께 보내 같은 작업이 두 번 처리되지 않도록 함')
 
     objects = PaymentQuerySet.as_manager()
 
@@ -604,6 +904,14 @@ class Payment(models.Model):
     def can_cancel(self):
         return self.pay_method != 'Refund' and self.is_succeeded and 'canceled' not in self.result
 
+    def get_idempotency_key(self, operation):
+        """작업별 멱등키 : 처음 요청할 때 만들어 저장하고, 동시에 만든 경우 먼저 저장된 키를 사용"""
+        if not self.idempotency_key:
+            self._meta.model.objects.filter(pk=self.pk, idempotency_key='').update(idempotency_key=uuid.uuid4().hex)
+            self.idempotency_key = self._meta.model.objects.filter(pk=self.pk).values_list(
+                'idempotency_key', flat=True).get()
+        return '%s-%s' % (self.idempotency_key, operation)
+
     def use_point(self, point_amount, restrict=True):
         if restrict and self.bid.mission.user.points.get_balance() < point_amount:
             return False
@@ -612,7 +920,17 @@ class Payment(models.Model):
         return True
 
     def cancel(self):
-        """결제 취소"""
+        """
+        결제 취소 : 같은 결제의 동시 취소 요청은 행 잠금으로 하나만 처리
+        (결제대행사 요청 기록은 PaymentAttemptRecorder 가 잠금 트랜잭션과 별도로 커밋)
+        """
+        self.get_idempotency_key('cancel')
+        with transaction.atomic():
+            locked = self._meta.model.objects.select_for_update().get(pk=self.pk)
+            self.result, self.is_succeeded = locked.result, locked.is_succeeded
+            return self._cancel()
+
+    def _cancel(self):
         if not self.can_cancel:
             logger.error('[결제취소 오류] 취소할 수 없는 결제 상태')
             return False
@@ -680,16 +998,14 @@ class Payment(models.Model):
             ).encode('utf-8')).hexdigest()
         })
         headers = {'Content-Type': 'application/x-www-form-urlencoded;charset=utf-8'}
-        response = requests.post(settings.PAYMENT_REFUND_URL, data=payload, headers=headers)
-        result = response.json()
-        if 300 > response.status_code >= 200:
-            canceled_payment.update({'result': result})
-            if 'resultCode' not in canceled_payment['result'] or canceled_payment['result']['resultCode'] != '00':
-                canceled_payment.update({'is_succeeded': False})
-                logger.error('[결제취소 오류] 취소요청 내용 : %s' % payload)
-        else:
+        attempt = PaymentGateway().post(settings.PAYMENT_REFUND_URL, payload, 'cancel', payment=self,
+                                        headers=headers, success_code='00')
+        result = attempt.result
+        canceled_payment.update({'result': result})
+        if not attempt.is_succeeded:
             canceled_payment.update({'is_succeeded': False})
-        logger.error('[결제취소] 요청 결과 : %s' % result)
+            logger.error('[결제취소 오류] 취소요청 내용 : %s' % payload)
+        logger.error('[결제취소] 요청 결과 : %s' % (result or attempt.error))
 
         return canceled_payment
 
@@ -711,6 +1027,49 @@ class Payment(models.Model):
         return canceled_payment
 
 
+class PaymentAttempt(models.Model):
+    """
+    결제대행사 요청 기록 : 요청 한 건마다 응답(또는 타임아웃/연결 오류)과 소요시간 저장
+    """
+    OPERATIONS = (
+        ('ready', '결제준비'),
+        ('auth', '결제승인'),
+        ('net_cancel', '망취소'),
+        ('pay', '빌링결제'),
+        ('cancel', '결제취소'),
+        ('register', '빌링등록'),
+        ('unregister', '빌링해지'),
+    )
+    # 요청 기록은 결제 행을 잠근 트랜잭션과 별도 연결에서 저장하므로 FK 제약(결제 행 KEY SHARE 잠금)을 두지 않음
+    payment = models.ForeignKey(Payment, verbose_name='결제', related_name='attempts', on_delete=models.CASCADE,
+                                db_constraint=False)
+    operation = models.CharField('요청 종류', max_length=20, choices=OPERATIONS)
+    idempotency_key = models.CharField('멱등키', max_length=50, blank=True, default='', db_index=True)
+    url = models.CharField('요청 url', max_length=250)
+    status_code = models.PositiveSmallIntegerField('응답코드', default=0, help_text='0 : 타임아웃/연결 오류로 응답 없음')
+    result = JSONField('응답', default=dict)
+    error = models.CharField('오류', max_length=250, blank=True, default='')
+    duration = models.FloatField('소요시간(초)', default=0)
+    is_succeeded = models.BooleanField('성공여부', default=False)
+    is_pending = models.BooleanField('결과 미확인', default=False,
+                                     help_text='요청 후 응답을 받지 못해 결제대행사에서 처리 여부를 확인해야 하는 경우')
+    created_datetime = models.DateTimeField('요청일시', auto_now_add=True)
+
+    objects = PaymentAttemptQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = verbose_name_plural = '결제대행사 요청 기록'
+
+    def __str__(self):
+        return '[%s] %s' % (self.get_operation_display(), self.idempotency_key)
+
+    def resolve(self, is_succeeded):
+        """결과 미확인 시도를 결제대행사에서 확인한 결과로 처리 : 실패로 처리하면 다시 요청할 수 있음"""
+        self.is_pending = False
+        self.is_succeeded = is_succeeded
+        self.save(update_fields=['is_pending', 'is_succeeded'])
+
+
 class Reward(models.Model):
     """
     리워드 모델
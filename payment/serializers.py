@@ -71,7 +71,11 @@ class CouponSerializer(serializers.ModelSerializer):
         super(CouponSerializer, self).__init__(instance=instance, data=data, **kwargs)
 
     def get_calculated_discount(self, instance):
-        return instance.calculate_discount(self.bid) if self.bid else 0
+        if not self.bid:
+            return 0
+        if hasattr(instance, 'discount_amount'):
+            return instance.discount_amount
+        return instance.calculate_discount(self.bid)
 
 
 class CouponRegisterSerializer(serializers.Serializer):
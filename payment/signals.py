@@ -1,21 +1,12 @@
 import random
 
-from django.db.models.signals import pre_save
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.utils import timezone
 
-from .models import Point, Cash, PointVoucher
-
-
-@receiver(pre_save, sender=Point)
-@receiver(pre_save, sender=Cash)
-def calculate_balance(sender, instance, **kwargs):
-    if sender is Point:
-        query = {'user': instance.user}
-    elif sender is Cash:
-        query = {'helper': instance.helper}
-    balance = sender.objects.filter(**query).get_balance()
-    instance.balance = balance + instance.amount
+from notification.models import TaskerRegistry
+from .models import PointVoucher, CouponTemplate
 
 
 @receiver(pre_save, sender=PointVoucher)
@@ -29,3 +20,10 @@ def set_expire_date_and_code(sender, instance, **kwargs):
                 instance.template.code,
                 sender.objects.filter(template_id=instance.template_id).count()
             )
+
+
+@receiver(post_save, sender=CouponTemplate)
+@receiver(post_delete, sender=CouponTemplate)
+def invalidate_tasker_registry(sender, instance, **kwargs):
+    """태스커 자동발급 쿠폰이 바뀌면 프로세스별 태스커 캐쉬를 다시 읽도록 함"""
+    transaction.on_commit(TaskerRegistry().invalidate)
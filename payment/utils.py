@@ -2,18 +2,132 @@ import json
 import dateutil.parser
 import logging
 import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from urllib3.util.retry import Retry
 
+from django.apps import apps
 from django.conf import settings
+from django.db import connection
 from django.utils import timezone
 
 from common.exceptions import Errors
+from common.utils import SingletonOptimizedMeta
+from .fake_gateway import FakeGateway
 
 
 logger = logging.getLogger('payment')
 
 
+class PaymentAttemptRecorder(metaclass=SingletonOptimizedMeta):
+    """
+    결제대행사 요청 기록 저장 : 요청하는 쪽의 트랜잭션이 롤백되어도 남도록 별도 스레드(별도 db 연결)에서 바로 커밋
+    요청하는 쪽이 결제 행을 잠그고 있어도 기다리지 않도록 PaymentAttempt.payment 에는 FK 제약이 없음
+    (그래도 저장이 멈추면 PAYMENT_ATTEMPT_SAVE_TIMEOUT 초 후 실패로 처리)
+    """
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.timeout = getattr(settings, 'PAYMENT_ATTEMPT_SAVE_TIMEOUT', 10)
+
+    def save(self, attempt):
+        """저장에 성공하면 True"""
+        try:
+            self.executor.submit(self._save, attempt).result(timeout=self.timeout)
+        except Exception as e:
+            logger.error('[결제대행사] 요청 기록 저장 오류 (%s) : %s' % (attempt.idempotency_key, repr(e)))
+            return False
+        return True
+
+    def _save(self, attempt):
+        try:
+            attempt.save()
+        finally:
+            connection.close()
+
+
+class PaymentGateway(metaclass=SingletonOptimizedMeta):
+    """
+    결제대행사 api 클라이언트 : 커넥션 풀 공유, 타임아웃, 요청별 시도 기록
+    (결제/취소 요청(POST)은 중복 처리를 막기 위해 연결 실패시에만 재시도)
+
+    결제건의 요청은 보내기 전에 결과 미확인 상태로 기록하고, 응답을 받으면 결과를 기록한다.
+    결제대행사는 멱등키를 지원하지 않으므로 같은 작업에 성공했거나 결과를 알 수 없는(타임아웃 등) 시도가 있으면 다시 보내지 않고
+    결과를 알 수 없는 시도는 결제대행사에서 확인한 뒤 어드민에서 처리한다.
+    """
+    def __init__(self):
+        if getattr(settings, 'PAYMENT_GATEWAY_TRANSPORT', 'requests') == 'fake':
+            self.session = FakeGateway()
+        else:
+            pool_size = getattr(settings, 'PAYMENT_GATEWAY_POOL_SIZE', 10)
+            retry = Retry(total=getattr(settings, 'PAYMENT_GATEWAY_RETRY', 2), read=0, status=0, backoff_factor=0.3,
+                          raise_on_status=False)
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+            self.session = requests.Session()
+            self.session.mount('http://', adapter)
+            self.session.mount('https://', adapter)
+        self.timeout = getattr(settings, 'PAYMENT_GATEWAY_TIMEOUT', (3, 10))
+
+    def post(self, url, data, operation, payment=None, headers=None, success_code='200'):
+        """
+        요청 결과를 PaymentAttempt 로 반환 (status_code 0 은 응답을 받지 못한 경우)
+        payment 가 있으면 같은 작업의 성공 또는 결과 미확인 시도가 있을 때 요청하지 않고 그 시도를 반환
+        """
+        PaymentAttempt = apps.get_model('payment', 'PaymentAttempt')
+        attempt = PaymentAttempt(payment=payment, operation=operation, url=url)
+        headers = dict(headers or {})
+        if payment is not None:
+            attempt.idempotency_key = payment.get_idempotency_key(operation)
+            previous = PaymentAttempt.objects.get_unrepeatable(payment, operation)
+            if previous:
+                if previous.is_pending:
+                    logger.error('[결제대행사] %s 결과 미확인 요청이 있어 다시 보내지 않음 : %s' % (
+                        operation, attempt.idempotency_key))
+                else:
+                    logger.info('[결제대행사] %s 이미 처리된 요청 : %s' % (operation, attempt.idempotency_key))
+                return previous
+            headers['Idempotency-Key'] = attempt.idempotency_key
+            attempt.is_pending = True
+            if not PaymentAttemptRecorder().save(attempt):
+                # 결과 미확인 기록 없이 보내면 재시도를 막을 수 없으므로 보내지 않음
+                attempt.is_pending = False
+                attempt.error = '요청 기록 저장 실패로 요청하지 않음'
+                return attempt
+
+        started = time.monotonic()
+        try:
+            response = self.session.post(url, data=data, headers=headers, timeout=self.timeout)
+            attempt.status_code = response.status_code
+            attempt.is_pending = False
+            attempt.result = response.json()
+        except requests.RequestException as e:
+            # 연결 전에 실패한 경우만 요청이 전달되지 않은 것이 확실함
+            attempt.is_pending = not self.is_not_sent(e)
+            attempt.error = ('%s : %s' % (type(e).__name__, e))[:250]
+        except ValueError as e:
+            attempt.error = str(e)[:250]
+        attempt.duration = time.monotonic() - started
+        attempt.is_succeeded = bool(
+            200 <= attempt.status_code < 300 and isinstance(attempt.result, dict)
+            and attempt.result.get('resultCode') == success_code
+        )
+        if attempt.error:
+            logger.error('[결제대행사] %s 요청 오류 (%s) : %s' % (operation, attempt.idempotency_key, attempt.error))
+        if payment is not None:
+            PaymentAttemptRecorder().save(attempt)
+        return attempt
+
+    @staticmethod
+    def is_not_sent(error):
+        if isinstance(error, requests.ConnectTimeout):
+            return True
+        reason = getattr(error.args[0], 'reason', None) if error.args else None
+        return isinstance(error, requests.ConnectionError) and isinstance(reason, NewConnectionError)
+
+
 class PaymentAPI:
     """
     결제 API 연동
@@ -24,10 +138,10 @@ class PaymentAPI:
     def request_ready(self, obj):
         url = settings.SPC_PAYMENT_API_URL + '/v1/payment/ready'
         payload = self.get_payload(obj)
-        response = requests.post(url, payload)
+        attempt = PaymentGateway().post(url, payload, 'ready', payment=obj)
         rtn = None
-        if response.status_code < 300:
-            result = response.json()
+        if 200 <= attempt.status_code < 300:
+            result = attempt.result
             if result['resultCode'] == '200':
                 try:
                     rtn = (result['data']['aid'], result['data'][self.url_by_client])
@@ -42,10 +156,10 @@ class PaymentAPI:
     def request_auth(self, obj):
         url = settings.SPC_PAYMENT_API_URL + '/v1/payment/pay'
         payload = self.get_payload(obj)
-        response = requests.post(url, payload)
+        attempt = PaymentGateway().post(url, payload, 'auth', payment=obj)
         rtn = None
-        if response.status_code < 300:
-            result = response.json()
+        if 200 <= attempt.status_code < 300:
+            result = attempt.result
             if result['resultCode'] == '200':
                 try:
                     applNo = result['data'].pop('applNo')
@@ -61,28 +175,25 @@ class PaymentAPI:
                 obj.save()
         else:
             # 망취소
-            requests.post(settings.SPC_PAYMENT_API_URL + '/v1/payment/net-cancel', payload)
+            PaymentGateway().post(settings.SPC_PAYMENT_API_URL + '/v1/payment/net-cancel', payload, 'net_cancel', payment=obj)
         return rtn
 
     def request_cancel(self, obj):
         url = settings.SPC_BILLING_API_URL + '/v1/api/payments/payment/cancel'
         payload = self.get_payload(obj, is_cancel=True)
-        response = requests.post(url, payload)
+        attempt = PaymentGateway().post(url, payload, 'cancel', payment=obj)
         rtn = None
-        if response.status_code < 300:
-            result = response.json()
-            if result['resultCode'] == '200':
-                try:
-                    tranDate = result['data'].pop('tranDate')
-                    tranTime = result['data'].pop('tranTime')
-                    tranDatetime = timezone.datetime.strptime(tranDate + tranTime, '%y%m%d%H%M%S')
-                    rtn = (tranDatetime, result['data'])
-                except:
-                    obj.result['cancel_error'] = result
-                    obj.save()
-            else:
-                obj.result['cancel_error'] = result
-                obj.save()
+        if attempt.is_succeeded:
+            # 결과 미확인 요청을 어드민에서 성공으로 처리한 경우에는 응답 데이터가 없을 수 있음
+            data = attempt.result.get('data') or {}
+            try:
+                tranDatetime = timezone.datetime.strptime(data.pop('tranDate') + data.pop('tranTime'), '%y%m%d%H%M%S')
+            except:
+                tranDatetime = None
+            rtn = (tranDatetime, data)
+        elif 200 <= attempt.status_code < 300:
+            obj.result['cancel_error'] = attempt.result
+            obj.save()
         return rtn
 
     def get_payload(self, obj, is_cancel=False):
@@ -141,9 +252,9 @@ class BillingAPI:
 
         url = settings.SPC_BILLING_API_URL + '/v1/api/payments/payment/card-auto/auth'
         payload = self.get_payload(obj, data)
-        res = requests.post(url, payload)
-        if res.status_code < 300:
-            result = res.json()
+        attempt = PaymentGateway().post(url, payload, 'register')
+        if 200 <= attempt.status_code < 300:
+            result = attempt.result
             if result['resultCode'] == '200':
                 try:
                     # 빌링 등록정보 저장
@@ -169,7 +280,7 @@ class BillingAPI:
             logger.info('[U%s] [빌링 등록 성공] %s (%s)' % (obj.user.code, obj.id, obj))
             return obj
 
-        logger.error('[U%s] [빌링 등록 응답오류] (%s) %s' % (obj.user.code, res.status_code, res.content))
+        logger.error('[U%s] [빌링 등록 응답오류] (%s) %s' % (obj.user.code, attempt.status_code, attempt.error or attempt.result))
         obj.delete()
         raise Errors.billing_not_completed
 
@@ -183,9 +294,9 @@ class BillingAPI:
             'clientType': 'MERCHANT',
             'billkey': obj.billkey
         })
-        res = requests.post(url, payload)
-        if res.status_code < 300:
-            result = res.json()
+        attempt = PaymentGateway().post(url, payload, 'unregister')
+        if 200 <= attempt.status_code < 300:
+            result = attempt.result
             if result['resultCode'] == '200':
                 try:
                     # 빌링 등록해지정보 저장
@@ -203,7 +314,7 @@ class BillingAPI:
             logger.info('[U%s] [빌링 해지 성공] %s (%s)' % (obj.user.code, obj.id, obj))
             return True
 
-        logger.error('[U%s] [빌링 등록해지 응답오류] (%s) %s' % (obj.user.code, res.status_code, res.content))
+        logger.error('[U%s] [빌링 등록해지 응답오류] (%s) %s' % (obj.user.code, attempt.status_code, attempt.error or attempt.result))
         raise Errors.billing_not_completed
 
     def request_pay(self, obj):
@@ -211,9 +322,9 @@ class BillingAPI:
 
         url = settings.SPC_BILLING_API_URL + '/v1/api/payments/payment/card-auto/trans'
         payload = self.get_payment_payload(obj)
-        res = requests.post(url, payload)
-        if res.status_code < 300:
-            result = res.json()
+        attempt = PaymentGateway().post(url, payload, 'pay', payment=obj)
+        if 200 <= attempt.status_code < 300:
+            result = attempt.result
             if result['resultCode'] == '200':
                 try:
                     # 빌링 결제정보 저장
@@ -236,7 +347,7 @@ class BillingAPI:
             logger.info('[U%s] [빌링 결제 성공] %s (%s)' % (obj.billing.user.code, obj.id, obj))
             return obj
 
-        logger.error('[U%s] [빌링 등록해지 응답오류] (%s) %s' % (obj.billing.user.code, res.status_code, res.content))
+        logger.error('[U%s] [빌링 등록해지 응답오류] (%s) %s' % (obj.billing.user.code, attempt.status_code, attempt.error or attempt.result))
         raise Errors.billing_not_completed
 
     def request_cancel(self, obj):
@@ -244,22 +355,19 @@ class BillingAPI:
 
         url = settings.SPC_BILLING_API_URL + '/v1/api/payments/payment/card/cancel'
         payload = self.get_payment_payload(obj, is_cancel=True)
-        response = requests.post(url, payload)
+        attempt = PaymentGateway().post(url, payload, 'cancel', payment=obj)
         rtn = None
-        if response.status_code < 300:
-            result = response.json()
-            if result['resultCode'] == '200':
-                try:
-                    tranDate = result['data'].pop('tranDate')
-                    tranTime = result['data'].pop('tranTime')
-                    tranDatetime = timezone.datetime.strptime(tranDate + tranTime, '%y%m%d%H%M%S')
-                    rtn = (tranDatetime, result['data'])
-                except:
-                    obj.result['cancel_error'] = result
-                    obj.save()
-            else:
-                obj.result['cancel_error'] = result
-                obj.save()
+        if attempt.is_succeeded:
+            # 결과 미확인 요청을 어드민에서 성공으로 처리한 경우에는 응답 데이터가 없을 수 있음
+            data = attempt.result.get('data') or {}
+            try:
+                tranDatetime = timezone.datetime.strptime(data.pop('tranDate') + data.pop('tranTime'), '%y%m%d%H%M%S')
+            except:
+                tranDatetime = None
+            rtn = (tranDatetime, data)
+        elif 200 <= attempt.status_code < 300:
+            obj.result['cancel_error'] = attempt.result
+            obj.save()
         return rtn
 
     def get_payload(self, obj, data={}):
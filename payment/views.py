@@ -158,7 +158,8 @@ class CouponBidViewSet(mixins.ListModelMixin,
 
     def list(self, request, *args, **kwargs):
         """결제할 금액에 따른 사용가능 쿠폰 목록"""
-        return response.Response(data=self.serializer_class(instance=self.get_queryset(), many=True, bid=self.bid).data)
+        queryset = self.get_queryset().with_discount(self.bid)
+        return response.Response(data=self.serializer_class(instance=queryset, many=True, bid=self.bid).data)
 
 
 class CashViewSet(mixins.ListModelMixin,
@@ -321,6 +321,7 @@ ADMIN_REORDER = (
         'app': 'payment',
         'models': (
             'payment.Payment',
+            'payment.PaymentAttempt',
             'payment.Billing',
             'payment.PointVoucherTemplate',
             'payment.CouponTemplate',
@@ -366,8 +367,10 @@ ADMIN_REORDER = (
             'notification.ReceiverGroup',
             'notification.Tasker',
             'notification.Notification',
+            'notification.PushDeliveryMetric',
             'missions.SafetyNumber',
             'accounts.LoggedInDevice',
+            'base.HttpJob',
             # {
             #     'model': 'authtoken.Token',
             #     'label': '토큰',
@@ -14,3 +14,15 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'web.settings')
 
 application = get_wsgi_application()
+
+
+def warm_up():
+    """웹 서버 프로세스에서만 고객 홈 캐쉬를 미리 만듦 (uwsgi master 에서 만들면 fork 된 worker 가 이어받음)"""
+    from django.db import connections
+    from base.views import CustomerHomeView
+    CustomerHomeView.cache_all()
+    # fork 된 worker 들이 master 의 db 연결을 나눠쓰지 않도록 닫음
+    connections.close_all()
+
+
+warm_up()